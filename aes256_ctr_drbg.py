@@ -1,4 +1,5 @@
 import os
+import threading
 from utils import xor_bytes
 from Crypto.Cipher import AES
 
@@ -13,6 +14,21 @@ class AES256_CTR_DRBG:
         seed_material = self.__instantiate(personalization=personalization)
         self.ctr_drbg_update(seed_material)
         self.reseed_ctr = 1
+        # key, V and reseed_ctr are updated on every call: serialise
+        # callers that share one DRBG between threads
+        self.lock = threading.Lock()
+        
+    def __getstate__(self):
+        """
+        The lock cannot be pickled: a copy gets its own.
+        """
+        state = self.__dict__.copy()
+        del state["lock"]
+        return state
+        
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
         
     def __check_entropy_input(self, entropy_input):
         """
@@ -65,10 +81,15 @@ class AES256_CTR_DRBG:
         limit.
         """
         seed_material = self.__instantiate(additional_information)
-        self.ctr_drbg_update(seed_material)
-        self.reseed_ctr = 1
+        with self.lock:
+            self.ctr_drbg_update(seed_material)
+            self.reseed_ctr = 1
         
     def random_bytes(self, num_bytes, additional=None):
+        with self.lock:
+            return self.__random_bytes(num_bytes, additional)
+        
+    def __random_bytes(self, num_bytes, additional=None):
         if self.reseed_ctr >= self.reseed_interval:
             raise Warning("The DRBG has been exhausted! Reseed!")
         
@@ -0,0 +1,123 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+
+class _PendingBatch:
+    def __init__(self, handle):
+        self.handle = handle
+        self.items = []
+        self.futures = []
+
+
+class AsyncKyber:
+    """
+    Façade asyncio pour Kyber : `await keygen()`, `await enc(pk)` et
+    `await dec(c, sk)` s'exécutent hors de la boucle d'événements.
+
+    `backend` fournit les méthodes par lot `keygen_batch(count)`,
+    `enc_batch(pks, key_length)` et `dec_batch(pairs, key_length)` : une
+    instance `Kyber`, un `KyberExecutor` (pool de threads) ou un
+    `KyberProcessEngine` (pool de processus). Les appels au backend sont
+    faits depuis `executor` (par défaut un pool de `max_concurrency`
+    threads), et au plus `max_concurrency` appels sont en cours à la fois ;
+    les suivants attendent dans la boucle, où ils restent annulables.
+
+    Avec `batch_window` (en secondes), les appels concurrents de même type
+    arrivés pendant la fenêtre (au plus `max_batch_size`) sont fusionnés en
+    un seul appel par lot. Un appel annulé avant l'envoi de son lot en est
+    retiré ; une fois le lot envoyé, le calcul n'est pas interrompu et son
+    résultat est simplement ignoré.
+    """
+    def __init__(self, backend, executor=None, max_concurrency=4, batch_window=None, max_batch_size=64):
+        self.backend = backend
+        self.owns_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="kyber-async")
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.batches = {}
+        self.tasks = set()
+
+    async def keygen(self):
+        return await self._call("keygen_batch", None, None)
+
+    async def enc(self, pk, key_length=32):
+        return await self._call("enc_batch", pk, key_length)
+
+    async def dec(self, c, sk, key_length=32):
+        return await self._call("dec_batch", (c, sk), key_length)
+
+    async def _run(self, name, items, key_length):
+        method = getattr(self.backend, name)
+        if name == "keygen_batch":
+            fn = partial(method, len(items))
+        else:
+            fn = partial(method, items, key_length=key_length)
+        async with self.semaphore:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn)
+
+    async def _call(self, name, item, key_length):
+        if self.batch_window is None:
+            [result] = await self._run(name, [item], key_length)
+            return result
+
+        loop = asyncio.get_running_loop()
+        key = (name, key_length)
+        batch = self.batches.get(key)
+        if batch is None:
+            batch = self.batches[key] = _PendingBatch(loop.call_later(self.batch_window, self._flush, key))
+        future = loop.create_future()
+        batch.items.append(item)
+        batch.futures.append(future)
+        if len(batch.items) >= self.max_batch_size:
+            batch.handle.cancel()
+            self._flush(key)
+        return await future
+
+    def _flush(self, key):
+        """
+        Envoie le lot en attente `key`, sans les appels déjà annulés.
+        """
+        batch = self.batches.pop(key)
+        pending = [(item, future) for item, future in zip(batch.items, batch.futures) if not future.done()]
+        if pending:
+            task = asyncio.ensure_future(self._run_batch(key, pending))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def _run_batch(self, key, pending):
+        name, key_length = key
+        try:
+            results = await self._run(name, [item for item, _ in pending], key_length)
+        except asyncio.CancelledError:
+            for _, future in pending:
+                future.cancel()
+            raise
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for (_, future), result in zip(pending, results):
+                if not future.done():
+                    future.set_result(result)
+
+    async def aclose(self):
+        """
+        Envoie les lots en attente, attend les appels en cours puis arrête
+        le pool de threads s'il a été créé par la façade.
+        """
+        for key in list(self.batches):
+            self.batches[key].handle.cancel()
+            self._flush(key)
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+        if self.owns_executor:
+            self.executor.shutdown(wait=False)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
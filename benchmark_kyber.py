@@ -1,6 +1,25 @@
 from kyber import Kyber512, Kyber768, Kyber1024  # Importation des classes Kyber de différentes tailles
+from kyber import Kyber as KyberClass, DEFAULT_PARAMETERS
+from key_format import dump_expanded_key, load_expanded_key
+from shared_key_store import SharedKeyStore
+from executors import KyberExecutor
+from process_engine import KyberProcessEngine
+from async_kyber import AsyncKyber
+from stepwise import CooperativeKyber
+from kem_service import KEMService
+from framing import encode_frame, read_frame, DEC, PARAMETER_SETS
+from bulk_dec import BulkDecapsulationCoordinator, serve_worker
+from kem_client import KEMClient, LoopbackServer
+from loadgen import run_load, format_report
+from stream_dec import StreamingDecapsulator, write_archive
+from bulk_keygen import BulkKeyGenerator
+import tempfile
+import asyncio
+import multiprocessing
 import cProfile  # Module pour le profilage de performances
 from time import time  # Fonction pour mesurer le temps d'exécution
+import tracemalloc  # Suivi des allocations mémoire
+import os
 
 # Fonction pour profiler les performances de l'algorithme Kyber
 def profile_kyber(Kyber):
@@ -52,6 +71,588 @@ def benchmark_kyber(Kyber, name, count):
     print(f"Enc: {round(sum(enc_times), 3)}")
     print(f"Dec: {round(sum(dec_times),3)}")
     
+
+# Fonction pour comparer l'expansion de la matrice A en série et sur un pool de threads
+def benchmark_matrix_expansion(parameter_name, name, count, workers=4):
+    print(f"-"*27)
+    print(f"  {name} | ({count} appels de keygen)")
+    print(f"-"*27)
+    for xof_workers in (None, workers):
+        Kyber = KyberClass(DEFAULT_PARAMETERS[parameter_name], xof_workers=xof_workers)
+        t0 = time()
+        for _ in range(count):
+            Kyber.keygen()
+        label = "série" if xof_workers is None else f"{xof_workers} threads"
+        print(f"Keygen ({label}): {round((time() - t0) / count * 1000, 3)} ms / appel")
+        Kyber.set_xof_workers(None)
+    
+
+# Fonction pour comparer les allocations de keygen/enc/dec et de leurs variantes `*_into`
+def benchmark_output_buffers(Kyber, name, count):
+    print(f"-"*27)
+    print(f"  {name} | ({count} appels)")
+    print(f"-"*27)
+    pk, sk = Kyber.keygen()
+    c, _ = Kyber.enc(pk)
+    # Trames préallouées, une par appel, comme un serveur qui sérialise ses réponses
+    pk_frames = bytearray(count * Kyber.pk_length)
+    sk_frames = bytearray(count * Kyber.sk_length)
+    c_frames = bytearray(count * Kyber.ct_length)
+    key_frames = bytearray(count * 32)
+    
+    # Référence : l'API qui renvoie ses sorties, recopiées ensuite dans la trame.
+    # keygen / enc / dec passent eux-mêmes par les variantes `_into` : la
+    # comparaison mesure ce que l'appelant économise (objets renvoyés et
+    # copie), pas un gain par rapport à l'ancien code interne.
+    def keygen_copy(i):
+        pk_i, sk_i = Kyber.keygen()
+        pk_frames[i*Kyber.pk_length:(i+1)*Kyber.pk_length] = pk_i
+        sk_frames[i*Kyber.sk_length:(i+1)*Kyber.sk_length] = sk_i
+    def enc_copy(i):
+        c_i, key_i = Kyber.enc(pk)
+        c_frames[i*Kyber.ct_length:(i+1)*Kyber.ct_length] = c_i
+        key_frames[i*32:(i+1)*32] = key_i
+    def dec_copy(i):
+        key_i = Kyber.dec(c, sk)
+        key_frames[i*32:(i+1)*32] = key_i
+    operations = [
+        ("keygen", keygen_copy,
+         lambda i: Kyber.keygen_into(pk_frames, sk_frames, i*Kyber.pk_length, i*Kyber.sk_length)),
+        ("enc", enc_copy,
+         lambda i: Kyber.enc_into(pk, c_frames, key_frames, i*Kyber.ct_length, i*32)),
+        ("dec", dec_copy,
+         lambda i: Kyber.dec_into(c, sk, key_frames, i*32)),
+    ]
+    for label, operation, operation_into in operations:
+        results = []
+        for f in (operation, operation_into):
+            tracemalloc.start()
+            for i in range(count):
+                f(i)
+            # Mémoire encore allouée après les appels, et pic de travail
+            size, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            results.append((size / count, peak / 1024))
+        (size, peak), (size_into, peak_into) = results
+        print(f"{label} + copie: {round(size)} octets conservés / appel (pic {round(peak, 1)} KiB), "
+              f"`{label}_into`: {round(size_into)} octets (pic {round(peak_into, 1)} KiB)")
+    
+
+# Fonction pour comparer les noyaux fusionnés de enc/dec au chemin étape par étape
+def benchmark_fused_kernels(Kyber, name, count):
+    print(f"-"*27)
+    print(f"  {name} | ({count} appels)")
+    print(f"-"*27)
+    R, d = Kyber.R, Kyber.du
+    polys = [R.random_element(is_ntt=True) for _ in range(count)]
+    noise = [R.cbd(os.urandom(64*Kyber.eta_2), Kyber.eta_2) for _ in range(count)]
+    out = bytearray(d * R.n // 8)
+    
+    # Côté sortie de enc : INTT + bruit + compression + empaquetage
+    t0 = time()
+    for f, e in zip(polys, noise):
+        g = R(f.coeffs.copy(), is_ntt=True)
+        (g.from_ntt() + e).compress(d).encode(l=d)
+    t1 = time()
+    for f, e in zip(polys, noise):
+        g = R(f.coeffs.copy(), is_ntt=True)
+        Kyber._intt_add_compress_encode_into(g, (e,), d, out, 0)
+    t2 = time()
+    print(f"INTT + bruit + compress + encode: {round(t1 - t0, 3)} -> {round(t2 - t1, 3)} (fusionné)")
+    
+    # Côté entrée de dec : dépaquetage + décompression + NTT
+    encoded = [f.compress(d).encode(l=d) for f in polys]
+    t0 = time()
+    for c in encoded:
+        R.decode(c, l=d).decompress(d).to_ntt()
+    t1 = time()
+    for c in encoded:
+        Kyber._decode_decompress_ntt(c, d)
+    t2 = time()
+    print(f"decode + decompress + NTT: {round(t1 - t0, 3)} -> {round(t2 - t1, 3)} (fusionné)")
+    
+
+# Fonction pour mesurer les encapsulations répétées vers la même clé publique
+def benchmark_pk_cache(parameter_name, name, count):
+    print(f"-"*27)
+    print(f"  {name} | ({count} appels)")
+    print(f"-"*27)
+    Kyber = KyberClass(DEFAULT_PARAMETERS[parameter_name])
+    pk, _ = Kyber.keygen()
+    for cached in (False, True):
+        if cached:
+            Kyber.enable_pk_cache()
+        t0 = time()
+        for _ in range(count):
+            Kyber.enc(pk)
+        label = "avec cache" if cached else "sans cache"
+        print(f"Enc ({label}): {round(time() - t0, 3)}")
+    print(Kyber.pk_cache_info())
+    
+
+# Fonction pour comparer dec sur les octets sk et sur une DecapsulationKey expansée
+def benchmark_expanded_keys(Kyber, name, count):
+    print(f"-"*27)
+    print(f"  {name} | ({count} appels)")
+    print(f"-"*27)
+    pk, sk = Kyber.keygen()
+    c, _ = Kyber.enc(pk)
+    dk = Kyber.decapsulation_key(sk)
+    t0 = time()
+    for _ in range(count):
+        Kyber.dec(c, sk)
+    t1 = time()
+    for _ in range(count):
+        Kyber.dec(c, dk)
+    t2 = time()
+    print(f"Dec: {round(t1 - t0, 3)} -> {round(t2 - t1, 3)} avec DecapsulationKey")
+    
+
+# Fonction pour mesurer le débit des API par lot en fonction de la taille du lot
+def benchmark_batch(Kyber, name, batch_sizes=(1, 4, 16, 64)):
+    print(f"-"*27)
+    print(f"  {name} | (opérations / s)")
+    print(f"-"*27)
+    for size in batch_sizes:
+        t0 = time()
+        keys = Kyber.keygen_batch(size)
+        t1 = time()
+        encs = Kyber.enc_batch([pk for pk, _ in keys])
+        t2 = time()
+        Kyber.dec_batch([(c, sk) for (c, _), (_, sk) in zip(encs, keys)])
+        t3 = time()
+        print(f"Lot de {size}: keygen {round(size / (t1 - t0), 1)}, "
+              f"enc {round(size / (t2 - t1), 1)}, dec {round(size / (t3 - t2), 1)}")
+    
+
+# Fonction pour comparer une session d'encapsulation à des appels `enc` successifs
+def benchmark_encapsulation_session(Kyber, name, count):
+    print(f"-"*27)
+    print(f"  {name} | ({count} encapsulations)")
+    print(f"-"*27)
+    pk, _ = Kyber.keygen()
+    ek = Kyber.encapsulation_key(pk)
+    t0 = time()
+    for _ in range(count):
+        Kyber.enc(ek)
+    t1 = time()
+    Kyber.encapsulation_session(ek).encapsulate(count)
+    t2 = time()
+    print(f"Enc: {round((t1 - t0) / count * 1000, 3)} ms -> {round((t2 - t1) / count * 1000, 3)} ms / encapsulation avec une session")
+    
+
+# Fonction pour mesurer le coût de régénération d'une clé depuis sa graine compacte
+def benchmark_seed_keys(Kyber, name, count):
+    print(f"-"*27)
+    print(f"  {name} | ({count} appels)")
+    print(f"-"*27)
+    seed = Kyber.generate_seed()
+    _, sk = Kyber.keygen_from_seed(seed)
+    print(f"Stockage: {len(sk)} octets -> {len(seed)} octets ({round(len(sk) / len(seed))}x)")
+    t0 = time()
+    for _ in range(count):
+        Kyber.decapsulation_key(sk)
+    t1 = time()
+    for _ in range(count):
+        Kyber.decapsulation_key_from_seed(seed)
+    t2 = time()
+    print(f"Expansion depuis sk: {round((t1 - t0) / count * 1000, 3)} ms, "
+          f"régénération depuis la graine: {round((t2 - t1) / count * 1000, 3)} ms")
+    
+
+# Fonction pour comparer le chargement d'une clé depuis sk et depuis le format expansé
+def benchmark_expanded_key_format(Kyber, name, count):
+    print(f"-"*27)
+    print(f"  {name} | ({count} clés)")
+    print(f"-"*27)
+    keys = Kyber.keygen_batch(count)
+    records = [dump_expanded_key(Kyber, Kyber.decapsulation_key(sk)) for _, sk in keys]
+    t0 = time()
+    for _, sk in keys:
+        Kyber.decapsulation_key(sk)
+    t1 = time()
+    for record in records:
+        load_expanded_key(Kyber, record)
+    t2 = time()
+    for record in records:
+        load_expanded_key(Kyber, record, verify=False)
+    t3 = time()
+    print(f"Chargement: {round((t1 - t0) / count * 1000, 3)} ms depuis sk, "
+          f"{round((t2 - t1) / count * 1000, 3)} ms depuis le format expansé "
+          f"({round((t3 - t2) / count * 1000, 3)} ms sans vérification), {len(records[0])} octets / clé")
+    
+
+
+# Fonctions exécutées dans les workers de `benchmark_shared_key_store`
+_worker_state = {}
+
+def _init_private_worker(parameter_name, sks):
+    Kyber = KyberClass(DEFAULT_PARAMETERS[parameter_name])
+    t0 = time()
+    _worker_state["Kyber"] = Kyber
+    _worker_state["keys"] = {key_id: Kyber.decapsulation_key(sk) for key_id, sk in sks.items()}
+    _worker_state["setup"] = time() - t0
+
+def _init_shared_worker(parameter_name, name):
+    Kyber = KyberClass(DEFAULT_PARAMETERS[parameter_name])
+    t0 = time()
+    _worker_state["Kyber"] = Kyber
+    _worker_state["store"] = SharedKeyStore.attach(Kyber, name)
+    _worker_state["setup"] = time() - t0
+
+def _private_memory():
+    # Mémoire résidente non partagée du processus (Linux), en octets
+    with open("/proc/self/statm") as f:
+        _, resident, shared = map(int, f.read().split()[:3])
+    return (resident - shared) * os.sysconf("SC_PAGE_SIZE")
+
+def _worker_dec(job):
+    key_id, c = job
+    Kyber = _worker_state["Kyber"]
+    if "store" in _worker_state:
+        key = _worker_state["store"].dec(key_id, c)
+    else:
+        key = Kyber.dec(c, _worker_state["keys"][key_id])
+    return key, os.getpid(), _worker_state["setup"], _private_memory()
+
+# Fonction pour comparer des workers qui expansent chacun les clés et des workers
+# attachés à un magasin de clés en mémoire partagée
+def benchmark_shared_key_store(parameter_name, name, key_count, count, max_workers=4):
+    print(f"-"*27)
+    print(f"  {name} | ({key_count} clés, {count} appels de dec)")
+    print(f"-"*27)
+    Kyber = KyberClass(DEFAULT_PARAMETERS[parameter_name])
+    keys = Kyber.keygen_batch(key_count)
+    sks = {i: sk for i, (_, sk) in enumerate(keys)}
+    jobs = []
+    for i in range(count):
+        key_id = i % key_count
+        c, _ = Kyber.enc(keys[key_id][0])
+        jobs.append((key_id, c))
+    
+    store = SharedKeyStore.create(Kyber, sks)
+    context = multiprocessing.get_context("spawn")
+    for workers in range(1, max_workers + 1):
+        for label, initializer, initargs in (("clés privées", _init_private_worker, (parameter_name, sks)),
+                                             ("mémoire partagée", _init_shared_worker, (parameter_name, store.name))):
+            with context.Pool(workers, initializer=initializer, initargs=initargs) as pool:
+                t0 = time()
+                results = pool.map(_worker_dec, jobs, chunksize=max(1, count // (4 * workers)))
+                elapsed = time() - t0
+            per_worker = {pid: (setup, memory) for _, pid, setup, memory in results}
+            setup = sum(setup for setup, _ in per_worker.values())
+            memory = sum(memory for _, memory in per_worker.values())
+            print(f"{workers} worker(s), {label}: {round(elapsed / count * 1000, 3)} ms / dec, "
+                  f"mise en place {round(setup * 1000, 1)} ms, mémoire privée cumulée {memory // 2**20} Mio")
+    store.unlink()
+    
+
+
+# Fonction pour mesurer le débit des lots exécutés sur un pool de threads
+def benchmark_executor(Kyber, name, count, workers=(1, 2, 4)):
+    print(f"-"*27)
+    print(f"  {name} | (lots de {count})")
+    print(f"-"*27)
+    keys = Kyber.keygen_batch(count)
+    for max_workers in workers:
+        with KyberExecutor(Kyber, max_workers=max_workers) as executor:
+            t0 = time()
+            executor.keygen_batch(count)
+            t1 = time()
+            encs = executor.enc_batch([pk for pk, _ in keys])
+            t2 = time()
+            executor.dec_batch([(c, sk) for (c, _), (_, sk) in zip(encs, keys)])
+            t3 = time()
+        print(f"{max_workers} thread(s): keygen {round(count / (t1 - t0), 1)} /s, "
+              f"enc {round(count / (t2 - t1), 1)} /s, dec {round(count / (t3 - t2), 1)} /s")
+    
+
+
+# Fonction pour mesurer le passage à l'échelle du pool de processus, de 1 à os.cpu_count() workers
+def benchmark_process_engine(parameter_name, name, count, pin_cpus=False):
+    print(f"-"*27)
+    print(f"  {name} | (lots de {count})")
+    print(f"-"*27)
+    Kyber = KyberClass(DEFAULT_PARAMETERS[parameter_name])
+    keys = Kyber.keygen_batch(count)
+    pks = [pk for pk, _ in keys]
+    for workers in range(1, (os.cpu_count() or 1) + 1):
+        with KyberProcessEngine(DEFAULT_PARAMETERS[parameter_name], workers=workers, pin_cpus=pin_cpus) as engine:
+            engine.warm_up()
+            t0 = time()
+            engine.keygen_batch(count)
+            t1 = time()
+            encs = engine.enc_batch(pks)
+            t2 = time()
+            engine.dec_batch([(c, sk) for (c, _), (_, sk) in zip(encs, keys)])
+            t3 = time()
+        print(f"{workers} worker(s): keygen {round(count / (t1 - t0), 1)} /s, "
+              f"enc {round(count / (t2 - t1), 1)} /s, dec {round(count / (t3 - t2), 1)} /s")
+    
+
+
+# Fonction pour mesurer le retard de la boucle d'événements pendant des décapsulations concurrentes
+def benchmark_async_kyber(Kyber, name, count, tick=0.001):
+    print(f"-"*27)
+    print(f"  {name} | ({count} appels de dec)")
+    print(f"-"*27)
+    keys = Kyber.keygen_batch(count)
+    encs = Kyber.enc_batch([pk for pk, _ in keys])
+    pairs = [(c, sk) for (c, _), (_, sk) in zip(encs, keys)]
+    
+    async def measure(label, dec):
+        lags = []
+        done = False
+        async def ticker():
+            loop = asyncio.get_running_loop()
+            while not done:
+                t = loop.time()
+                await asyncio.sleep(tick)
+                lags.append(loop.time() - t - tick)
+        task = asyncio.ensure_future(ticker())
+        await asyncio.sleep(0)
+        t0 = time()
+        await asyncio.gather(*(dec(c, sk) for c, sk in pairs))
+        elapsed = time() - t0
+        done = True
+        await task
+        lags.sort()
+        print(f"{label}: {round(count / elapsed, 1)} dec/s, retard de la boucle "
+              f"p50 {round(lags[len(lags) // 2] * 1000, 2)} ms, max {round(lags[-1] * 1000, 2)} ms")
+    
+    async def run():
+        async def blocking_dec(c, sk):
+            return Kyber.dec(c, sk)
+        await measure("Appels bloquants", blocking_dec)
+        async with AsyncKyber(Kyber) as kyber:
+            await measure("AsyncKyber", kyber.dec)
+        async with AsyncKyber(Kyber, batch_window=0.005) as kyber:
+            await measure("AsyncKyber (fenêtre de 5 ms)", kyber.dec)
+    asyncio.run(run())
+    
+
+
+# Fonction pour mesurer la latence des autres tâches de la boucle pendant des
+# décapsulations bloquantes ou pas à pas, sans exécuteur
+def benchmark_cooperative(Kyber, name, count, time_slice=0.002):
+    print(f"-"*27)
+    print(f"  {name} | ({count} appels de dec)")
+    print(f"-"*27)
+    keys = Kyber.keygen_batch(count)
+    encs = Kyber.enc_batch([pk for pk, _ in keys])
+    pairs = [(c, sk) for (c, _), (_, sk) in zip(encs, keys)]
+    
+    async def measure(label, dec):
+        latencies = []
+        done = False
+        async def ping():
+            # Une autre connexion qui répond à une requête toutes les 1 ms
+            loop = asyncio.get_running_loop()
+            while not done:
+                t = loop.time()
+                await asyncio.sleep(0.001)
+                latencies.append(loop.time() - t)
+        task = asyncio.ensure_future(ping())
+        t0 = time()
+        for c, sk in pairs:
+            # Une requête par itération de la boucle
+            await asyncio.sleep(0)
+            await dec(c, sk)
+        elapsed = time() - t0
+        done = True
+        await task
+        latencies.sort()
+        print(f"{label}: {round(elapsed / count * 1000, 2)} ms / dec, latence des autres tâches "
+              f"p99 {round(latencies[int(len(latencies) * 0.99)] * 1000, 2)} ms, max {round(latencies[-1] * 1000, 2)} ms")
+    
+    async def run():
+        async def blocking_dec(c, sk):
+            return Kyber.dec(c, sk)
+        await measure("Appels bloquants", blocking_dec)
+        await measure(f"Pas à pas (tranches de {time_slice * 1000} ms)", CooperativeKyber(Kyber, time_slice).dec)
+    asyncio.run(run())
+    
+
+
+# Banc d'essai local du service KEM : débit de clients concurrents avec
+# regroupement des requêtes, contre un traitement requête par requête
+def benchmark_kem_service(parameter_name, name, clients, count):
+    print(f"-"*27)
+    print(f"  {name} | ({clients} clients x {count} dec)")
+    print(f"-"*27)
+    Kyber = KyberClass(DEFAULT_PARAMETERS[parameter_name])
+    pk, sk = Kyber.keygen()
+    c, _ = Kyber.enc(pk)
+    payload = c + sk
+    parameter = PARAMETER_SETS.index(parameter_name)
+    
+    async def client(path, latencies):
+        reader, writer = await asyncio.open_unix_connection(path)
+        loop = asyncio.get_running_loop()
+        sent = {}
+        for i in range(count):
+            sent[i] = loop.time()
+            writer.write(encode_frame(i, DEC, payload, parameter=parameter))
+        await writer.drain()
+        for _ in range(count):
+            frame = await read_frame(reader)
+            latencies.append(loop.time() - sent[frame.request_id])
+        writer.close()
+        await writer.wait_closed()
+    
+    async def run(label, max_batch_size):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "kem.sock")
+            async with KEMService(path, parameter_sets=(parameter_name,), max_batch_size=max_batch_size,
+                                  max_queue=clients * count, latency_slo=10) as service:
+                latencies = []
+                t0 = time()
+                await asyncio.gather(*(client(path, latencies) for _ in range(clients)))
+                elapsed = time() - t0
+                batches = service.metrics().batches
+        latencies.sort()
+        print(f"{label}: {round(clients * count / elapsed, 1)} dec/s, {batches} lots, latence "
+              f"p50 {round(latencies[len(latencies) // 2] * 1000, 1)} ms, p99 {round(latencies[int(len(latencies) * 0.99)] * 1000, 1)} ms")
+    
+    asyncio.run(run("Requête par requête", 1))
+    asyncio.run(run("Lots (jusqu'à 64)", 64))
+    
+
+
+# Fonction pour comparer une connexion par requête au client avec pool de
+# connexions et requêtes en pipeline, contre un service local en TCP
+def benchmark_kem_client(parameter_name, name, count):
+    print(f"-"*27)
+    print(f"  {name} | ({count} enc)")
+    print(f"-"*27)
+    Kyber = KyberClass(DEFAULT_PARAMETERS[parameter_name])
+    pk, _ = Kyber.keygen()
+    
+    with LoopbackServer(parameter_sets=(parameter_name,), max_queue=count) as server:
+        t0 = time()
+        for _ in range(count):
+            with KEMClient(server.address, parameter_name, pool_size=1) as client:
+                client.enc(pk)
+        elapsed = time() - t0
+        print(f"Connexion par requête: {round(count / elapsed, 1)} enc/s")
+        
+        with KEMClient(server.address, parameter_name, pool_size=4) as client:
+            client.enc(pk)
+            t0 = time()
+            for _ in range(count):
+                client.enc(pk)
+            elapsed = time() - t0
+            print(f"Pool, requête par requête: {round(count / elapsed, 1)} enc/s")
+            
+            t0 = time()
+            client.enc_many([pk] * count)
+            elapsed = time() - t0
+            print(f"Pool, en pipeline: {round(count / elapsed, 1)} enc/s")
+    
+
+
+# Fonction pour lancer le générateur de charge d'échanges de clés dans
+# chaque mode d'exécution
+def benchmark_load(mix, duration, concurrency=8):
+    print(f"-"*27)
+    print(f"  {mix} | ({duration} s, {concurrency} clients)")
+    print(f"-"*27)
+    for mode in ("inprocess", "process", "socket"):
+        print(format_report(run_load(mode, duration=duration, concurrency=concurrency, mix=mix)))
+    
+
+
+# Fonction pour comparer la lecture de l'archive avec `Kyber.dec` un à un
+# à la décapsulation en flux, dans le processus ou sur des processus workers
+def benchmark_stream_dec(parameter_name, name, key_count, count, workers=4):
+    print(f"-"*27)
+    print(f"  {name} | ({count} enregistrements, {key_count} clés)")
+    print(f"-"*27)
+    Kyber = KyberClass(DEFAULT_PARAMETERS[parameter_name])
+    keys = Kyber.keygen_batch(key_count)
+    sks = {f"key-{i}": sk for i, (_, sk) in enumerate(keys)}
+    jobs = [(f"key-{i % key_count}", Kyber.enc(keys[i % key_count][0])[0]) for i in range(count)]
+    
+    with tempfile.TemporaryDirectory() as directory:
+        input_path = os.path.join(directory, "archive.bin")
+        output_path = os.path.join(directory, "keys.bin")
+        write_archive(input_path, Kyber, jobs)
+        
+        t0 = time()
+        record_length = 16 + Kyber.ct_length
+        with open(input_path, "rb") as f, open(output_path, "wb") as f_out:
+            data = f.read()
+            for i in range(count):
+                record = data[i*record_length:(i+1)*record_length]
+                f_out.write(Kyber.dec(record[16:], sks[record[:16].rstrip(b"\0").decode()]))
+        print(f"dec un à un: {round(count / (time() - t0), 1)} dec/s")
+        
+        stats = StreamingDecapsulator(parameter_name, sks.__getitem__).run(input_path, output_path)
+        print(f"En flux: {round(stats.processed / stats.elapsed, 1)} dec/s")
+        
+        with KyberProcessEngine(DEFAULT_PARAMETERS[parameter_name], workers=workers) as engine:
+            engine.warm_up()
+            stats = StreamingDecapsulator(parameter_name, sks.__getitem__, engine, chunk_size=16 * workers).run(input_path, output_path)
+            print(f"En flux, {workers} processus: {round(stats.processed / stats.elapsed, 1)} dec/s")
+    
+
+
+# Fonction pour comparer `Kyber.keygen` en boucle à la génération en masse
+# par lots reproductibles, dans le processus ou sur des processus workers
+def benchmark_bulk_keygen(parameter_name, name, count, workers=4, shard_size=64):
+    print(f"-"*27)
+    print(f"  {name} | ({count} paires de clés)")
+    print(f"-"*27)
+    Kyber = KyberClass(DEFAULT_PARAMETERS[parameter_name])
+    master_seed = os.urandom(48)
+    
+    t0 = time()
+    for _ in range(count):
+        Kyber.keygen()
+    print(f"keygen en boucle: {round(count / (time() - t0), 1)} paires/s")
+    
+    with tempfile.TemporaryDirectory() as directory:
+        output_path = os.path.join(directory, "fleet.keys")
+        stats = BulkKeyGenerator(parameter_name, master_seed, shard_size).run(count, output_path)
+        print(f"Par lots: {round(stats.generated / stats.elapsed, 1)} paires/s")
+        
+        with KyberProcessEngine(DEFAULT_PARAMETERS[parameter_name], workers=workers) as engine:
+            engine.warm_up()
+            stats = BulkKeyGenerator(parameter_name, master_seed, shard_size, engine).run(count, output_path, resume=False)
+            print(f"Par lots, {workers} processus: {round(stats.generated / stats.elapsed, 1)} paires/s")
+    
+
+
+# Fonction pour mesurer le débit de la décapsulation en masse avec 1 à `max_workers`
+# processus workers sur localhost
+def benchmark_bulk_dec(parameter_name, name, key_count, count, max_workers=4, shard_size=32):
+    print(f"-"*27)
+    print(f"  {name} | ({count} travaux, {key_count} clés)")
+    print(f"-"*27)
+    Kyber = KyberClass(DEFAULT_PARAMETERS[parameter_name])
+    keys = Kyber.keygen_batch(key_count)
+    sks = {str(i): sk for i, (_, sk) in enumerate(keys)}
+    encs = Kyber.enc_batch([keys[i % key_count][0] for i in range(count)])
+    jobs = [(str(i % key_count), c) for i, (c, _) in enumerate(encs)]
+    
+    context = multiprocessing.get_context("spawn")
+    for workers in range(1, max_workers + 1):
+        ready = context.Queue()
+        processes = [context.Process(target=serve_worker, args=(parameter_name, sks, "127.0.0.1", 0, ready), daemon=True)
+                     for _ in range(workers)]
+        for process in processes:
+            process.start()
+        addresses = [ready.get() for _ in processes]
+        coordinator = BulkDecapsulationCoordinator(parameter_name, addresses, shard_size=shard_size)
+        t0 = time()
+        coordinator.run(jobs)
+        elapsed = time() - t0
+        per_worker = ", ".join(f"{round(s.throughput, 1)}" for s in coordinator.stats())
+        print(f"{workers} worker(s): {round(count / elapsed, 1)} dec/s (par worker : {per_worker} dec/s)")
+        for process in processes:
+            process.terminate()
+            process.join()
+    
     
 if __name__ == '__main__':
     # Appel des fonctions pour profiler et mesurer les performances
@@ -65,3 +666,66 @@ if __name__ == '__main__':
     benchmark_kyber(Kyber512, "Kyber512", count)
     benchmark_kyber(Kyber768, "Kyber768", count)    
     benchmark_kyber(Kyber1024, "Kyber1024", count)    
+    
+    # Latence de keygen avec l'expansion de A en série ou multithreadée
+    benchmark_matrix_expansion("kyber_768", "Kyber768", count)
+    benchmark_matrix_expansion("kyber_1024", "Kyber1024", count)
+    
+    # Allocations avec et sans tampons de sortie fournis par l'appelant
+    benchmark_output_buffers(Kyber768, "Kyber768", count)
+    
+    # Noyaux fusionnés contre le chemin étape par étape
+    benchmark_fused_kernels(Kyber768, "Kyber768", count)
+    
+    # Encapsulations répétées vers la même clé publique
+    benchmark_pk_cache("kyber_768", "Kyber768", count)
+    
+    # Décapsulation avec une clé secrète pré-expansée
+    benchmark_expanded_keys(Kyber1024, "Kyber1024", count)
+    
+    # Débit des API par lot
+    benchmark_batch(Kyber768, "Kyber768")
+    
+    # Encapsulations multiples vers un même pair
+    benchmark_encapsulation_session(Kyber768, "Kyber768", count)
+    
+    # Clés secrètes stockées sous forme de graine compacte
+    benchmark_seed_keys(Kyber1024, "Kyber1024", count)
+    
+    # Chargement des clés depuis le format expansé persistant
+    benchmark_expanded_key_format(Kyber1024, "Kyber1024", count)
+    
+    # Lots sur un pool de threads
+    benchmark_executor(Kyber768, "Kyber768", count)
+    
+    # Passage à l'échelle sur un pool de processus
+    benchmark_process_engine("kyber_512", "Kyber512", count)
+    benchmark_process_engine("kyber_768", "Kyber768", count)
+    benchmark_process_engine("kyber_1024", "Kyber1024", count)
+    
+    # Retard de la boucle d'événements avec la façade asyncio
+    benchmark_async_kyber(Kyber768, "Kyber768", count)
+    
+    # Décapsulations pas à pas dans la boucle d'événements
+    benchmark_cooperative(Kyber1024, "Kyber1024", count)
+    
+    # Service KEM local avec regroupement des requêtes
+    benchmark_kem_service("kyber_768", "Kyber768", 8, 16)
+    
+    # Client avec pool de connexions et requêtes en pipeline
+    benchmark_kem_client("kyber_768", "Kyber768", count)
+    
+    # Échanges de clés simulés : histogrammes de latence, débit et CPU
+    benchmark_load("kyber_512=1,kyber_768=3", 5)
+    
+    # Décapsulation en masse répartie sur des processus workers
+    benchmark_bulk_dec("kyber_768", "Kyber768", 16, 4 * count)
+    
+    # Décapsulation en flux d'une archive de textes chiffrés
+    benchmark_stream_dec("kyber_768", "Kyber768", 16, 4 * count)
+    
+    # Génération en masse de paires de clés par lots reproductibles
+    benchmark_bulk_keygen("kyber_768", "Kyber768", 4 * count)
+    
+    # Workers partageant les clés expansées en mémoire partagée
+    benchmark_shared_key_store("kyber_1024", "Kyber1024", 256, count)
@@ -0,0 +1,335 @@
+"""
+Décapsulation en masse répartie sur plusieurs nœuds, en TCP.
+
+Le coordinateur découpe une suite de travaux (identifiant de clé, texte
+chiffré) en lots et les envoie aux workers avec les trames de `framing`
+(opération BULK_DEC). Charge utile d'un lot :
+
+    nombre de travaux u32 | pour chaque travail :
+        longueur de l'identifiant u16 | identifiant (UTF-8) | c
+
+Réponse : pour chaque travail, statut u8 (0 : succès) | K (`key_length` octets,
+nuls en cas d'échec).
+"""
+import argparse
+import json
+import socket
+import socketserver
+import struct
+import threading
+from collections import deque, namedtuple
+from time import perf_counter
+from kyber import Kyber, DEFAULT_PARAMETERS
+from key_cache import DecapsulationKeyCache
+from framing import BULK_DEC, STATUS_OK, STATUS_ERROR, PARAMETER_SETS, encode_frame, recv_frame
+
+WorkerStats = namedtuple("WorkerStats", ["address", "alive", "shards", "jobs", "failures", "busy_time", "throughput"])
+
+_COUNT = struct.Struct("<I")
+_KEY_ID_LENGTH = struct.Struct("<H")
+
+def _encode_jobs(jobs):
+    parts = [_COUNT.pack(len(jobs))]
+    for key_id, c in jobs:
+        if not isinstance(key_id, str):
+            raise TypeError(f"Les identifiants de clé doivent être des chaînes. L'entrée est de type {type(key_id).__name__}")
+        key_id = key_id.encode()
+        parts += [_KEY_ID_LENGTH.pack(len(key_id)), key_id, c]
+    return b"".join(parts)
+
+def _decode_jobs(payload, ct_length):
+    view = memoryview(payload)
+    [count] = _COUNT.unpack_from(view)
+    index = _COUNT.size
+    jobs = []
+    for _ in range(count):
+        [length] = _KEY_ID_LENGTH.unpack_from(view, index)
+        index += _KEY_ID_LENGTH.size
+        key_id = bytes(view[index:index+length]).decode()
+        index += length
+        c = view[index:index+ct_length]
+        if len(c) != ct_length:
+            raise ValueError("Lot tronqué")
+        index += ct_length
+        jobs.append((key_id, c))
+    return jobs
+
+
+class _WorkerHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        worker = self.server
+        while True:
+            frame = recv_frame(self.request)
+            if frame is None:
+                return
+            if frame.op != BULK_DEC or frame.parameter != worker.parameter:
+                self.request.sendall(encode_frame(frame.request_id, frame.op, "Requête non prise en charge".encode(), status=STATUS_ERROR))
+                continue
+            try:
+                payload = worker.decapsulate(frame.payload)
+            except (struct.error, UnicodeDecodeError, ValueError) as e:
+                self.request.sendall(encode_frame(frame.request_id, frame.op, f"Lot invalide : {e}".encode(), status=STATUS_ERROR))
+                continue
+            self.request.sendall(encode_frame(frame.request_id, frame.op, payload))
+
+
+class DecapsulationWorker(socketserver.ThreadingTCPServer):
+    """
+    Nœud de décapsulation : reçoit des lots du coordinateur et les
+    décapsule avec des clés expansées, gardées dans un
+    `DecapsulationKeyCache` alimenté par `loader(key_id)` (octets sk,
+    graine compacte ou `DecapsulationKey`). Les identifiants de clé sont
+    des chaînes : `loader` reçoit l'identifiant tel qu'envoyé par le
+    coordinateur. Un lot mal formé reçoit une réponse STATUS_ERROR.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, parameter_name, loader, host="127.0.0.1", port=0, max_key_bytes=64 << 20, key_length=32):
+        self.kyber = Kyber(DEFAULT_PARAMETERS[parameter_name])
+        self.parameter = PARAMETER_SETS.index(parameter_name)
+        self.cache = DecapsulationKeyCache(self.kyber, loader, max_key_bytes)
+        self.key_length = key_length
+        super().__init__((host, port), _WorkerHandler)
+
+    def decapsulate(self, payload):
+        """
+        Décapsule un lot et renvoie la charge utile de la réponse.
+        """
+        jobs = _decode_jobs(payload, self.kyber.ct_length)
+        statuses = [STATUS_ERROR] * len(jobs)
+        Ks = [bytes(self.key_length)] * len(jobs)
+
+        pairs, indices = [], []
+        for i, (key_id, c) in enumerate(jobs):
+            try:
+                pairs.append((c, self.cache.get(key_id)))
+                indices.append(i)
+            except (KeyError, ValueError):
+                pass
+        for i, K in zip(indices, self.kyber.dec_batch(pairs, key_length=self.key_length)):
+            statuses[i] = STATUS_OK
+            Ks[i] = K
+        return b"".join(bytes([status]) + K for status, K in zip(statuses, Ks))
+
+
+def serve_worker(parameter_name, keys, host="127.0.0.1", port=0, ready=None):
+    """
+    Lance un nœud de décapsulation pour les clés du dictionnaire `keys`
+    (identifiant de type str -> sk ou graine). Si `ready` (une file) est donné,
+    l'adresse du nœud y est publiée une fois le socket ouvert.
+    """
+    for key_id in keys:
+        if not isinstance(key_id, str):
+            raise TypeError(f"Les identifiants de clé doivent être des chaînes. L'entrée est de type {type(key_id).__name__}")
+    with DecapsulationWorker(parameter_name, keys.__getitem__, host, port) as worker:
+        if ready is not None:
+            ready.put(worker.server_address)
+        worker.serve_forever()
+
+
+class _Shard:
+    __slots__ = ("start", "jobs", "attempts")
+
+    def __init__(self, start, jobs):
+        self.start = start
+        self.jobs = jobs
+        self.attempts = 0
+
+
+class BulkDecapsulationCoordinator:
+    """
+    Répartit des travaux de décapsulation (identifiant de clé, c) sur les
+    nœuds `workers` (adresses (hôte, port)), par lots de `shard_size`.
+    Les identifiants de clé doivent être des chaînes (TypeError sinon).
+
+    Chaque nœud est servi par un thread avec une connexion et un lot en
+    cours à la fois. Un lot dont l'envoi ou la réponse échoue (connexion
+    coupée, délai `timeout` dépassé, réponse invalide) est remis en tête de
+    file pour un autre nœud, au plus `max_retries` fois ; ses travaux sont
+    ensuite marqués en échec. Un nœud injoignable rend son lot sans le
+    compter comme une tentative, et il est abandonné après `max_retries`
+    échecs consécutifs.
+
+    Les résultats sont renvoyés dans l'ordre des travaux (`run`) ou par
+    identifiant de travail (`run_keyed`) ; un travail en échec (clé
+    inconnue, nœuds indisponibles) a pour résultat None.
+    """
+    def __init__(self, parameter_name, workers, shard_size=64, max_retries=3, timeout=60.0, key_length=32):
+        self.kyber = Kyber(DEFAULT_PARAMETERS[parameter_name])
+        self.parameter = PARAMETER_SETS.index(parameter_name)
+        self.workers = [tuple(address) for address in workers]
+        self.shard_size = shard_size
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.key_length = key_length
+        self.worker_stats = {address: dict(alive=True, shards=0, jobs=0, failures=0, busy_time=0.0) for address in self.workers}
+
+    def stats(self):
+        """
+        Statistiques par nœud, débit en travaux par seconde de calcul.
+        """
+        output = []
+        for address, stats in self.worker_stats.items():
+            throughput = stats["jobs"] / stats["busy_time"] if stats["busy_time"] else 0.0
+            output.append(WorkerStats(address, throughput=throughput, **stats))
+        return output
+
+    def run_keyed(self, jobs):
+        """
+        Comme `run` pour un dictionnaire identifiant de travail -> (identifiant
+        de clé, c). Renvoie un dictionnaire identifiant de travail -> K.
+        """
+        job_ids = list(jobs)
+        return dict(zip(job_ids, self.run(jobs[job_id] for job_id in job_ids)))
+
+    def run(self, jobs):
+        """
+        Décapsule les travaux (identifiant de clé, c) de l'itérable `jobs` et
+        renvoie la liste des K dans le même ordre. Lève RuntimeError si tous
+        les nœuds sont devenus indisponibles.
+        """
+        self.condition = threading.Condition()
+        self.pending = deque()
+        self.outstanding = 0
+        self.feeding = True
+        self.live_workers = len(self.workers)
+        self.results = []
+
+        threads = [threading.Thread(target=self._worker_loop, args=(address,), daemon=True) for address in self.workers]
+        for thread in threads:
+            thread.start()
+
+        max_pending = 2 * len(self.workers)
+        shard = []
+        try:
+            for key_id, c in jobs:
+                if not isinstance(key_id, str):
+                    raise TypeError(f"Les identifiants de clé doivent être des chaînes. L'entrée est de type {type(key_id).__name__}")
+                shard.append((key_id, c))
+                if len(shard) == self.shard_size:
+                    self._submit(shard, max_pending)
+                    shard = []
+            if shard:
+                self._submit(shard, max_pending)
+        except BaseException:
+            # Les lots déjà soumis sont terminés, puis les threads s'arrêtent
+            with self.condition:
+                self.feeding = False
+                self.condition.notify_all()
+            raise
+
+        with self.condition:
+            self.feeding = False
+            self.condition.notify_all()
+            while self.outstanding and self.live_workers:
+                self.condition.wait()
+            failed = self.outstanding
+        for thread in threads:
+            thread.join()
+        if failed:
+            raise RuntimeError(f"Tous les nœuds sont indisponibles, {failed} lots n'ont pas été traités")
+        return self.results
+
+    def _submit(self, jobs, max_pending):
+        with self.condition:
+            while len(self.pending) >= max_pending and self.live_workers:
+                self.condition.wait()
+            if not self.live_workers:
+                # Ne pas continuer à lire `jobs` : l'alimentation reste bornée
+                raise RuntimeError(f"Tous les nœuds sont indisponibles, {self.outstanding} lots n'ont pas été traités")
+            shard = _Shard(len(self.results), jobs)
+            self.results.extend([None] * len(jobs))
+            self.pending.append(shard)
+            self.outstanding += 1
+            self.condition.notify_all()
+
+    def _next_shard(self):
+        with self.condition:
+            while not self.pending:
+                if not self.feeding and not self.outstanding:
+                    return None
+                self.condition.wait()
+            shard = self.pending.popleft()
+            self.condition.notify_all()
+            return shard
+
+    def _worker_loop(self, address):
+        stats = self.worker_stats[address]
+        sock = None
+        consecutive_failures = 0
+        try:
+            while True:
+                shard = self._next_shard()
+                if shard is None:
+                    return
+                t0 = perf_counter()
+                if sock is None:
+                    try:
+                        sock = socket.create_connection(address, timeout=self.timeout)
+                    except OSError:
+                        # Nœud injoignable : le lot n'y est pour rien et n'est pas compté comme une tentative
+                        consecutive_failures += 1
+                        self._retry(shard, stats, count_attempt=False)
+                        if consecutive_failures >= self.max_retries:
+                            return
+                        continue
+                try:
+                    sock.sendall(encode_frame(shard.start, BULK_DEC, _encode_jobs(shard.jobs), parameter=self.parameter))
+                    frame = recv_frame(sock)
+                    record_length = 1 + self.key_length
+                    if frame is None or frame.status != STATUS_OK or len(frame.payload) != len(shard.jobs) * record_length:
+                        raise ConnectionError(f"Réponse invalide du nœud {address}")
+                except (OSError, ValueError) as e:
+                    if sock is not None:
+                        sock.close()
+                        sock = None
+                    consecutive_failures += 1
+                    self._retry(shard, stats)
+                    if consecutive_failures >= self.max_retries:
+                        return
+                    continue
+
+                consecutive_failures = 0
+                payload = frame.payload
+                with self.condition:
+                    for i in range(len(shard.jobs)):
+                        record = payload[i*record_length:(i+1)*record_length]
+                        if record[0] == STATUS_OK:
+                            self.results[shard.start + i] = record[1:]
+                    stats["shards"] += 1
+                    stats["jobs"] += len(shard.jobs)
+                    stats["busy_time"] += perf_counter() - t0
+                    self.outstanding -= 1
+                    self.condition.notify_all()
+        finally:
+            if sock is not None:
+                sock.close()
+            with self.condition:
+                if consecutive_failures >= self.max_retries:
+                    stats["alive"] = False
+                self.live_workers -= 1
+                self.condition.notify_all()
+
+    def _retry(self, shard, stats, count_attempt=True):
+        with self.condition:
+            stats["failures"] += 1
+            shard.attempts += count_attempt
+            if shard.attempts > self.max_retries:
+                # Abandon : les travaux du lot restent en échec (None)
+                self.outstanding -= 1
+            else:
+                self.pending.appendleft(shard)
+            self.condition.notify_all()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Nœud de décapsulation en masse")
+    parser.add_argument("keys", help="fichier JSON identifiant de clé -> sk (hexadécimal)")
+    parser.add_argument("--parameter", default="kyber_768", choices=PARAMETER_SETS)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7000)
+    args = parser.parse_args()
+    with open(args.keys) as f:
+        keys = {key_id: bytes.fromhex(sk) for key_id, sk in json.load(f).items()}
+    serve_worker(args.parameter, keys, args.host, args.port)
@@ -0,0 +1,273 @@
+"""
+Génération en masse de paires de clés, reproductible par lot.
+
+Les N paires sont découpées en lots de `shard_size`. La graine du lot i est
+tirée d'un `AES256_CTR_DRBG` instancié avec la graine maître (48 octets)
+et la chaîne de personnalisation b"kyber-shard" || i (u64 gros-boutiste) ;
+les paires du lot sont celles de `Kyber.keygen` avec le DRBG semé par
+cette graine (voir `generate_shard`). Tout lot peut ainsi être régénéré
+et audité séparément, à partir de la seule graine maître.
+
+Fichiers produits :
+  - `output` : enregistrements de taille fixe pk || sk, dans l'ordre ;
+  - `output + ".index"` : en-tête (format "KYBK", jeu de paramètres,
+    nombre de clés, taille des lots, SHA3-256 de la graine maître), puis
+    le SHA3-256 des enregistrements de chaque lot, puis H(pk) de chaque
+    clé, dans l'ordre.
+
+Un point de reprise (JSON) est mis à jour après chaque lot écrit et
+synchronisé ; une génération interrompue reprend au lot suivant.
+"""
+import argparse
+import json
+import os
+import struct
+import sys
+from collections import namedtuple
+from hashlib import sha3_256
+from time import perf_counter
+from kyber import Kyber, DEFAULT_PARAMETERS
+from aes256_ctr_drbg import AES256_CTR_DRBG
+from process_engine import KyberProcessEngine
+from framing import PARAMETER_SETS
+
+INDEX_MAGIC = b"KYBK"
+
+_INDEX_HEADER = struct.Struct("<4sB3xQI4x32s")
+
+KeyIndex = namedtuple("KeyIndex", ["parameter_name", "count", "shard_size", "seed_fingerprint", "shard_digests", "hpks"])
+
+KeygenStats = namedtuple("KeygenStats", ["count", "generated", "elapsed"])
+
+def shard_seed(master_seed, shard):
+    """
+    Graine (48 octets) du DRBG du lot `shard`.
+    """
+    personalization = b"kyber-shard" + shard.to_bytes(8, "big")
+    return AES256_CTR_DRBG(bytes(master_seed), personalization=personalization).random_bytes(48)
+
+def _shard_seeds(master_seed, shard, count):
+    """
+    Graines compactes d || z concaténées du lot, tirées dans le même ordre
+    que `Kyber.generate_seed`.
+    """
+    drbg = AES256_CTR_DRBG(shard_seed(master_seed, shard))
+    return b"".join(drbg.random_bytes(32) + drbg.random_bytes(32) for _ in range(count))
+
+def generate_shard(kyber, master_seed, shard, count):
+    """
+    Régénère les `count` paires (pk, sk) du lot `shard`, dans ce processus.
+    Identique à `kyber.set_drbg_seed(shard_seed(master_seed, shard))` suivi
+    de `count` appels à `kyber.keygen()`.
+    """
+    seeds = _shard_seeds(master_seed, shard, count)
+    length = kyber.seed_length
+    return [kyber.keygen_from_seed(seeds[i*length:(i+1)*length]) for i in range(count)]
+
+def read_index(path):
+    """
+    Lit un fichier d'index et renvoie un `KeyIndex`.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, parameter, count, shard_size, seed_fingerprint = _INDEX_HEADER.unpack_from(data)
+    if magic != INDEX_MAGIC:
+        raise ValueError(f"Format d'index inconnu : {magic!r}")
+    shards = -(-count // shard_size)
+    offset = _INDEX_HEADER.size
+    if len(data) != offset + 32 * (shards + count):
+        raise ValueError("Index tronqué")
+    shard_digests = [data[offset+32*i:offset+32*(i+1)] for i in range(shards)]
+    offset += 32 * shards
+    hpks = [data[offset+32*i:offset+32*(i+1)] for i in range(count)]
+    return KeyIndex(PARAMETER_SETS[parameter], count, shard_size, seed_fingerprint, shard_digests, hpks)
+
+def read_keypair(path, kyber, i):
+    """
+    Lit la paire (pk, sk) numéro `i` d'un fichier de clés.
+    """
+    record_length = kyber.pk_length + kyber.sk_length
+    with open(path, "rb") as f:
+        f.seek(i * record_length)
+        record = f.read(record_length)
+    if len(record) != record_length:
+        raise IndexError(f"Pas de paire de clés numéro {i} dans {path}")
+    return record[:kyber.pk_length], record[kyber.pk_length:]
+
+
+class BulkKeyGenerator:
+    """
+    Génère des paires de clés par lots reproductibles (voir plus haut).
+
+    Les lots sont calculés par `engine`, un `KyberProcessEngine` du même
+    jeu de paramètres pour utiliser tous les cœurs, ou dans ce processus
+    si `engine` est None.
+
+    Exemple :
+        with KyberProcessEngine(DEFAULT_PARAMETERS["kyber_768"]) as engine:
+            generator = BulkKeyGenerator("kyber_768", master_seed, engine=engine)
+            generator.run(100000, "fleet.keys")
+    """
+    def __init__(self, parameter_name, master_seed, shard_size=1024, engine=None):
+        if len(master_seed) != 48:
+            raise ValueError(f"La graine maître doit avoir une longueur de 48 octets. L'entrée a une longueur de {len(master_seed)}")
+        self.parameter_name = parameter_name
+        self.kyber = Kyber(DEFAULT_PARAMETERS[parameter_name])
+        self.master_seed = bytes(master_seed)
+        self.seed_fingerprint = sha3_256(self.master_seed).digest()
+        self.shard_size = shard_size
+        self.engine = engine
+        self.record_length = self.kyber.pk_length + self.kyber.sk_length
+
+    def generate_raw(self, shard, count):
+        """
+        Renvoie les enregistrements pk || sk concaténés du lot `shard`.
+        """
+        if self.engine is None:
+            return b"".join(pk + sk for pk, sk in generate_shard(self.kyber, self.master_seed, shard, count))
+        return self.engine.keygen_raw(count, seeds=_shard_seeds(self.master_seed, shard, count))
+
+    def _shard_count(self, count, shard):
+        return min(self.shard_size, count - shard * self.shard_size)
+
+    def _checkpoint_state(self, count):
+        return {"parameter": self.parameter_name, "count": count, "shard_size": self.shard_size,
+                "seed_fingerprint": self.seed_fingerprint.hex()}
+
+    def _load_checkpoint(self, checkpoint_path, count):
+        try:
+            with open(checkpoint_path) as f:
+                checkpoint = json.load(f)
+        except FileNotFoundError:
+            return 0
+        shards_done = checkpoint.pop("shards_done")
+        if checkpoint != self._checkpoint_state(count):
+            raise ValueError(f"Le point de reprise {checkpoint_path} ne correspond pas à ces paramètres ou à cette graine")
+        return shards_done
+
+    def _save_checkpoint(self, checkpoint_path, count, shards_done):
+        checkpoint = dict(self._checkpoint_state(count), shards_done=shards_done)
+        temporary_path = checkpoint_path + ".tmp"
+        with open(temporary_path, "w") as f:
+            json.dump(checkpoint, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary_path, checkpoint_path)
+
+    def _write_index(self, output_path, count):
+        """
+        Écrit l'index à partir du fichier de clés : H(pk) est lu dans sk.
+        """
+        shards = -(-count // self.shard_size)
+        shard_digests, hpks = [], []
+        with open(output_path, "rb") as f:
+            for shard in range(shards):
+                records = f.read(self._shard_count(count, shard) * self.record_length)
+                shard_digests.append(sha3_256(records).digest())
+                for i in range(0, len(records), self.record_length):
+                    hpks.append(records[i+self.record_length-64:i+self.record_length-32])
+        header = _INDEX_HEADER.pack(INDEX_MAGIC, PARAMETER_SETS.index(self.parameter_name), count,
+                                    self.shard_size, self.seed_fingerprint)
+        temporary_path = output_path + ".index.tmp"
+        with open(temporary_path, "wb") as f:
+            f.write(header + b"".join(shard_digests) + b"".join(hpks))
+        os.replace(temporary_path, output_path + ".index")
+
+    def run(self, count, output_path, resume=True, progress=None):
+        """
+        Génère `count` paires de clés dans `output_path` et son index, et
+        renvoie un `KeygenStats` (`generated` : paires générées par cet
+        appel).
+
+        Avec `resume`, reprend au point de reprise `output_path + ".checkpoint"`
+        s'il existe. `progress(keys_done, count, rate)` est appelé après
+        chaque lot, `rate` étant le débit de cet appel en paires par seconde.
+        """
+        t0 = perf_counter()
+        checkpoint_path = output_path + ".checkpoint"
+        shards = -(-count // self.shard_size)
+        start = self._load_checkpoint(checkpoint_path, count) if resume else 0
+        if not (start and os.path.exists(output_path)):
+            start = 0
+        done = min(count, start * self.shard_size)
+
+        with open(output_path, "r+b" if start else "wb") as f:
+            # Un lot écrit en partie après le dernier point de reprise est régénéré
+            f.truncate(done * self.record_length)
+            f.seek(done * self.record_length)
+            for shard in range(start, shards):
+                n = self._shard_count(count, shard)
+                f.write(self.generate_raw(shard, n))
+                f.flush()
+                os.fsync(f.fileno())
+                self._save_checkpoint(checkpoint_path, count, shard + 1)
+                if progress is not None:
+                    keys_done = shard * self.shard_size + n
+                    progress(keys_done, count, (keys_done - done) / (perf_counter() - t0))
+
+        self._write_index(output_path, count)
+        if os.path.exists(checkpoint_path):
+            os.unlink(checkpoint_path)
+        return KeygenStats(count, count - done, perf_counter() - t0)
+
+    def verify_shard(self, output_path, shard):
+        """
+        Régénère le lot `shard` et vérifie qu'il correspond au fichier de
+        clés et à son index.
+        """
+        index = read_index(output_path + ".index")
+        if index.seed_fingerprint != self.seed_fingerprint or index.parameter_name != self.parameter_name \
+                or index.shard_size != self.shard_size:
+            raise ValueError("L'index ne correspond pas à cette graine maître ou à ces paramètres")
+        n = min(self.shard_size, index.count - shard * self.shard_size)
+        if shard < 0 or n <= 0:
+            raise IndexError(f"Pas de lot numéro {shard}")
+        records = self.generate_raw(shard, n)
+        with open(output_path, "rb") as f:
+            f.seek(shard * self.shard_size * self.record_length)
+            stored = f.read(len(records))
+        return stored == records and sha3_256(records).digest() == index.shard_digests[shard]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Génération en masse de paires de clés Kyber")
+    parser.add_argument("count", type=int, help="nombre de paires de clés")
+    parser.add_argument("output", help="fichier de clés (enregistrements pk || sk)")
+    parser.add_argument("--parameter", default="kyber_768", choices=PARAMETER_SETS)
+    parser.add_argument("--seed-file", default=None,
+                        help="graine maître de 48 octets (créée si absente, par défaut OUTPUT.seed)")
+    parser.add_argument("--shard-size", type=int, default=1024)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processus workers (0 : dans ce processus)")
+    parser.add_argument("--restart", action="store_true", help="ignorer le point de reprise")
+    parser.add_argument("--verify", type=int, nargs="*", metavar="SHARD", help="vérifier des lots au lieu de générer")
+    args = parser.parse_args()
+
+    seed_file = args.seed_file or args.output + ".seed"
+    if os.path.exists(seed_file):
+        with open(seed_file, "rb") as f:
+            master_seed = f.read()
+    else:
+        # La graine maître permet de régénérer toutes les clés secrètes : même protection que les clés
+        master_seed = os.urandom(48)
+        with open(os.open(seed_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), "wb") as f:
+            f.write(master_seed)
+        print(f"Graine maître créée : {seed_file}", file=sys.stderr)
+
+    engine = KyberProcessEngine(DEFAULT_PARAMETERS[args.parameter], workers=args.workers) if args.workers else None
+    try:
+        generator = BulkKeyGenerator(args.parameter, master_seed, args.shard_size, engine)
+        if args.verify is not None:
+            shards = args.verify or range(len(read_index(args.output + ".index").shard_digests))
+            for shard in shards:
+                print(f"Lot {shard} : {'conforme' if generator.verify_shard(args.output, shard) else 'NON CONFORME'}")
+        else:
+            def progress(done, total, rate):
+                print(f"\r{done}/{total} paires ({100 * done / total:.1f} %), {rate:.1f} paires/s",
+                      end="", file=sys.stderr)
+            stats = generator.run(args.count, args.output, resume=not args.restart, progress=progress)
+            print(file=sys.stderr)
+            print(f"{stats.generated} paires générées sur {stats.count} en {stats.elapsed:.2f} s "
+                  f"({stats.generated / stats.elapsed:.1f} paires/s)")
+    finally:
+        if engine is not None:
+            engine.shutdown()
@@ -0,0 +1,98 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from utils import as_memoryview
+
+
+class KyberExecutor:
+    """
+    Exécute des lots de keygen / enc / dec sur un pool de threads.
+
+    Chaque lot est découpé en morceaux contigus traités en parallèle par
+    les méthodes par lot de `Kyber` (expansion des clés comprise), et les
+    résultats sont écrits dans un même tampon puis renvoyés dans l'ordre.
+
+    Les octets aléatoires sont tirés dans le thread appelant, dans le même
+    ordre que `Kyber.keygen_batch` / `Kyber.enc_batch` : après
+    `set_drbg_seed` (pour l'instance ou pour ce thread), les résultats sont identiques à ceux
+    des méthodes en série, quel que soit le nombre de threads.
+
+    Le gain dépend de l'interpréteur : sur un CPython avec GIL, seules les
+    fonctions de hashlib relâchent le verrou ; sur un CPython sans GIL
+    (free-threaded), les morceaux s'exécutent réellement en parallèle.
+    """
+    def __init__(self, kyber, max_workers=None, chunk_size=None):
+        self.kyber = kyber
+        # Même valeur par défaut que ThreadPoolExecutor
+        self.max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="kyber-executor")
+        self.chunk_size = chunk_size
+
+    def _chunks(self, count):
+        chunk_size = self.chunk_size or max(1, -(-count // self.max_workers))
+        return [(i, min(i + chunk_size, count)) for i in range(0, count, chunk_size)]
+
+    def _run(self, fn, count):
+        """
+        Appelle `fn(start, stop)` sur chaque morceau et attend la fin de
+        tous les morceaux (la première exception est propagée).
+        """
+        futures = [self.executor.submit(fn, start, stop) for start, stop in self._chunks(count)]
+        for future in futures:
+            future.result()
+
+    def keygen_batch(self, count):
+        """
+        Comme `Kyber.keygen_batch`.
+        """
+        kyber = self.kyber
+        seeds = [(kyber.random_bytes(32), kyber.random_bytes(32)) for _ in range(count)]
+        pks = kyber._output_views(bytearray(count * kyber.pk_length), count, kyber.pk_length)
+        sks = kyber._output_views(bytearray(count * kyber.sk_length), count, kyber.sk_length)
+
+        def keygen_chunk(start, stop):
+            kyber._keygen_batch(seeds[start:stop], pks[start:stop], sks[start:stop])
+        self._run(keygen_chunk, count)
+        return [(bytes(pk), bytes(sk)) for pk, sk in zip(pks, sks)]
+
+    def enc_batch(self, pks, key_length=32):
+        """
+        Comme `Kyber.enc_batch`.
+        """
+        kyber = self.kyber
+        pks = list(pks)
+        count = len(pks)
+        coins = [kyber.random_bytes(32) for _ in range(count)]
+        cs = kyber._output_views(bytearray(count * kyber.ct_length), count, kyber.ct_length)
+        Ks = kyber._output_views(bytearray(count * key_length), count, key_length)
+
+        def enc_chunk(start, stop):
+            eks = kyber._expand_keys(pks[start:stop], kyber.encapsulation_key)
+            kyber._enc_batch(eks, cs[start:stop], Ks[start:stop], key_length, coins=coins[start:stop])
+        self._run(enc_chunk, count)
+        return [(bytes(c), bytes(K)) for c, K in zip(cs, Ks)]
+
+    def dec_batch(self, pairs, key_length=32):
+        """
+        Comme `Kyber.dec_batch`.
+        """
+        kyber = self.kyber
+        cs = [as_memoryview(c) for c, _ in pairs]
+        kyber._check_ciphertexts(cs)
+        sks = [sk for _, sk in pairs]
+        count = len(cs)
+        Ks = kyber._output_views(bytearray(count * key_length), count, key_length)
+
+        def dec_chunk(start, stop):
+            dks = kyber._expand_keys(sks[start:stop], kyber.decapsulation_key)
+            kyber._dec_batch(cs[start:stop], dks, Ks[start:stop], key_length)
+        self._run(dec_chunk, count)
+        return [bytes(K) for K in Ks]
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
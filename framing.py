@@ -0,0 +1,107 @@
+"""
+Format binaire des trames échangées avec le service KEM.
+
+Une trame est un en-tête de 16 octets suivi de la charge utile :
+
+    longueur de la charge u32 | identifiant de requête u32 | opération u8
+    | statut u8 | jeu de paramètres u8 | réservé (1) | délai en ms u32
+
+Requêtes (statut 0) et charges utiles des réponses :
+
+    KEYGEN : vide          -> pk || sk
+    ENC    : pk            -> c || K
+    DEC    : c || sk       -> K
+    BULK_DEC : lot de (identifiant de clé, c), voir `bulk_dec`
+
+Le délai (0 : aucun) est compté à partir de la réception de la requête.
+Une réponse en erreur porte un message UTF-8. Les réponses reprennent
+l'identifiant de la requête et peuvent arriver dans le désordre.
+"""
+import asyncio
+import struct
+from collections import namedtuple
+
+KEYGEN = 1
+ENC = 2
+DEC = 3
+BULK_DEC = 4
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+STATUS_OVERLOADED = 2
+STATUS_DEADLINE_EXCEEDED = 3
+
+PARAMETER_SETS = ("kyber_512", "kyber_768", "kyber_1024")
+
+MAX_PAYLOAD_LENGTH = 1 << 24
+
+HEADER = struct.Struct("<IIBBBxI")
+
+Frame = namedtuple("Frame", ["request_id", "op", "status", "parameter", "deadline_ms", "payload"])
+
+def encode_frame(request_id, op, payload=b"", status=STATUS_OK, parameter=0, deadline_ms=0):
+    """
+    Encode une trame (en-tête et charge utile).
+    """
+    if len(payload) > MAX_PAYLOAD_LENGTH:
+        raise ValueError(f"La charge utile dépasse {MAX_PAYLOAD_LENGTH} octets")
+    return HEADER.pack(len(payload), request_id, op, status, parameter, deadline_ms) + payload
+
+def decode_header(header):
+    """
+    Décode un en-tête de `HEADER.size` octets. Renvoie la longueur de la
+    charge utile et la trame sans sa charge utile.
+    """
+    length, request_id, op, status, parameter, deadline_ms = HEADER.unpack(header)
+    if length > MAX_PAYLOAD_LENGTH:
+        raise ValueError(f"La charge utile annoncée dépasse {MAX_PAYLOAD_LENGTH} octets : {length}")
+    return length, Frame(request_id, op, status, parameter, deadline_ms, b"")
+
+async def read_frame(reader):
+    """
+    Lit une trame depuis un `asyncio.StreamReader`. Renvoie None si la
+    connexion est fermée entre deux trames.
+    """
+    try:
+        header = await reader.readexactly(HEADER.size)
+    except asyncio.IncompleteReadError as e:
+        if not e.partial:
+            return None
+        raise ConnectionError("Connexion fermée au milieu d'une trame") from e
+    length, frame = decode_header(header)
+    try:
+        payload = await reader.readexactly(length) if length else b""
+    except asyncio.IncompleteReadError as e:
+        raise ConnectionError("Connexion fermée au milieu d'une trame") from e
+    return frame._replace(payload=payload)
+
+def recv_exactly(sock, length):
+    """
+    Lit exactement `length` octets depuis un socket bloquant. Renvoie None
+    si la connexion est fermée avant le premier octet.
+    """
+    buffer = bytearray(length)
+    view = memoryview(buffer)
+    received = 0
+    while received < length:
+        n = sock.recv_into(view[received:])
+        if n == 0:
+            if received == 0:
+                return None
+            raise ConnectionError("Connexion fermée au milieu d'une trame")
+        received += n
+    return bytes(buffer)
+
+def recv_frame(sock):
+    """
+    Lit une trame depuis un socket bloquant. Renvoie None si la connexion
+    est fermée entre deux trames.
+    """
+    header = recv_exactly(sock, HEADER.size)
+    if header is None:
+        return None
+    length, frame = decode_header(header)
+    payload = recv_exactly(sock, length) if length else b""
+    if payload is None:
+        raise ConnectionError("Connexion fermée au milieu d'une trame")
+    return frame._replace(payload=payload)
@@ -0,0 +1,436 @@
+"""
+Clients du service KEM (voir `kem_service` et `framing`).
+
+`KEMClient` (bloquant) et `AsyncKEMClient` (asyncio) gardent un pool de
+`pool_size` connexions ouvertes. Sur chaque connexion, jusqu'à
+`max_in_flight` requêtes sont envoyées sans attendre les réponses, qui
+sont associées aux requêtes par leur identifiant. Chaque appel a un délai
+`timeout` (transmis au service, qui abandonne la requête une fois le délai
+dépassé) et est retenté au plus `retries` fois si la connexion est perdue
+(immédiatement, sur une autre connexion) ou si le service est surchargé
+(après un délai aléatoire qui double à chaque tentative, borné par
+`MAX_OVERLOAD_BACKOFF`).
+
+`LoopbackServer` lance un `KEMService` local en TCP dans un thread, pour
+les tests et les benchmarks.
+"""
+import asyncio
+import itertools
+import random
+import socket
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from kyber import Kyber, DEFAULT_PARAMETERS
+from framing import (KEYGEN, ENC, DEC, STATUS_OK, STATUS_ERROR, STATUS_OVERLOADED, STATUS_DEADLINE_EXCEEDED,
+                     PARAMETER_SETS, encode_frame, read_frame, recv_frame)
+from kem_service import KEMService
+from utils import as_memoryview
+
+# Délai avant de renvoyer une requête refusée pour surcharge (secondes)
+OVERLOAD_BACKOFF = 0.01
+MAX_OVERLOAD_BACKOFF = 0.2
+
+
+class _Overloaded(Exception):
+    pass
+
+
+class _ClientBase:
+    def __init__(self, address, parameter_name, pool_size, max_in_flight, timeout, retries):
+        if parameter_name not in PARAMETER_SETS:
+            raise ValueError(f"Jeu de paramètres inconnu : {parameter_name}. Essayez parmi {PARAMETER_SETS}")
+        kyber = Kyber(DEFAULT_PARAMETERS[parameter_name])
+        self.pk_length = kyber.pk_length
+        self.sk_length = kyber.sk_length
+        self.ct_length = kyber.ct_length
+        self.parameter = PARAMETER_SETS.index(parameter_name)
+        self.address = address
+        self.pool_size = pool_size
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.retries = retries
+        self.connections = [None] * pool_size
+        self.next_connection = itertools.count()
+
+    @property
+    def deadline_ms(self):
+        return int(self.timeout * 1000) if self.timeout else 0
+
+    def _enc_payload(self, pk):
+        pk = as_memoryview(pk)
+        if len(pk) != self.pk_length:
+            raise ValueError(f"La clé publique doit avoir une longueur de {self.pk_length} octets. L'entrée a une longueur de {len(pk)}")
+        return bytes(pk)
+
+    def _dec_payload(self, c, sk):
+        c, sk = as_memoryview(c), as_memoryview(sk)
+        if len(c) != self.ct_length or len(sk) != self.sk_length:
+            raise ValueError(f"Un texte chiffré de {self.ct_length} octets et une clé secrète de {self.sk_length} octets sont attendus")
+        return bytes(c) + bytes(sk)
+
+    def _parse(self, op, frame):
+        if frame.status == STATUS_OVERLOADED:
+            raise _Overloaded()
+        if frame.status == STATUS_DEADLINE_EXCEEDED:
+            raise TimeoutError("Le délai de la requête a été dépassé par le service")
+        if frame.status == STATUS_ERROR:
+            raise ValueError(f"Requête rejetée par le service : {frame.payload.decode(errors='replace')}")
+        if frame.status != STATUS_OK:
+            raise RuntimeError(f"Statut de réponse inconnu : {frame.status}")
+        payload = frame.payload
+        if op == KEYGEN:
+            return payload[:self.pk_length], payload[self.pk_length:]
+        if op == ENC:
+            return payload[:self.ct_length], payload[self.ct_length:]
+        return payload
+
+    @staticmethod
+    def _backoff(error, attempt):
+        """
+        Délai avant la tentative suivante : nul après une connexion perdue,
+        exponentiel avec gigue après une surcharge.
+        """
+        if not isinstance(error, _Overloaded):
+            return 0
+        return random.uniform(0.5, 1) * min(MAX_OVERLOAD_BACKOFF, OVERLOAD_BACKOFF * 2**attempt)
+
+    def _retry_error(self, error):
+        if isinstance(error, _Overloaded):
+            return RuntimeError(f"Le service est surchargé (après {self.retries} nouvelles tentatives)")
+        return error
+
+
+class _Connection:
+    """
+    Connexion bloquante avec requêtes en vol ; un thread lit les réponses.
+    """
+    def __init__(self, address, max_in_flight, timeout):
+        if isinstance(address, str):
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.settimeout(timeout)
+            self.sock.connect(address)
+        else:
+            self.sock = socket.create_connection(address, timeout=timeout)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.settimeout(None)
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(max_in_flight)
+        self.timeout = timeout
+        self.pending = {}
+        self.request_ids = itertools.count(1)
+        self.closed = False
+        threading.Thread(target=self._read, name="kyber-client-reader", daemon=True).start()
+
+    def submit(self, op, payload, parameter, deadline_ms):
+        if not self.slots.acquire(timeout=self.timeout):
+            raise TimeoutError("Trop de requêtes en vol sur la connexion")
+        future = Future()
+        future.add_done_callback(lambda _: self.slots.release())
+        with self.lock:
+            if self.closed:
+                future.set_exception(ConnectionError("Connexion fermée"))
+                return future
+            request_id = next(self.request_ids) & 0xFFFFFFFF
+            self.pending[request_id] = future
+            try:
+                self.sock.sendall(encode_frame(request_id, op, payload, parameter=parameter, deadline_ms=deadline_ms))
+            except OSError as e:
+                self._fail_locked(ConnectionError(f"Envoi impossible : {e}"))
+        return future
+
+    def _read(self):
+        try:
+            while True:
+                frame = recv_frame(self.sock)
+                if frame is None:
+                    raise ConnectionError("Connexion fermée par le service")
+                with self.lock:
+                    future = self.pending.pop(frame.request_id, None)
+                if future is not None and future.set_running_or_notify_cancel():
+                    future.set_result(frame)
+        except (OSError, ValueError) as e:
+            with self.lock:
+                self._fail_locked(e if isinstance(e, ConnectionError) else ConnectionError(str(e)))
+
+    def _fail_locked(self, error):
+        self.closed = True
+        pending, self.pending = self.pending, {}
+        for future in pending.values():
+            if future.set_running_or_notify_cancel():
+                future.set_exception(error)
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+    def close(self):
+        with self.lock:
+            if not self.closed:
+                self._fail_locked(ConnectionError("Connexion fermée"))
+
+
+class KEMClient(_ClientBase):
+    """
+    Client bloquant, utilisable depuis plusieurs threads.
+
+    Exemple :
+        with KEMClient(("127.0.0.1", 7000), "kyber_768") as client:
+            c, K = client.enc(pk)
+    """
+    def __init__(self, address, parameter_name="kyber_768", pool_size=4, max_in_flight=32, timeout=5.0, retries=2):
+        super().__init__(address, parameter_name, pool_size, max_in_flight, timeout, retries)
+        self.lock = threading.Lock()
+
+    def _connection(self):
+        with self.lock:
+            i = next(self.next_connection) % self.pool_size
+            connection = self.connections[i]
+            if connection is None or connection.closed:
+                connection = self.connections[i] = _Connection(self.address, self.max_in_flight, self.timeout)
+            return connection
+
+    def _submit(self, op, payload):
+        try:
+            return self._connection().submit(op, payload, self.parameter, self.deadline_ms)
+        except ConnectionError as e:
+            future = Future()
+            future.set_exception(e)
+            return future
+
+    def _result(self, op, payload, future):
+        """
+        Attend la réponse de `future`, en renvoyant la requête sur une autre
+        connexion si la connexion est perdue ou si le service est surchargé.
+        """
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self._backoff(error, attempt - 1))
+                future = self._submit(op, payload)
+            try:
+                return self._parse(op, future.result(self.timeout))
+            except FutureTimeoutError:
+                future.cancel()
+                raise TimeoutError(f"Pas de réponse du service après {self.timeout} s")
+            except (ConnectionError, _Overloaded) as e:
+                error = e
+        raise self._retry_error(error)
+
+    def _call_many(self, op, payloads):
+        # Toutes les requêtes sont envoyées avant d'attendre la première réponse
+        futures = [self._submit(op, payload) for payload in payloads]
+        return [self._result(op, payload, future) for payload, future in zip(payloads, futures)]
+
+    def keygen(self):
+        return self._call_many(KEYGEN, [b""])[0]
+
+    def enc(self, pk):
+        return self._call_many(ENC, [self._enc_payload(pk)])[0]
+
+    def dec(self, c, sk):
+        return self._call_many(DEC, [self._dec_payload(c, sk)])[0]
+
+    def enc_many(self, pks):
+        """
+        Encapsule vers chaque clé publique de `pks`, requêtes en pipeline.
+        """
+        return self._call_many(ENC, [self._enc_payload(pk) for pk in pks])
+
+    def dec_many(self, pairs):
+        """
+        Décapsule chaque couple (c, sk) de `pairs`, requêtes en pipeline.
+        """
+        return self._call_many(DEC, [self._dec_payload(c, sk) for c, sk in pairs])
+
+    def close(self):
+        with self.lock:
+            connections, self.connections = self.connections, [None] * self.pool_size
+        for connection in connections:
+            if connection is not None:
+                connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class _AsyncConnection:
+    """
+    Connexion asyncio avec requêtes en vol ; une tâche lit les réponses.
+    """
+    @classmethod
+    async def open(cls, address, max_in_flight):
+        if isinstance(address, str):
+            reader, writer = await asyncio.open_unix_connection(address)
+        else:
+            reader, writer = await asyncio.open_connection(*address)
+        return cls(reader, writer, max_in_flight)
+
+    def __init__(self, reader, writer, max_in_flight):
+        self.reader = reader
+        self.writer = writer
+        self.slots = asyncio.Semaphore(max_in_flight)
+        self.pending = {}
+        self.request_ids = itertools.count(1)
+        self.closed = False
+        self.task = asyncio.ensure_future(self._read())
+
+    async def request(self, op, payload, parameter, deadline_ms):
+        async with self.slots:
+            if self.closed:
+                raise ConnectionError("Connexion fermée")
+            request_id = next(self.request_ids) & 0xFFFFFFFF
+            future = asyncio.get_running_loop().create_future()
+            self.pending[request_id] = future
+            try:
+                self.writer.write(encode_frame(request_id, op, payload, parameter=parameter, deadline_ms=deadline_ms))
+                await self.writer.drain()
+                return await future
+            finally:
+                self.pending.pop(request_id, None)
+
+    async def _read(self):
+        error = ConnectionError("Connexion fermée par le service")
+        try:
+            while True:
+                frame = await read_frame(self.reader)
+                if frame is None:
+                    break
+                future = self.pending.pop(frame.request_id, None)
+                if future is not None and not future.done():
+                    future.set_result(frame)
+        except (OSError, ValueError) as e:
+            error = e if isinstance(e, ConnectionError) else ConnectionError(str(e))
+        finally:
+            self.closed = True
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(error)
+            self.pending.clear()
+            self.writer.close()
+
+    async def close(self):
+        self.closed = True
+        self.writer.close()
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+
+
+class AsyncKEMClient(_ClientBase):
+    """
+    Client asyncio, même interface que `KEMClient` avec `await`.
+    """
+    def __init__(self, address, parameter_name="kyber_768", pool_size=4, max_in_flight=32, timeout=5.0, retries=2):
+        super().__init__(address, parameter_name, pool_size, max_in_flight, timeout, retries)
+        self.lock = asyncio.Lock()
+
+    async def _connection(self):
+        async with self.lock:
+            i = next(self.next_connection) % self.pool_size
+            connection = self.connections[i]
+            if connection is None or connection.closed:
+                connection = self.connections[i] = await _AsyncConnection.open(self.address, self.max_in_flight)
+            return connection
+
+    async def _call(self, op, payload):
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(self._backoff(error, attempt - 1))
+            try:
+                connection = await self._connection()
+                request = connection.request(op, payload, self.parameter, self.deadline_ms)
+                frame = await asyncio.wait_for(request, self.timeout)
+                return self._parse(op, frame)
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"Pas de réponse du service après {self.timeout} s")
+            except (ConnectionError, _Overloaded) as e:
+                error = e
+        raise self._retry_error(error)
+
+    async def keygen(self):
+        return await self._call(KEYGEN, b"")
+
+    async def enc(self, pk):
+        return await self._call(ENC, self._enc_payload(pk))
+
+    async def dec(self, c, sk):
+        return await self._call(DEC, self._dec_payload(c, sk))
+
+    async def enc_many(self, pks):
+        return await asyncio.gather(*(self.enc(pk) for pk in pks))
+
+    async def dec_many(self, pairs):
+        return await asyncio.gather(*(self.dec(c, sk) for c, sk in pairs))
+
+    async def aclose(self):
+        connections, self.connections = self.connections, [None] * self.pool_size
+        for connection in connections:
+            if connection is not None:
+                await connection.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+
+class LoopbackServer:
+    """
+    `KEMService` en TCP sur 127.0.0.1 (port choisi par le système), exécuté
+    dans un thread avec sa propre boucle asyncio. Les options sont celles
+    de `KEMService`.
+
+    Exemple :
+        with LoopbackServer(parameter_sets=("kyber_512",)) as server:
+            client = KEMClient(server.address, "kyber_512")
+    """
+    def __init__(self, address=("127.0.0.1", 0), **service_options):
+        self.address = address
+        self.service_options = service_options
+        self.ready = threading.Event()
+        self.error = None
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=asyncio.run, args=(self._main(),), name="kyber-loopback", daemon=True)
+        self.thread.start()
+        self.ready.wait()
+        if self.error is not None:
+            raise self.error
+
+    async def _main(self):
+        self.loop = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+        self.service = KEMService(self.address, **self.service_options)
+        try:
+            await self.service.start()
+        except Exception as e:
+            self.error = e
+            self.ready.set()
+            return
+        self.address = self.service.address
+        self.ready.set()
+        try:
+            await self.stopped.wait()
+        finally:
+            await self.service.close()
+
+    def metrics(self):
+        return self.service.metrics()
+
+    def close(self):
+        if self.thread is not None:
+            self.loop.call_soon_threadsafe(self.stopped.set)
+            self.thread.join()
+            self.thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
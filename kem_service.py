@@ -0,0 +1,278 @@
+import argparse
+import asyncio
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from kyber import Kyber, DEFAULT_PARAMETERS
+from framing import (KEYGEN, ENC, DEC, STATUS_OK, STATUS_ERROR, STATUS_OVERLOADED, STATUS_DEADLINE_EXCEEDED,
+                     PARAMETER_SETS, encode_frame, read_frame)
+
+ServiceMetrics = namedtuple("ServiceMetrics", ["requests", "batches", "overloaded", "deadline_exceeded", "errors", "batch_sizes"])
+
+_OPERATIONS = {KEYGEN: "keygen", ENC: "enc", DEC: "dec"}
+
+
+class _Connection:
+    def __init__(self, writer):
+        self.writer = writer
+        self.closed = False
+
+
+class _Request:
+    __slots__ = ("connection", "request_id", "payload", "received", "deadline")
+
+    def __init__(self, connection, request_id, payload, received, deadline):
+        self.connection = connection
+        self.request_id = request_id
+        self.payload = payload
+        self.received = received
+        self.deadline = deadline
+
+
+class KEMService:
+    """
+    Service KEM sur un socket Unix (`address` est un chemin) ou TCP
+    (`address` est un couple (hôte, port)), voir `framing` pour le protocole.
+
+    Les requêtes enc / dec / keygen concurrentes, de toutes les connexions,
+    sont regroupées par jeu de paramètres et par opération : un lot part
+    dès qu'il atteint la taille courante ou que `batch_deadline` secondes
+    se sont écoulées depuis sa première requête. Les lots sont calculés
+    dans `executor` par un backend par jeu de paramètres (`Kyber` par
+    défaut, ou par exemple `KyberProcessEngine` via `backend_factory`).
+
+    Contrôle de charge :
+      - chaque file est bornée à `max_queue` requêtes ; au-delà, la requête
+        est refusée immédiatement (STATUS_OVERLOADED) ;
+      - une requête dont le délai est dépassé avant le calcul de son lot
+        est abandonnée (STATUS_DEADLINE_EXCEEDED) ;
+      - la taille des lots s'adapte à `latency_slo` : elle est divisée par
+        deux quand la latence d'un lot dépasse l'objectif, et doublée
+        (jusqu'à `max_batch_size`) quand un lot plein reste sous la moitié
+        de l'objectif.
+    """
+    def __init__(self, address, parameter_sets=PARAMETER_SETS, backend_factory=Kyber, executor=None,
+                 max_queue=256, max_batch_size=64, batch_deadline=0.002, latency_slo=0.1):
+        self.address = address
+        self.kybers = {}
+        self.backends = {}
+        for parameter, name in enumerate(PARAMETER_SETS):
+            if name in parameter_sets:
+                self.kybers[parameter] = Kyber(DEFAULT_PARAMETERS[name])
+                if backend_factory is Kyber:
+                    self.backends[parameter] = self.kybers[parameter]
+                else:
+                    self.backends[parameter] = backend_factory(DEFAULT_PARAMETERS[name])
+        self.owns_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix="kyber-service")
+        self.max_queue = max_queue
+        self.max_batch_size = max_batch_size
+        self.batch_deadline = batch_deadline
+        self.latency_slo = latency_slo
+
+        self.queues = {}
+        self.batch_sizes = {}
+        self.batchers = []
+        self.server = None
+
+        self.requests = 0
+        self.batches = 0
+        self.overloaded = 0
+        self.deadline_exceeded = 0
+        self.errors = 0
+
+    async def start(self):
+        for parameter in self.backends:
+            for op in _OPERATIONS:
+                key = (parameter, op)
+                self.queues[key] = asyncio.Queue(self.max_queue)
+                self.batch_sizes[key] = self.max_batch_size
+                self.batchers.append(asyncio.ensure_future(self._batcher(key)))
+        if isinstance(self.address, str):
+            self.server = await asyncio.start_unix_server(self._handle, path=self.address)
+        else:
+            host, port = self.address
+            self.server = await asyncio.start_server(self._handle, host, port)
+            # Port effectif lorsque le port 0 est demandé
+            self.address = self.server.sockets[0].getsockname()[:2]
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        await self.server.serve_forever()
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        for task in self.batchers:
+            task.cancel()
+        await asyncio.gather(*self.batchers, return_exceptions=True)
+        self.batchers = []
+        if self.owns_executor:
+            self.executor.shutdown(wait=True)
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.unlink(self.address)
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def metrics(self):
+        batch_sizes = {(PARAMETER_SETS[parameter], _OPERATIONS[op]): size
+                       for (parameter, op), size in self.batch_sizes.items()}
+        return ServiceMetrics(self.requests, self.batches, self.overloaded, self.deadline_exceeded, self.errors, batch_sizes)
+
+    def _respond(self, request, status, payload=b""):
+        connection = request.connection
+        if not connection.closed:
+            connection.writer.write(encode_frame(request.request_id, 0, payload, status=status))
+
+    def _check_payload(self, frame):
+        """
+        Renvoie un message d'erreur si la charge utile n'a pas la longueur
+        attendue pour l'opération, None sinon.
+        """
+        if frame.parameter not in self.backends:
+            return f"Jeu de paramètres non pris en charge : {frame.parameter}"
+        if frame.op not in _OPERATIONS:
+            return f"Opération inconnue : {frame.op}"
+        kyber = self.kybers[frame.parameter]
+        expected = {KEYGEN: 0, ENC: kyber.pk_length, DEC: kyber.ct_length + kyber.sk_length}[frame.op]
+        if len(frame.payload) != expected:
+            return f"La charge utile doit avoir une longueur de {expected} octets. L'entrée a une longueur de {len(frame.payload)}"
+        return None
+
+    async def _handle(self, reader, writer):
+        connection = _Connection(writer)
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                frame = await read_frame(reader)
+                if frame is None:
+                    break
+                now = loop.time()
+                deadline = now + frame.deadline_ms / 1000 if frame.deadline_ms else None
+                request = _Request(connection, frame.request_id, frame.payload, now, deadline)
+                self.requests += 1
+
+                error = self._check_payload(frame)
+                if error is not None:
+                    self.errors += 1
+                    self._respond(request, STATUS_ERROR, error.encode())
+                else:
+                    try:
+                        self.queues[(frame.parameter, frame.op)].put_nowait(request)
+                    except asyncio.QueueFull:
+                        self.overloaded += 1
+                        self._respond(request, STATUS_OVERLOADED)
+                # Ne lit pas la requête suivante tant que le tampon d'envoi est plein
+                await writer.drain()
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            connection.closed = True
+            writer.close()
+
+    async def _batcher(self, key):
+        loop = asyncio.get_running_loop()
+        queue = self.queues[key]
+        while True:
+            batch = [await queue.get()]
+            window_end = loop.time() + self.batch_deadline
+            while len(batch) < self.batch_sizes[key]:
+                if not queue.empty():
+                    batch.append(queue.get_nowait())
+                    continue
+                timeout = window_end - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            now = loop.time()
+            live = []
+            for request in batch:
+                if request.connection.closed:
+                    continue
+                if request.deadline is not None and now > request.deadline:
+                    self.deadline_exceeded += 1
+                    self._respond(request, STATUS_DEADLINE_EXCEEDED)
+                else:
+                    live.append(request)
+            if not live:
+                continue
+
+            try:
+                results = await loop.run_in_executor(self.executor, self._compute, key, [r.payload for r in live])
+            except Exception as e:
+                results = [(STATUS_ERROR, f"Erreur interne : {e}".encode())] * len(live)
+            self.batches += 1
+            for request, (status, payload) in zip(live, results):
+                if status != STATUS_OK:
+                    self.errors += 1
+                self._respond(request, status, payload)
+
+            latency = loop.time() - min(request.received for request in live)
+            if latency > self.latency_slo:
+                self.batch_sizes[key] = max(1, self.batch_sizes[key] // 2)
+            elif len(batch) >= self.batch_sizes[key] and latency < self.latency_slo / 2:
+                self.batch_sizes[key] = min(self.max_batch_size, 2 * self.batch_sizes[key])
+
+    def _compute(self, key, payloads):
+        """
+        Calcule un lot (dans l'exécuteur). Si le lot échoue, chaque requête
+        est recalculée seule pour isoler celles qui sont invalides.
+        """
+        try:
+            return [(STATUS_OK, payload) for payload in self._compute_batch(key, payloads)]
+        except ValueError as e:
+            if len(payloads) == 1:
+                return [(STATUS_ERROR, str(e).encode())]
+        results = []
+        for payload in payloads:
+            try:
+                [output] = self._compute_batch(key, [payload])
+                results.append((STATUS_OK, output))
+            except ValueError as e:
+                results.append((STATUS_ERROR, str(e).encode()))
+        return results
+
+    def _compute_batch(self, key, payloads):
+        parameter, op = key
+        backend = self.backends[parameter]
+        if op == KEYGEN:
+            return [pk + sk for pk, sk in backend.keygen_batch(len(payloads))]
+        if op == ENC:
+            return [c + K for c, K in backend.enc_batch(payloads)]
+        ct_length = self.kybers[parameter].ct_length
+        return backend.dec_batch([(payload[:ct_length], payload[ct_length:]) for payload in payloads])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Service KEM Kyber sur un socket Unix ou TCP")
+    parser.add_argument("address", help="chemin du socket Unix, ou hôte:port")
+    parser.add_argument("--max-queue", type=int, default=256)
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--batch-deadline", type=float, default=0.002, help="fenêtre de regroupement (s)")
+    parser.add_argument("--latency-slo", type=float, default=0.1, help="objectif de latence (s)")
+    args = parser.parse_args()
+
+    async def main():
+        address = args.address
+        if ":" in address and os.path.sep not in address:
+            host, port = address.rsplit(":", 1)
+            address = (host, int(port))
+        service = KEMService(address, max_queue=args.max_queue, max_batch_size=args.max_batch_size,
+                             batch_deadline=args.batch_deadline, latency_slo=args.latency_slo)
+        try:
+            await service.serve_forever()
+        finally:
+            await service.close()
+    asyncio.run(main())
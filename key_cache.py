@@ -0,0 +1,178 @@
+import sys
+import threading
+from collections import OrderedDict, namedtuple
+from kyber import DecapsulationKey
+
+KeyCacheMetrics = namedtuple("KeyCacheMetrics", ["hits", "misses", "evictions", "hit_ratio", "entries", "bytes_used", "max_bytes"])
+
+def _polynomial_footprint(poly):
+    """
+    Taille mémoire d'un polynôme : l'objet, son dictionnaire, la liste des
+    coefficients et les entiers qui ne sont pas partagés par CPython (> 256).
+    """
+    size = sys.getsizeof(poly) + sys.getsizeof(poly.__dict__) + sys.getsizeof(poly.coeffs)
+    size += sum(sys.getsizeof(c) for c in poly.coeffs if not -5 <= c <= 256)
+    return size
+
+def _matrix_footprint(matrix):
+    size = sys.getsizeof(matrix) + sys.getsizeof(matrix.__dict__) + sys.getsizeof(matrix.rows)
+    for row in matrix.rows:
+        size += sys.getsizeof(row) + sum(_polynomial_footprint(poly) for poly in row)
+    return size
+
+def expanded_key_footprint(dk):
+    """
+    Empreinte mémoire (en octets) d'une `DecapsulationKey` expansée :
+    ŝ et t̂ (k polynômes chacun), Â^T (k^2 polynômes), pk, H(pk) et z.
+    """
+    ek = dk.ek
+    size = sys.getsizeof(dk) + sys.getsizeof(dk.__dict__) + sys.getsizeof(dk.z)
+    size += sys.getsizeof(ek) + sys.getsizeof(ek.__dict__) + sys.getsizeof(ek.pk) + sys.getsizeof(ek.hpk)
+    size += _matrix_footprint(dk.st) + _matrix_footprint(ek.tt) + _matrix_footprint(ek.At)
+    return size
+
+
+class DecapsulationKeyCache:
+    """
+    Cache de clés de décapsulation expansées, indexé par identifiant de clé
+    et limité par un budget en octets.
+
+    `loader(key_id)` renvoie la clé secrète (octets sk, graine compacte de
+    `Kyber.seed_length` octets, ou `DecapsulationKey`) et n'est appelé
+    qu'en cas d'échec : l'expansion (ou la régénération depuis la graine)
+    est paresseuse. Chaque entrée est comptée pour l'empreinte d'une clé
+    expansée du jeu de paramètres (mesurée une fois, voir
+    `expanded_key_footprint`).
+
+    Politiques d'éviction : "lru" (moins récemment utilisée) ou "lfu"
+    (moins fréquemment utilisée, la plus ancienne en cas d'égalité).
+    """
+    def __init__(self, kyber, loader, max_bytes, policy="lru"):
+        if policy not in ("lru", "lfu"):
+            raise ValueError(f"Politique d'éviction inconnue : {policy}. Essayez 'lru' ou 'lfu'")
+        self.kyber = kyber
+        self.loader = loader
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.key_footprint = None
+
+        self.lock = threading.Lock()
+        self.entries = {}
+        # LRU : ordre d'utilisation. LFU : fréquence -> identifiants, du plus ancien au plus récent
+        self.order = OrderedDict()
+        self.frequencies = {}
+        self.buckets = {}
+        self.min_frequency = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key_id):
+        """
+        Renvoie la `DecapsulationKey` de `key_id`, en la chargeant et en
+        l'expansant si elle n'est pas dans le cache.
+        """
+        with self.lock:
+            dk = self.entries.get(key_id)
+            if dk is not None:
+                self.hits += 1
+                self._touch(key_id)
+                return dk
+            self.misses += 1
+
+        sk = self.loader(key_id)
+        if isinstance(sk, DecapsulationKey):
+            dk = self.kyber._check_key(sk)
+        elif len(sk) == self.kyber.seed_length:
+            dk = self.kyber.decapsulation_key_from_seed(sk)
+        else:
+            dk = self.kyber.decapsulation_key(sk)
+
+        with self.lock:
+            if self.key_footprint is None:
+                self.key_footprint = expanded_key_footprint(dk)
+            if key_id not in self.entries and self.key_footprint <= self.max_bytes:
+                while (len(self.entries) + 1) * self.key_footprint > self.max_bytes:
+                    self._evict()
+                self._insert(key_id, dk)
+        return dk
+
+    def dec(self, key_id, c, key_length=32):
+        """
+        Décapsule `c` avec la clé `key_id`, voir `Kyber.dec`.
+        """
+        return self.kyber.dec(c, self.get(key_id), key_length=key_length)
+
+    def invalidate(self, key_id):
+        """
+        Retire `key_id` du cache (par exemple après une rotation de clé).
+        """
+        with self.lock:
+            if key_id in self.entries:
+                self._remove(key_id)
+
+    def clear(self):
+        with self.lock:
+            for key_id in list(self.entries):
+                self._remove(key_id)
+
+    def metrics(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            hit_ratio = self.hits / lookups if lookups else 0.0
+            bytes_used = len(self.entries) * (self.key_footprint or 0)
+            return KeyCacheMetrics(self.hits, self.misses, self.evictions, hit_ratio,
+                                   len(self.entries), bytes_used, self.max_bytes)
+
+    def __contains__(self, key_id):
+        return key_id in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    # Les méthodes suivantes maintiennent l'ordre d'éviction et doivent être
+    # appelées avec `self.lock` acquis.
+    def _insert(self, key_id, dk):
+        self.entries[key_id] = dk
+        if self.policy == "lru":
+            self.order[key_id] = None
+        else:
+            self.frequencies[key_id] = 1
+            self.buckets.setdefault(1, OrderedDict())[key_id] = None
+            self.min_frequency = 1
+
+    def _touch(self, key_id):
+        if self.policy == "lru":
+            self.order.move_to_end(key_id)
+            return
+        frequency = self.frequencies[key_id]
+        bucket = self.buckets[frequency]
+        del bucket[key_id]
+        if not bucket:
+            del self.buckets[frequency]
+            if self.min_frequency == frequency:
+                self.min_frequency = frequency + 1
+        self.frequencies[key_id] = frequency + 1
+        self.buckets.setdefault(frequency + 1, OrderedDict())[key_id] = None
+
+    def _remove(self, key_id):
+        del self.entries[key_id]
+        if self.policy == "lru":
+            del self.order[key_id]
+            return
+        frequency = self.frequencies.pop(key_id)
+        bucket = self.buckets[frequency]
+        del bucket[key_id]
+        if not bucket:
+            del self.buckets[frequency]
+            if self.buckets and self.min_frequency == frequency:
+                self.min_frequency = min(self.buckets)
+
+    def _evict(self):
+        if self.policy == "lru":
+            key_id = next(iter(self.order))
+        else:
+            key_id = next(iter(self.buckets[self.min_frequency]))
+        self._remove(key_id)
+        self.evictions += 1
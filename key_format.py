@@ -0,0 +1,153 @@
+"""
+Format binaire versionné des clés expansées.
+
+Charger une clé depuis pk / sk oblige à régénérer Â depuis rho (k^2 appels
+à SHAKE-128 et l'échantillonnage par rejet) et à décoder t et s. Ce format
+stocke directement les éléments sous forme NTT, en tableaux d'entiers
+16 bits little-endian de largeur fixe, pour qu'une clé se charge depuis un
+`mmap` (ou tout tampon) avec `memoryview.cast`, sans analyse.
+
+Un enregistrement, de taille fixe pour un jeu de paramètres donné :
+
+    magic "KYBX" | version u16 | drapeaux u16 | n, k, q, eta_1, eta_2, du, dv u16
+    | réservé (2) | H(pk) (32) | z (32, nuls pour une clé publique) | pk
+    | Â^T u16[k*k*n] | t̂ u16[k*n] | ŝ u16[k*n] (clé secrète seulement)
+    | SHA3-256 de tout ce qui précède (32)
+
+L'empreinte n'est pas authentifiée : elle détecte une corruption
+accidentelle, pas une modification volontaire (il suffit de la
+recalculer). Pour une clé d'origine non fiable, passer la clé canonique
+à `load_expanded_key`.
+"""
+import struct
+import sys
+from array import array
+from hashlib import sha3_256
+from kyber import EncapsulationKey, DecapsulationKey
+from utils import as_memoryview
+
+MAGIC = b"KYBX"
+VERSION = 1
+FLAG_SECRET = 1
+
+_HEADER = struct.Struct("<4sHH7H2x")
+_DIGEST_LENGTH = 32
+
+def _parameter_ids(kyber):
+    return (kyber.n, kyber.k, kyber.q, kyber.eta_1, kyber.eta_2, kyber.du, kyber.dv)
+
+def expanded_key_length(kyber, secret):
+    """
+    Taille en octets d'un enregistrement pour ce jeu de paramètres.
+    """
+    n_polys = kyber.k * kyber.k + kyber.k * (2 if secret else 1)
+    return _HEADER.size + 64 + kyber.pk_length + 2 * kyber.n * n_polys + _DIGEST_LENGTH
+
+def _coefficients_to_bytes(matrix):
+    coefficients = array("H")
+    for row in matrix.rows:
+        for poly in row:
+            coefficients.extend(poly.coeffs)
+    if sys.byteorder != "little":
+        coefficients.byteswap()
+    return coefficients.tobytes()
+
+def _matrix_from_view(kyber, view, m, n):
+    """
+    Construit une matrice m x n de polynômes sous forme NTT depuis une vue
+    `memoryview` d'entiers 16 bits (un `tolist` par polynôme).
+    """
+    size = kyber.n
+    if sys.byteorder != "little":
+        coefficients = array("H", view.tobytes())
+        coefficients.byteswap()
+        view = memoryview(coefficients)
+    rows = []
+    for i in range(m):
+        rows.append([kyber.R(view[(i*n + j)*size:(i*n + j + 1)*size].tolist(), is_ntt=True) for j in range(n)])
+    return kyber.M(rows)
+
+def dump_expanded_key(kyber, key):
+    """
+    Sérialise une `EncapsulationKey` ou une `DecapsulationKey` dans le
+    format des clés expansées.
+    """
+    kyber._check_key(key)
+    secret = isinstance(key, DecapsulationKey)
+    ek = key.ek if secret else key
+    z = key.z if secret else bytes(32)
+    parts = [
+        _HEADER.pack(MAGIC, VERSION, FLAG_SECRET if secret else 0, *_parameter_ids(kyber)),
+        ek.hpk, z, ek.pk,
+        _coefficients_to_bytes(ek.At),
+        _coefficients_to_bytes(ek.tt),
+    ]
+    if secret:
+        parts.append(_coefficients_to_bytes(key.st))
+    record = b"".join(parts)
+    return record + sha3_256(record).digest()
+
+def load_expanded_key(kyber, input_bytes, verify=True, canonical=None):
+    """
+    Charge une clé expansée depuis `input_bytes` (tout objet supportant le
+    protocole tampon : bytes, mmap, ...). Les octets en trop après
+    l'enregistrement sont ignorés, ce qui permet de lire un fichier de
+    clés concaténées à pas fixe.
+
+    Avec `verify=True`, l'empreinte SHA3-256 de l'enregistrement est
+    vérifiée, ainsi que la cohérence interne : t̂ se ré-encode en pk et
+    H(pk) correspond. Ces contrôles ne portent pas sur Â^T, qui n'est
+    qu'une fonction de rho : ils ne protègent que contre une corruption
+    accidentelle.
+
+    Si `canonical` (pk ou sk, d'une source de confiance) est donné, la clé
+    chargée doit se resérialiser exactement en `canonical`, et Â^T est
+    régénéré depuis rho et comparé à celui de l'enregistrement. Ce
+    contrôle complet coûte autant que l'expansion de Â que le format
+    permet d'éviter ; il est à réserver au premier chargement d'un
+    fichier d'origine non fiable. Lève ValueError en cas d'écart.
+    """
+    view = as_memoryview(input_bytes)
+    if len(view) < _HEADER.size:
+        raise ValueError("L'entrée est trop courte pour contenir une clé expansée")
+    magic, version, flags, *parameter_ids = _HEADER.unpack_from(view)
+    if magic != MAGIC:
+        raise ValueError("L'entrée n'est pas une clé expansée (magic invalide)")
+    if version != VERSION:
+        raise ValueError(f"Version de clé expansée non prise en charge : {version}")
+    if tuple(parameter_ids) != _parameter_ids(kyber):
+        raise ValueError("La clé expansée n'appartient pas à ce jeu de paramètres")
+
+    secret = bool(flags & FLAG_SECRET)
+    length = expanded_key_length(kyber, secret)
+    if len(view) < length:
+        raise ValueError(f"La clé expansée doit avoir une longueur de {length} octets. L'entrée a une longueur de {len(view)}")
+    view = view[:length]
+    if verify and sha3_256(view[:-_DIGEST_LENGTH]).digest() != view[-_DIGEST_LENGTH:]:
+        raise ValueError("La clé expansée est corrompue : l'empreinte ne correspond pas")
+
+    index = _HEADER.size
+    hpk = bytes(view[index:index+32])
+    z = bytes(view[index+32:index+64])
+    index += 64
+    pk = bytes(view[index:index+kyber.pk_length])
+    index += kyber.pk_length
+
+    k, n = kyber.k, kyber.n
+    coefficients = view[index:-_DIGEST_LENGTH].cast("H")
+    At = _matrix_from_view(kyber, coefficients[:k*k*n], k, k)
+    tt = _matrix_from_view(kyber, coefficients[k*k*n:(k*k + k)*n], 1, k)
+
+    if verify and (kyber._h(pk) != hpk or tt.encode(l=12) != pk[:-32]):
+        raise ValueError("La clé expansée ne correspond pas à sa clé publique canonique")
+
+    key = EncapsulationKey(pk, tt, At, hpk)
+    if secret:
+        st = _matrix_from_view(kyber, coefficients[(k*k + k)*n:], 1, k)
+        key = DecapsulationKey(st, key, z)
+    if canonical is not None:
+        if key.to_bytes() != as_memoryview(canonical):
+            raise ValueError("La clé expansée ne correspond pas à la clé canonique donnée")
+        if kyber._generate_matrix_from_seed(pk[-32:], transpose=True, is_ntt=True) != At:
+            raise ValueError("La clé expansée est corrompue : Â ne correspond pas à rho")
+    return key
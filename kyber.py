@@ -1,4 +1,7 @@
 import os
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from hashlib import sha3_256, sha3_512, shake_128, shake_256
 from polynomials import *
 from modules import *
@@ -41,8 +44,130 @@ DEFAULT_PARAMETERS = {
     }
 }
 
+def run_steps(steps):
+    """
+    Exécute le générateur `steps` jusqu'au bout et renvoie son résultat.
+    """
+    try:
+        while True:
+            next(steps)
+    except StopIteration as stop:
+        return stop.value
+
+class EncapsulationKey:
+    """
+    Clé publique expansée une fois pour toutes : t̂^T (forme NTT), la
+    matrice Â^T (forme NTT) régénérée depuis rho, et H(pk).
+    
+    Obtenue avec `Kyber.encapsulation_key(pk)` et acceptée directement par
+    `Kyber.enc`. `to_bytes` renvoie la clé publique standard.
+    """
+    def __init__(self, pk, tt, At, hpk):
+        self.pk = pk
+        self.tt = tt
+        self.At = At
+        self.hpk = hpk
+        
+    def to_bytes(self):
+        return self.pk
+        
+    def __eq__(self, other):
+        return isinstance(other, EncapsulationKey) and self.pk == other.pk
+        
+    def __hash__(self):
+        return hash(self.pk)
+
+class DecapsulationKey:
+    """
+    Clé secrète expansée une fois pour toutes : ŝ^T (forme NTT), la clé
+    publique expansée (t̂, Â^T, H(pk)) utilisée pour le re-chiffrement de
+    Fujisaki-Okamoto, et z.
+    
+    Obtenue avec `Kyber.decapsulation_key(sk)` et acceptée directement par
+    `Kyber.dec`. `to_bytes` renvoie la clé secrète standard
+    sk = sk' || pk || H(pk) || z.
+    """
+    def __init__(self, st, ek, z):
+        self.st = st
+        self.ek = ek
+        self.z = z
+        
+    def to_bytes(self):
+        return self.st.encode(l=12) + self.ek.pk + self.ek.hpk + self.z
+        
+    def __eq__(self, other):
+        return isinstance(other, DecapsulationKey) and self.to_bytes() == other.to_bytes()
+        
+    def __hash__(self):
+        return hash(self.ek)
+
+class EncapsulationSession:
+    """
+    Session d'encapsulation liée à une clé publique : la clé est expansée
+    une seule fois et `encapsulate(N)` produit N encapsulations en un seul
+    appel.
+    
+    Obtenue avec `Kyber.encapsulation_session(pk)`.
+    """
+    def __init__(self, kyber, ek):
+        self.kyber = kyber
+        self.ek = ek
+        
+    def encapsulate(self, count, key_length=32):
+        """
+        Renvoie la liste de `count` couples (c, K), identique à `count`
+        appels successifs à `Kyber.enc(pk)`.
+        """
+        return self.kyber.enc_batch([self.ek] * count, key_length=key_length)
+
+PKCacheInfo = namedtuple("PKCacheInfo", ["hits", "misses", "evictions", "maxsize", "currsize"])
+
+class ExpandedPKCache:
+    """
+    Cache LRU des clés publiques expansées : pour chaque pk (clé : les
+    octets de pk), on garde son `EncapsulationKey` (t̂ décodé, la matrice
+    A^T sous forme NTT et H(pk)), afin que les encapsulations répétées vers
+    le même pair évitent toute expansion de matrice.
+    """
+    def __init__(self, maxsize=1024):
+        if maxsize < 1:
+            raise ValueError("La taille du cache doit être au moins 1")
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        
+    def get(self, key):
+        with self.lock:
+            expanded = self.entries.get(key)
+            if expanded is None:
+                self.misses += 1
+            else:
+                self.entries.move_to_end(key)
+                self.hits += 1
+            return expanded
+            
+    def put(self, key, expanded):
+        with self.lock:
+            self.entries[key] = expanded
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+                
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            
+    def info(self):
+        with self.lock:
+            return PKCacheInfo(self.hits, self.misses, self.evictions, self.maxsize, len(self.entries))
+
 class Kyber:
-    def __init__(self, parameter_set):
+    def __init__(self, parameter_set, xof_workers=None):
+        self.parameter_set = parameter_set
         self.n = parameter_set["n"]
         self.k = parameter_set["k"]
         self.q = parameter_set["q"]
@@ -51,21 +176,120 @@ class Kyber:
         self.du = parameter_set["du"]
         self.dv = parameter_set["dv"]
         
+        # Tailles en octets des clés et du texte chiffré
+        self.pk_length = 12 * self.k * self.n // 8 + 32
+        self.sk_length = 24 * self.k * self.n // 8 + 96
+        self.ct_length = (self.du * self.k + self.dv) * self.n // 8
+        self.seed_length = 64
+        
         self.R = PolynomialRing(self.q, self.n, ntt_helper=NTTHelperKyber)
         self.M = Module(self.R)
         
-        self.drbg = None
-        self.random_bytes = os.urandom
+        # Source d'aléa de l'instance, éventuellement remplacée pour un
+        # thread, voir `set_drbg_seed`
+        self._drbg = None
+        self._random_bytes = os.urandom
+        self._local = threading.local()
+        
+        self._xof_executor = None
+        self.set_xof_workers(xof_workers)
+        
+        self.pk_cache = None
+        
+    def __getstate__(self):
+        """
+        État transmis par pickle (initialiseurs de multiprocessing, ...) :
+        les sources d'aléa propres à un thread, le pool de threads du XOF
+        et le contenu du cache des clés publiques ne sont pas transmis.
+        """
+        state = self.__dict__.copy()
+        del state["_local"]
+        state["_xof_executor"] = None
+        state["pk_cache"] = None if self.pk_cache is None else self.pk_cache.maxsize
+        return state
+        
+    def __setstate__(self, state):
+        pk_cache_size = state.pop("pk_cache")
+        self.__dict__.update(state)
+        self._local = threading.local()
+        self.set_xof_workers(self.xof_workers)
+        self.pk_cache = None
+        if pk_cache_size is not None:
+            self.enable_pk_cache(pk_cache_size)
         
-    def set_drbg_seed(self, seed):
+    def set_xof_workers(self, workers):
+        """
+        Définit le nombre de threads utilisés pour l'expansion de la matrice A.
+        
+        Avec `None` (ou 0 / 1), les k^2 appels au XOF sont faits en série.
+        Sinon, les extractions SHAKE-128 indépendantes sont réparties sur un
+        petit pool de threads : hashlib relâche le GIL sur les gros tampons,
+        mais `parse` reste en Python pur, le gain dépend donc de la plateforme
+        (voir `benchmark_matrix_expansion` dans benchmark_kyber.py).
+        """
+        if self._xof_executor is not None:
+            self._xof_executor.shutdown(wait=True)
+            self._xof_executor = None
+        if workers is not None and workers > 1:
+            self._xof_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="kyber-xof")
+        self.xof_workers = workers
+        
+    def enable_pk_cache(self, maxsize=1024):
+        """
+        Active (ou redimensionne) le cache LRU des clés publiques expansées
+        utilisé par `enc` et par le re-chiffrement de `dec`.
+        """
+        self.pk_cache = ExpandedPKCache(maxsize)
+        
+    def disable_pk_cache(self):
+        self.pk_cache = None
+        
+    def pk_cache_info(self):
+        """
+        Statistiques du cache : succès, échecs, évictions, taille max et actuelle.
+        Renvoie None si le cache n'est pas activé.
+        """
+        if self.pk_cache is None:
+            return None
+        return self.pk_cache.info()
+        
+    @property
+    def drbg(self):
+        return getattr(self._local, "drbg", self._drbg)
+        
+    @property
+    def random_bytes(self):
+        return getattr(self._local, "random_bytes", self._random_bytes)
+        
+    @random_bytes.setter
+    def random_bytes(self, random_bytes):
+        self._random_bytes = random_bytes
+        
+    def set_drbg_seed(self, seed, per_thread=False):
         """
         Définir la graine bascule la source d'entropie de os.urandom à AES256 CTR DRBG
         
+        Par défaut, la graine vaut pour l'instance, dans tous les threads ;
+        le DRBG est alors partagé (ses appels sont sérialisés) et l'ordre
+        des tirages dépend de l'ordonnancement des threads.
+        
+        Avec `per_thread=True`, la graine ne vaut que pour le thread
+        appelant : les autres threads gardent la source de l'instance. Une
+        même instance peut ainsi être utilisée en parallèle, chaque thread
+        ayant son propre DRBG reproductible.
+        
         Remarque : nécessite pycryptodome pour l'implémentation AES. 
         (Il semblait excessif de coder mon propre AES pour Kyber.)
         """
-        self.drbg = AES256_CTR_DRBG(seed)
-        self.random_bytes = self.drbg.random_bytes
+        drbg = AES256_CTR_DRBG(seed)
+        if per_thread:
+            self._local.drbg = drbg
+            self._local.random_bytes = drbg.random_bytes
+        else:
+            # Le thread appelant perd aussi sa source propre éventuelle
+            self._local.__dict__.clear()
+            self._drbg = drbg
+            self._random_bytes = drbg.random_bytes
 
     def reseed_drbg(self, seed):
         """
@@ -88,6 +312,26 @@ class Kyber:
         if len(input_bytes) != 34:
             raise ValueError(f"Input bytes should be one 32 byte array and 2 single bytes.")
         return shake_128(input_bytes).digest(length)
+    
+    @staticmethod
+    def _xof_absorb(bytes32):
+        """
+        XOF avec la graine déjà absorbée : l'état renvoyé est cloné
+        avec `.copy()` pour chaque paire d'indices, ce qui évite de
+        ré-absorber `rho` k^2 fois.
+        """
+        if len(bytes32) != 32:
+            raise ValueError(f"La graine du XOF doit être un tableau de 32 octets.")
+        return shake_128(bytes32)
+    
+    @staticmethod
+    def _xof_squeeze(state, a, b, length):
+        """
+        XOF: B^* x B x B -> B*, à partir d'un état produit par `_xof_absorb`
+        """
+        xof = state.copy()
+        xof.update(a + b)
+        return xof.digest(length)
         
     @staticmethod
     def _h(input_bytes):
@@ -121,19 +365,114 @@ class Kyber:
         """
         return shake_256(input_bytes).digest(length)
     
-    def _generate_error_vector(self, sigma, eta, N, is_ntt=False):
+    def validate_pk(self, pk):
+        """
+        Renvoie True si `pk` a la longueur attendue pour ce jeu de paramètres
+        et si tous les coefficients de t (décodés sur 12 bits) sont < q
+        (contrôle de module de FIPS 203).
+        """
+        return self.validate_pks([pk])[0]
+    
+    def validate_pks(self, pks):
+        """
+        Validation en masse de clés publiques, voir `validate_pk`.
+        
+        Les longueurs sont vérifiées d'abord, puis le contrôle de module est
+        fait en une seule passe sur les régions t de toutes les clés
+        restantes, avant tout travail d'expansion.
+        """
+        t_length = self.pk_length - 32
+        views = [as_memoryview(pk) for pk in pks]
+        valid = [len(pk) == self.pk_length for pk in views]
+        indices = [i for i, ok in enumerate(valid) if ok]
+        t_regions = b"".join(views[i][:t_length] for i in indices)
+        for group in iter_packed_12bit_at_least(t_regions, self.q):
+            valid[indices[3*group // t_length]] = False
+        return valid
+        
+    def validate_ciphertext(self, c):
+        """
+        Renvoie True si `c` a la longueur attendue pour ce jeu de paramètres.
+        Toute chaîne de la bonne longueur est un texte chiffré bien formé.
+        """
+        return len(as_memoryview(c)) == self.ct_length
+        
+    def validate_ciphertexts(self, cs):
+        """
+        Validation en masse de textes chiffrés, voir `validate_ciphertext`.
+        """
+        return [self.validate_ciphertext(c) for c in cs]
+        
+    def _check_ciphertexts(self, cs):
+        """
+        Lève ValueError si un texte chiffré de `cs` n'a pas la longueur
+        attendue, avant tout travail sur les clés.
+        """
+        for c in cs:
+            if len(c) != self.ct_length:
+                raise ValueError(f"Le texte chiffré doit avoir une longueur de {self.ct_length} octets. L'entrée a une longueur de {len(c)}")
+    
+    @staticmethod
+    def _output_view(buffer, offset, length):
+        """
+        Renvoie la tranche `memoryview` de `buffer` de `length` octets à
+        partir de `offset`, dans laquelle les méthodes `*_into` écrivent.
+        """
+        view = as_memoryview(buffer)
+        if view.readonly:
+            raise TypeError("Le tampon de sortie doit être accessible en écriture")
+        if offset < 0 or offset + length > len(view):
+            raise ValueError(f"Le tampon de sortie est trop court : {length} octets sont nécessaires à partir de la position {offset}")
+        return view[offset:offset+length]
+    
+    def _error_vector_steps(self, sigma, eta, N, to_ntt=False):
         """
         Fonction d'assistance qui génère un élément dans le
-        module de la distribution binomiale centrée.
+        module de la distribution binomiale centrée, un polynôme
+        (et sa NTT lorsque `to_ntt` est vrai) par étape.
         """
         elements = []
-        for i in range(self.k):
+        for _ in range(self.k):
             input_bytes = self._prf(sigma,  bytes([N]), 64*eta)
-            poly = self.R.cbd(input_bytes, eta, is_ntt=is_ntt)
-            elements.append(poly)
+            poly = self.R.cbd(input_bytes, eta)
             N = N + 1
-        v = self.M(elements).transpose()
-        return v, N
+            yield
+            if to_ntt:
+                poly.to_ntt()
+                yield
+            elements.append([poly])
+        return self.M(elements), N
+        
+    def _sample_matrix_element(self, state, i, j, transpose, is_ntt):
+        """
+        Échantillonne l'élément (i, j) de la matrice A (ou de sa
+        transposition) à partir de l'état XOF absorbé de `rho`.
+        """
+        if transpose:
+            input_bytes = self._xof_squeeze(state, bytes([i]), bytes([j]), 3*self.R.n)
+        else:
+            input_bytes = self._xof_squeeze(state, bytes([j]), bytes([i]), 3*self.R.n)
+        return self.R.parse(input_bytes, is_ntt=is_ntt)
+        
+    def _matrix_steps(self, rho, transpose=False, is_ntt=False):
+        """
+        Comme `_generate_matrix_from_seed`, un polynôme par étape. Lorsque
+        des workers XOF sont configurés, la matrice est échantillonnée en
+        parallèle en une seule étape.
+        """
+        if self._xof_executor is not None:
+            A = self._generate_matrix_from_seed(rho, transpose, is_ntt)
+            yield
+            return A
+        state = self._xof_absorb(rho)
+        rows = []
+        for i in range(self.k):
+            row = []
+            for j in range(self.k):
+                row.append(self._sample_matrix_element(state, i, j, transpose, is_ntt))
+                yield
+            rows.append(row)
+        return self.M(rows)
         
     def _generate_matrix_from_seed(self, rho, transpose=False, is_ntt=False):
         """
@@ -143,112 +482,259 @@ class Kyber:
         Lorsque `transpose` est défini sur True, la matrice A est
         construit comme la transposition.
         """
-        A = []
-        for i in range(self.k):
-            row = []
-            for j in range(self.k):
-                if transpose:
-                    input_bytes = self._xof(rho, bytes([i]), bytes([j]), 3*self.R.n)
-                else:
-                    input_bytes = self._xof(rho, bytes([j]), bytes([i]), 3*self.R.n)
-                aij = self.R.parse(input_bytes, is_ntt=is_ntt)
-                row.append(aij)
-            A.append(row)
+        if self._xof_executor is None:
+            return run_steps(self._matrix_steps(rho, transpose, is_ntt))
+        state = self._xof_absorb(rho)
+        
+        def sample(index):
+            i, j = divmod(index, self.k)
+            return self._sample_matrix_element(state, i, j, transpose, is_ntt)
+        
+        elements = list(self._xof_executor.map(sample, range(self.k * self.k)))
+        A = [elements[i*self.k:(i+1)*self.k] for i in range(self.k)]
         return self.M(A)
         
-    def _cpapke_keygen(self):
+    def _row_product(self, matrix, i, v):
+        """
+        Ligne i du produit `matrix @ v`, pour un vecteur colonne v.
+        """
+        return (self.M([matrix.rows[i]]) @ v)[0][0]
+        
+    def _decode_vector_steps(self, input_bytes):
+        """
+        Comme `M.decode(input_bytes, 1, k, l=12, is_ntt=True)`, un polynôme par étape.
+        """
+        chunk_length = 12 * self.R.n // 8
+        row = []
+        for i in range(self.k):
+            row.append(self.R.decode(input_bytes[i*chunk_length:(i+1)*chunk_length], l=12, is_ntt=True))
+            yield
+        return self.M([row])
+        
+    def _encapsulation_key_steps(self, pk):
+        """
+        Étapes de `encapsulation_key`.
+        """
+        pk = as_memoryview(pk)
+        if self.pk_cache is not None:
+            key = bytes(pk)
+            ek = self.pk_cache.get(key)
+            if ek is not None:
+                return ek
+            
+        if not self.validate_pk(pk):
+            raise ValueError(f"Clé publique invalide : {self.pk_length} octets avec des coefficients < {self.q} sont attendus")
+        yield
+        tt = yield from self._decode_vector_steps(pk)
+        At = yield from self._matrix_steps(pk[-32:], transpose=True, is_ntt=True)
+        ek = EncapsulationKey(bytes(pk), tt, At, self._h(pk))
+        
+        if self.pk_cache is not None:
+            self.pk_cache.put(key, ek)
+        return ek
+        
+    def _decapsulation_key_steps(self, sk):
+        """
+        Étapes de `decapsulation_key`.
+        """
+        sk = as_memoryview(sk)
+        if len(sk) != self.sk_length:
+            raise ValueError(f"La clé secrète doit avoir une longueur de {self.sk_length} octets. L'entrée a une longueur de {len(sk)}")
+        
+        # sk = _sk || pk || H(pk) || z
+        index = 12 * self.k * self.R.n // 8
+        st = yield from self._decode_vector_steps(sk[:index])
+        ek = yield from self._encapsulation_key_steps(sk[index:-64])
+        if sk[-64:-32] != ek.hpk:
+            raise ValueError("La clé secrète est corrompue : H(pk) ne correspond pas à la clé publique")
+        return DecapsulationKey(st, ek, bytes(sk[-32:]))
+        
+    def encapsulation_key(self, pk):
+        """
+        Valide et expanse une clé publique en `EncapsulationKey`, en passant
+        par le cache des clés publiques expansées lorsqu'il est activé.
+        """
+        return run_steps(self._encapsulation_key_steps(pk))
+        
+    def decapsulation_key(self, sk):
+        """
+        Expanse une clé secrète en `DecapsulationKey` : ŝ est décodé sous
+        forme NTT et la clé publique intégrée est expansée une seule fois.
+        Lève ValueError si H(pk) stocké dans `sk` ne correspond pas à pk.
+        """
+        return run_steps(self._decapsulation_key_steps(sk))
+        
+    def encapsulation_session(self, pk):
+        """
+        Renvoie une `EncapsulationSession` liée à la clé publique `pk`
+        (octets ou `EncapsulationKey`).
+        """
+        if isinstance(pk, EncapsulationKey):
+            return EncapsulationSession(self, self._check_key(pk))
+        return EncapsulationSession(self, self.encapsulation_key(pk))
+        
+    def _check_key(self, key):
+        """
+        Vérifie qu'une clé expansée a été produite pour ce jeu de paramètres.
+        
+        Les éléments d'une clé expansée appartiennent au module de l'instance
+        qui l'a produite : une clé expansée par une autre instance est
+        reconstruite sur le module de celle-ci à partir de ses octets (via
+        le cache des clés publiques expansées lorsqu'il est activé).
+        """
+        ek = key.ek if isinstance(key, DecapsulationKey) else key
+        if ek.At.m != self.k:
+            raise ValueError(f"La clé expansée n'appartient pas à ce jeu de paramètres (k = {self.k})")
+        if isinstance(key, DecapsulationKey):
+            if key.st.parent is not self.M or ek.At.parent is not self.M:
+                return self.decapsulation_key(key.to_bytes())
+        elif ek.At.parent is not self.M:
+            return self.encapsulation_key(ek.pk)
+        return key
+        
+    def _intt_add_compress_encode_into(self, poly, noise, d, out, offset):
+        """
+        Noyau fusionné du côté sortie du chiffrement :
+        INTT + ajout du bruit + compression + empaquetage.
+        
+        Après les papillons de l'INTT (sur place), une seule passe sur les
+        coefficients applique le facteur f, ajoute les polynômes de `noise`
+        (dans l'ordre, comme `add_mod_q`), compresse sur d bits et écrit le
+        résultat dans `out` à partir de `offset`, sans liste intermédiaire.
+        Renvoie la position qui suit le dernier octet écrit.
+        """
+        ntt_helper = self.R.ntt_helper
+        coeffs = ntt_helper.inverse_butterflies(poly.coeffs)
+        q = self.q
+        scale = ntt_helper.f * ntt_helper.mont_r_inv % q
+        compress_mod = 2**d
+        compress_float = compress_mod / q
+        acc, n_bits = 0, 0
+        for x, *ys in zip(coeffs, *(e.coeffs for e in noise)):
+            x = x * scale % q
+            for y in ys:
+                x = x + y
+                if x >= q:
+                    x -= q
+            acc |= (round_up(compress_float * x) % compress_mod) << n_bits
+            n_bits += d
+            while n_bits >= 8:
+                out[offset] = acc & 255
+                acc >>= 8
+                n_bits -= 8
+                offset += 1
+        return offset
+        
+    def _decode_decompress_ntt(self, input_bytes, d, to_ntt=True):
+        """
+        Noyau fusionné du côté entrée du déchiffrement :
+        dépaquetage + décompression + NTT.
+        
+        Les coefficients sont extraits de `input_bytes` (n*d/8 octets) et
+        décompressés dans la même passe, puis transformés sur place en
+        forme NTT lorsque `to_ntt` est vrai.
+        """
+        decompress_float = self.q / 2**d
+        mask = 2**d - 1
+        coeffs = []
+        acc, n_bits = 0, 0
+        for byte in input_bytes:
+            acc |= byte << n_bits
+            n_bits += 8
+            while n_bits >= d:
+                coeffs.append(round_up(decompress_float * (acc & mask)))
+                acc >>= d
+                n_bits -= d
+        poly = self.R(coeffs)
+        if to_ntt:
+            self.R.ntt_helper.to_ntt(poly)
+        return poly
+        
+    def _cpapke_keygen_steps(self, d, pk_out, sk_out):
         """
         Algorithm 4 (Génération de clé)
         https://pq-crystals.org/kyber/data/kyber-specification-round3-20210804.pdf
         
         Saisir:
-            Aucun
+            d : graine ∈ B^32
+            pk_out : tampon de (12*k*n) / 8 + 32 octets
+            sk_out : tampon de (12*k*n) / 8 octets
         Sortir:
-            Clé secrète (12*k*n) / 8 octets
-            Clé publique (12*k*n) / 8 + 32 octets
+            Clé publique écrite dans pk_out
+            Clé secrète écrite dans sk_out
+            Renvoie (A, t, s), sous forme NTT
         """
-        # Générer une valeur aléatoire, un hachage et un fractionnement
-        d = self.random_bytes(32)
+        # Hacher et fractionner la graine
         rho, sigma = self._g(d)
-        # Définir le compteur pour PRF
-        N = 0
         
         # Générer la matrice A ∈ R^kxk
-        A = self._generate_matrix_from_seed(rho, is_ntt=True)
+        A = yield from self._matrix_steps(rho, is_ntt=True)
         
-        # Générer le vecteur d'erreur s ∈ R^k
-        s, N = self._generate_error_vector(sigma, self.eta_1, N)
-        s.to_ntt()
+        # Générer les vecteurs d'erreur s, e ∈ R^k sous forme NTT
+        s, N = yield from self._error_vector_steps(sigma, self.eta_1, 0, to_ntt=True)
+        e, N = yield from self._error_vector_steps(sigma, self.eta_1, N, to_ntt=True)
         
-        # Générer le vecteur d'erreur e ∈ R^k
-        e, N = self._generate_error_vector(sigma, self.eta_1, N)
-        e.to_ntt() 
-                           
-        # Construire la clé publique
-        t = (A @ s).to_montgomery() + e
+        # Construire la clé publique, une ligne par étape
+        rows = []
+        for i in range(self.k):
+            t_i = self.M([[self._row_product(A, i, s)]]).to_montgomery() + self.M([e[i]])
+            rows.append(t_i[0])
+            yield
+        t = self.M(rows)
         
-        # Réduire les vecteurs mod^+ q
+        # Réduire les vecteurs mod^+ q et les encoder dans les tampons de sortie
         t.reduce_coefficents()
         s.reduce_coefficents()
+        index = t.encode_into(pk_out, 0, l=12)
+        pk_out[index:] = rho
+        s.encode_into(sk_out, 0, l=12)
+        return A, t, s
         
-        # Encoder les éléments en octets et renvoyer
-        pk = t.encode(l=12) + rho
-        sk = s.encode(l=12)
-        return pk, sk
-        
-    def _cpapke_enc(self, pk, m, coins):
+    def _cpapke_enc_steps(self, ek, m, coins, c_out):
         """
         Algorithm 5 (Encryption)
         https://pq-crystals.org/kyber/data/kyber-specification-round3-20210804.pdf
         
-       Saisir:
-            pk : clé publique
+        Saisir:
+            ek : clé publique expansée (voir `EncapsulationKey`)
             m : message ∈ B^32
-            pièces : pièces aléatoires ∈ B^32
+            coins : pièces aléatoires ∈ B^32
+            c_out : tampon de sortie de `ct_length` octets
         Sortir:
-            c : texte chiffré
+            c : texte chiffré écrit dans c_out
         """
-        N = 0
-        rho = pk[-32:]
-        
-        tt = self.M.decode(pk, 1, self.k, l=12, is_ntt=True)        
-        
         # Encoder le message sous forme de polynôme
         m_poly = self.R.decode(m, l=1).decompress(1)
         
-        # Générer la matrice A^T ∈ R^(kxk)
-        At = self._generate_matrix_from_seed(rho, transpose=True, is_ntt=True)
-        
-        # Générer le vecteur d'erreur r ∈ R^k
-        r, N = self._generate_error_vector(coins, self.eta_1, N)
-        r.to_ntt()
-        
-        # Générer le vecteur d'erreur e1 ∈ R^k
-        e1, N = self._generate_error_vector(coins, self.eta_2, N)
-        
-        # Générer le polynôme d'erreur e2 ∈ R
+        # Générer le bruit r (forme NTT), e1, e2
+        r, N = yield from self._error_vector_steps(coins, self.eta_1, 0, to_ntt=True)
+        e1, N = yield from self._error_vector_steps(coins, self.eta_2, N)
         input_bytes = self._prf(coins,  bytes([N]), 64*self.eta_2)
         e2 = self.R.cbd(input_bytes, self.eta_2)
+        yield
         
-        # Module/Arithmétique polynomiale
-        u = (At @ r).from_ntt() + e1
-        v = (tt @ r)[0][0].from_ntt()
-        v = v + e2 + m_poly
-        
-        # Texte chiffré en octets
-        c1 = u.compress(self.du).encode(l=self.du)
-        c2 = v.compress(self.dv).encode(l=self.dv)
-        
-        return c1 + c2
+        # u = A^T r + e1 et v = t^T r + e2 + m, une ligne par étape : le
+        # texte chiffré est écrit dans le tampon de sortie en une passe par
+        # polynôme (INTT, ajout du bruit, compression, empaquetage)
+        index = 0
+        for i in range(self.k):
+            u_i = self._row_product(ek.At, i, r)
+            yield
+            index = self._intt_add_compress_encode_into(u_i, (e1[i][0],), self.du, c_out, index)
+            yield
+        v = self._row_product(ek.tt, 0, r)
+        yield
+        self._intt_add_compress_encode_into(v, (e2, m_poly), self.dv, c_out, index)
+        yield
     
-    def _cpapke_dec(self, sk, c):
+    def _cpapke_dec_steps(self, st, c):
         """
         Algorithm 6 (Decryption)
         https://pq-crystals.org/kyber/data/kyber-specification-round3-20210804.pdf
         
         Saisir:
-            sk : clé publique
-            c : message ∈ B^32
+            st : clé secrète ŝ^T, déjà décodée sous forme NTT
+            c : texte chiffré
         Sortir:
             m : message ∈ B^32
         """
@@ -256,23 +742,132 @@ class Kyber:
         index = self.du * self.k * self.R.n // 8
         c2 = c[index:]
         
-        # Récupérez le vecteur u et convertissez-le en forme NTT
-        u = self.M.decode(c, self.k, 1, l=self.du).decompress(self.du)
-        u.to_ntt()
+        # Récupérez le vecteur u directement sous forme NTT
+        # (dépaquetage + décompression + NTT fusionnés)
+        chunk_length = self.du * self.R.n // 8
+        u = []
+        for i in range(0, index, chunk_length):
+            u.append([self._decode_decompress_ntt(c[i:i+chunk_length], self.du)])
+            yield
         
         # Récupérer le polynôme v
-        v = self.R.decode(c2, l=self.dv).decompress(self.dv)
-        
-        # s_transpose (déjà sous forme NTT)
-        st = self.M.decode(sk, 1, self.k, l=12, is_ntt=True)
+        v = self._decode_decompress_ntt(c2, self.dv, to_ntt=False)
         
         # Récupérer le message sous forme de polynôme
-        m = (st @ u)[0][0].from_ntt()
+        m = (st @ self.M(u))[0][0].from_ntt()
+        yield
         m = v - m
         
         # Renvoie le message sous forme d'octets
         return m.compress(1).encode(l=1)
     
+    def _expand_keys(self, keys, expand):
+        """
+        Fonction d'assistance qui expanse les clés d'un lot, une seule
+        fois par clé distincte. Les clés déjà expansées sont conservées.
+        """
+        expanded = {}
+        output = []
+        for key in keys:
+            if isinstance(key, (EncapsulationKey, DecapsulationKey)):
+                output.append(self._check_key(key))
+                continue
+            key = bytes(as_memoryview(key))
+            if key not in expanded:
+                expanded[key] = expand(key)
+            output.append(expanded[key])
+        return output
+        
+    @staticmethod
+    def _output_views(buffer, count, length):
+        view = memoryview(buffer)
+        return [view[i*length:(i+1)*length] for i in range(count)]
+    
+    def _keygen_steps(self, d, z, pk_out, sk_out):
+        """
+        Algorithm 7 (CCA KEM KeyGen), étape par étape à partir
+        des graines (d, z).
+        """
+        index = 12 * self.k * self.R.n // 8
+        expanded = yield from self._cpapke_keygen_steps(d, pk_out, sk_out[:index])
+        
+        # sk = sk' || pk || H(pk) || z
+        sk_out[index:index+self.pk_length] = pk_out
+        sk_out[index+self.pk_length:-32] = self._h(pk_out)
+        sk_out[-32:] = z
+        return expanded
+    
+    def _enc_steps(self, pk, c_out, K_out, key_length, coin=None):
+        """
+        Algorithm 8 (CCA KEM Encapsulation), étape par étape. `pk` est une
+        clé publique en octets ou une `EncapsulationKey` ; `coin` contient
+        les 32 octets aléatoires de l'encapsulation s'ils ont déjà été tirés.
+        """
+        if isinstance(pk, EncapsulationKey):
+            ek = self._check_key(pk)
+        else:
+            ek = yield from self._encapsulation_key_steps(pk)
+        if coin is None:
+            coin = self.random_bytes(32)
+        m = self._h(coin)
+        Kbar, r = self._g(m + ek.hpk)
+        yield from self._cpapke_enc_steps(ek, m, r, c_out)
+        K_out[:] = self._kdf(Kbar + self._h(c_out), key_length)
+        
+    def _dec_steps(self, c, sk, K_out, key_length):
+        """
+        Algorithm 9 (CCA KEM Decapsulation), étape par étape. `sk` est une
+        clé secrète en octets ou une `DecapsulationKey`.
+        """
+        c = as_memoryview(c)
+        self._check_ciphertexts([c])
+        if isinstance(sk, DecapsulationKey):
+            dk = self._check_key(sk)
+        else:
+            dk = yield from self._decapsulation_key_steps(sk)
+        
+        # Decrypt the ciphertext
+        _m = yield from self._cpapke_dec_steps(dk.st, c)
+        
+        # Decapsulation : re-chiffrement dans un tampon de travail
+        _Kbar, _r = self._g(_m + dk.ek.hpk)
+        _c = bytearray(self.ct_length)
+        yield from self._cpapke_enc_steps(dk.ek, _m, _r, _c)
+        
+        # si la décapsulation a réussi, retournez K
+        if c == _c:
+            K_out[:] = self._kdf(_Kbar + self._h(c), key_length)
+        # Échec de la décapsulation... renvoie une valeur aléatoire
+        else:
+            K_out[:] = self._kdf(dk.z + self._h(c), key_length)
+    
+    def _keygen_batch(self, seeds, pk_outs, sk_outs):
+        """
+        Exécute `_keygen_steps` sur chaque graine (d, z) d'un lot, l'une
+        après l'autre.
+        """
+        return [run_steps(self._keygen_steps(d, z, pk, sk)) for (d, z), pk, sk in zip(seeds, pk_outs, sk_outs)]
+    
+    def _enc_batch(self, eks, c_outs, K_outs, key_length, coins=None):
+        """
+        Exécute `_enc_steps` sur chaque clé publique expansée d'un lot,
+        l'une après l'autre. `coins` contient les 32 octets aléatoires de
+        chaque encapsulation s'ils ont déjà été tirés.
+        """
+        if coins is None:
+            coins = [self.random_bytes(32) for _ in eks]
+        for ek, c, K, coin in zip(eks, c_outs, K_outs, coins):
+            run_steps(self._enc_steps(ek, c, K, key_length, coin))
+            
+    def _dec_batch(self, cs, dks, K_outs, key_length):
+        """
+        Exécute `_dec_steps` sur chaque couple (texte chiffré, clé secrète
+        expansée) d'un lot, l'un après l'autre.
+        """
+        self._check_ciphertexts(cs)
+        for c, dk, K in zip(cs, dks, K_outs):
+            run_steps(self._dec_steps(c, dk, K, key_length))
+    
     def keygen(self):
         """
         Algorithm 7 (CCA KEM KeyGen)
@@ -283,16 +878,78 @@ class Kyber:
             sk : clé secrète
             
         """
-        # Notez que bien que les gens du papier z alors
-        # pk, sk, l'implémentation fait ça
-        # moyen de contournement, ce qui est important pour le déterminisme
-        # le hasard...
-        pk, _sk = self._cpapke_keygen()
+        pk = bytearray(self.pk_length)
+        sk = bytearray(self.sk_length)
+        self.keygen_into(pk, sk)
+        return bytes(pk), bytes(sk)
+        
+    def keygen_into(self, pk_out, sk_out, pk_offset=0, sk_offset=0):
+        """
+        Comme `keygen`, mais écrit pk et sk dans les tampons accessibles en
+        écriture `pk_out` et `sk_out`, à partir des positions données.
+        """
+        pk = self._output_view(pk_out, pk_offset, self.pk_length)
+        sk = self._output_view(sk_out, sk_offset, self.sk_length)
+        
+        # Notez que bien que le papier tire z avant
+        # pk, sk, l'implémentation de référence tire d
+        # d'abord, ce qui est important pour le déterminisme
+        # (KATs)...
+        d = self.random_bytes(32)
         z = self.random_bytes(32)
+        run_steps(self._keygen_steps(d, z, pk, sk))
         
-        # sk = sk' || pk || H(pk) || z
-        sk = _sk + pk + self._h(pk) + z
-        return pk, sk
+    def keygen_batch(self, count):
+        """
+        Génère `count` paires de clés (pk, sk) dans des tampons contigus.
+        Les octets aléatoires sont tirés dans le même ordre que pour `count`
+        appels à `keygen` : les résultats sont identiques.
+        """
+        seeds = [(self.random_bytes(32), self.random_bytes(32)) for _ in range(count)]
+        pks = self._output_views(bytearray(count * self.pk_length), count, self.pk_length)
+        sks = self._output_views(bytearray(count * self.sk_length), count, self.sk_length)
+        self._keygen_batch(seeds, pks, sks)
+        return [(bytes(pk), bytes(sk)) for pk, sk in zip(pks, sks)]
+        
+    def generate_seed(self):
+        """
+        Tire une graine compacte d || z de 64 octets, qui détermine
+        entièrement une paire de clés (voir `keygen_from_seed`).
+        
+        Les octets sont tirés dans le même ordre que `keygen` :
+        `keygen_from_seed(generate_seed())` donne le même résultat.
+        """
+        return self.random_bytes(32) + self.random_bytes(32)
+        
+    def _split_seed(self, seed):
+        seed = as_memoryview(seed)
+        if len(seed) != self.seed_length:
+            raise ValueError(f"La graine doit avoir une longueur de {self.seed_length} octets. L'entrée a une longueur de {len(seed)}")
+        return seed[:32], seed[32:]
+        
+    def keygen_from_seed(self, seed):
+        """
+        Régénère de façon déterministe la paire de clés (pk, sk)
+        déterminée par la graine compacte `seed` = d || z.
+        """
+        pk = bytearray(self.pk_length)
+        sk = bytearray(self.sk_length)
+        run_steps(self._keygen_steps(*self._split_seed(seed), memoryview(pk), memoryview(sk)))
+        return bytes(pk), bytes(sk)
+        
+    def decapsulation_key_from_seed(self, seed):
+        """
+        Régénère directement la `DecapsulationKey` déterminée par la
+        graine compacte `seed` = d || z.
+        """
+        pk = bytearray(self.pk_length)
+        sk = bytearray(self.sk_length)
+        A, t, s = run_steps(self._keygen_steps(*self._split_seed(seed), memoryview(pk), memoryview(sk)))
+        
+        # Les éléments calculés par la génération de clé sont déjà sous forme
+        # NTT et réduits : A^T, t^T et s^T ne sont ni régénérés ni décodés
+        ek = EncapsulationKey(bytes(pk), t.transpose(), A.transpose(), bytes(sk[-64:-32]))
+        return DecapsulationKey(s.transpose(), ek, bytes(sk[-32:]))
         
     def enc(self, pk, key_length=32):
         """
@@ -300,17 +957,39 @@ class Kyber:
         https://pq-crystals.org/kyber/data/kyber-specification-round3-20210804.pdf
         
         Saisir:
-            pk : clé publique
+            pk : clé publique (tout objet supportant le protocole tampon),
+                 ou `EncapsulationKey` déjà expansée
         Sortir:
             c : texte chiffré
             K : clé partagée
         """
-        m = self.random_bytes(32)
-        m_hash = self._h(m)
-        Kbar, r = self._g(m_hash + self._h(pk))
-        c = self._cpapke_enc(pk, m_hash, r)
-        K = self._kdf(Kbar + self._h(c), key_length)
-        return c, K
+        c = bytearray(self.ct_length)
+        K = bytearray(key_length)
+        self.enc_into(pk, c, K, key_length=key_length)
+        return bytes(c), bytes(K)
+        
+    def enc_into(self, pk, c_out, key_out, c_offset=0, key_offset=0, key_length=32):
+        """
+        Comme `enc`, mais écrit le texte chiffré et la clé partagée dans les
+        tampons accessibles en écriture `c_out` et `key_out`, à partir des
+        positions données.
+        """
+        c = self._output_view(c_out, c_offset, self.ct_length)
+        K = self._output_view(key_out, key_offset, key_length)
+        run_steps(self._enc_steps(pk, c, K, key_length))
+        
+    def enc_batch(self, pks, key_length=32):
+        """
+        Encapsule vers chacune des clés publiques de `pks` (octets ou
+        `EncapsulationKey`). Le seul gain par rapport à des appels
+        successifs à `enc` est que chaque clé distincte n'est expansée
+        qu'une fois. Renvoie la liste des (c, K), identique à ces appels.
+        """
+        eks = self._expand_keys(pks, self.encapsulation_key)
+        cs = self._output_views(bytearray(len(eks) * self.ct_length), len(eks), self.ct_length)
+        Ks = self._output_views(bytearray(len(eks) * key_length), len(eks), key_length)
+        self._enc_batch(eks, cs, Ks, key_length)
+        return [(bytes(c), bytes(K)) for c, K in zip(cs, Ks)]
 
     def dec(self, c, sk, key_length=32):
         """
@@ -318,31 +997,37 @@ class Kyber:
         https://pq-crystals.org/kyber/data/kyber-specification-round3-20210804.pdf
         
         Saisir:
-            c : texte chiffré
-            sk : clé secrète
+            c : texte chiffré (tout objet supportant le protocole tampon)
+            sk : clé secrète (tout objet supportant le protocole tampon),
+                 ou `DecapsulationKey` déjà expansée
         Sortir:
             K : clé partagée
         """
-        # Extraire les valeurs de `sk`
-        # sk = _sk || pk || H(pk) || z
-        index = 12 * self.k * self.R.n // 8
-        _sk =  sk[:index]
-        pk = sk[index:-64]
-        hpk = sk[-64:-32]
-        z = sk[-32:]
+        K = bytearray(key_length)
+        self.dec_into(c, sk, K, key_length=key_length)
+        return bytes(K)
         
-        # Decrypt the ciphertext
-        _m = self._cpapke_dec(_sk, c)
-        
-        # Decapsulation
-        _Kbar, _r = self._g(_m + hpk)
-        _c = self._cpapke_enc(pk, _m, _r)
+    def dec_into(self, c, sk, key_out, key_offset=0, key_length=32):
+        """
+        Comme `dec`, mais écrit la clé partagée dans le tampon accessible
+        en écriture `key_out`, à partir de la position `key_offset`.
+        """
+        K = self._output_view(key_out, key_offset, key_length)
+        run_steps(self._dec_steps(c, sk, K, key_length))
         
-        # si la décapsulation a réussi, retournez K
-        if c == _c:
-            return self._kdf(_Kbar + self._h(c), key_length)
-        # Échec de la décapsulation... renvoie une valeur aléatoire
-        return self._kdf(z + self._h(c), key_length)
+    def dec_batch(self, pairs, key_length=32):
+        """
+        Décapsule chacun des couples (c, sk) de `pairs` (sk en octets ou
+        `DecapsulationKey`). Le seul gain par rapport à des appels
+        successifs à `dec` est que chaque clé distincte n'est expansée
+        qu'une fois. Renvoie la liste des K, identique à ces appels.
+        """
+        cs = [as_memoryview(c) for c, _ in pairs]
+        self._check_ciphertexts(cs)
+        dks = self._expand_keys([sk for _, sk in pairs], self.decapsulation_key)
+        Ks = self._output_views(bytearray(len(cs) * key_length), len(cs), key_length)
+        self._dec_batch(cs, dks, Ks, key_length)
+        return [bytes(K) for K in Ks]
 
 # Initialisez avec les paramètres par défaut pour une importation facile
 Kyber512 = Kyber(DEFAULT_PARAMETERS["kyber_512"])
@@ -1,8 +1,17 @@
+from utils import as_memoryview
+
 class Module:
     def __init__(self, ring):
         self.ring = ring
         
     def decode(self, input_bytes, m, n, l=None, is_ntt=False):
+        """
+        Décode une matrice m x n d'éléments de l'anneau.
+        
+        `input_bytes` peut être tout objet supportant le protocole tampon :
+        chaque polynôme est décodé depuis une tranche `memoryview`, sans copie.
+        """
+        input_bytes = as_memoryview(input_bytes)
         if l is None:
             #La longueur de l'entrée doit être de 32*l*m*n octets.
             l, check = divmod(8*len(input_bytes), self.ring.n*m*n)
@@ -11,12 +20,12 @@ class Module:
         else:
             if self.ring.n*l*m*n > len(input_bytes)*8:
                 raise ValueError("La longueur en octets est trop courte pour la valeur donnée de l")
-        chunk_length = 32*l
-        byte_chunks = [input_bytes[i:i+chunk_length] for i in range(0, len(input_bytes), chunk_length)]
+        chunk_length = self.ring.n*l // 8
         matrix = [[0 for _ in range(n)] for _ in range(m)]
         for i in range(m):
             for j in range(n):
-                mij = self.ring.decode(byte_chunks[n*i+j], l=l, is_ntt=is_ntt)
+                start = chunk_length*(n*i+j)
+                mij = self.ring.decode(input_bytes[start:start+chunk_length], l=l, is_ntt=is_ntt)
                 matrix[i][j] = mij
         return self(matrix)
 
@@ -87,6 +96,12 @@ class Module:
                 for j in range(self.n):
                     output += row[j].encode(l=l)
             return output
+
+        def encode_into(self, buffer, offset=0, l=None):
+            for row in self.rows:
+                for j in range(self.n):
+                    offset = row[j].encode_into(buffer, offset, l=l)
+            return offset
             
         def compress(self, d):
             for row in self.rows:
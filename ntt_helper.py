@@ -164,12 +164,25 @@ class NTTHelper():
         if not poly.is_ntt:
             raise ValueError("Can only convert from a polynomial in NTT form")
             
+        coeffs = self.inverse_butterflies(poly.coeffs)
+        for j in range(poly.parent.n):
+            coeffs[j] = self.ntt_mul(coeffs[j], self.f)
+            
+        poly.is_ntt = False
+        return poly
+    
+    def inverse_butterflies(self, coeffs):
+        """
+        Gentleman-Sande butterflies of the inverse NTT, in place, without
+        the final multiplication by f (see `from_ntt`). Split out so that
+        fused kernels can apply the scaling in their own single pass.
+        """
         l, l_upper = 2, 128
         k = l_upper - 1
-        coeffs = poly.coeffs
+        n = len(coeffs)
         while l <= 128:
             start = 0
-            while start < poly.parent.n:
+            while start < n:
                 zeta = self.zetas[k]
                 k = k - 1
                 for j in range(start, start+l):
@@ -179,11 +192,7 @@ class NTTHelper():
                     coeffs[j+l] = self.ntt_mul(zeta, coeffs[j+l])
                 start = j + l + 1
             l = l << 1
-        for j in range(poly.parent.n):
-            coeffs[j] = self.ntt_mul(coeffs[j], self.f)
-            
-        poly.is_ntt = False
-        return poly
+        return coeffs
     
 NTTHelperKyber = NTTHelper(NTT_PARAMETERS["kyber"])
 
@@ -66,7 +66,11 @@ class PolynomialRing:
         Decode (Algorithm 3)
         
         decode: B^32l -> R_q
+        
+        Accepte tout objet supportant le protocole tampon (bytes,
+        bytearray, memoryview, mmap), lu sans copie.
         """
+        input_bytes = as_memoryview(input_bytes)
         if l is None:
             l, check = divmod(8*len(input_bytes), self.n)
             if check != 0:
@@ -136,6 +140,16 @@ class PolynomialRing:
                 l = max(x.bit_length() for x in self.coeffs)
             bit_string = ''.join(format(c, f'0{l}b')[::-1] for c in self.coeffs)
             return bitstring_to_bytes(bit_string)
+        
+        def encode_into(self, buffer, offset=0, l=None):
+            """
+            Encode le polynôme directement dans `buffer` (tampon accessible en
+            écriture) à partir de l'octet `offset`, sans objet intermédiaire.
+            Renvoie la position qui suit le dernier octet écrit.
+            """
+            if l is None:
+                l = max(x.bit_length() for x in self.coeffs)
+            return pack_into(buffer, offset, self.coeffs, l)
             
         def compress(self, d):
             """
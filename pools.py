@@ -0,0 +1,311 @@
+import os
+import queue
+import threading
+import weakref
+from abc import ABC, abstractmethod
+from collections import deque, namedtuple
+from time import perf_counter
+from utils import as_memoryview
+
+PoolMetrics = namedtuple("PoolMetrics", ["depth", "low_watermark", "high_watermark", "generated", "taken", "empty_takes", "refill_rate"])
+
+# Pools vivants, vidés dans le processus enfant après un fork
+_live_pools = weakref.WeakSet()
+
+def _after_fork_in_child():
+    for pool in list(_live_pools):
+        pool._reset_after_fork()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def _background_kyber(kyber):
+    """
+    Instance du même jeu de paramètres que `kyber`, réservée au thread de
+    remplissage : sa source d'aléa (os.urandom) n'est partagée ni avec
+    l'appelant ni avec un DRBG semé par `set_drbg_seed`.
+    """
+    return type(kyber)(kyber.parameter_set)
+
+
+class _RefillingPool(ABC):
+    """
+    File d'éléments pré-calculés, remplie en arrière-plan par un thread.
+
+    Lorsque la profondeur descend à `low_watermark`, le thread génère des
+    éléments par lots de `batch_size` jusqu'à atteindre `high_watermark`.
+    Les sous-classes définissent `_generate(count)`.
+
+    Sûreté vis-à-vis de fork : dans le processus enfant, la file est vidée
+    et le thread de remplissage est relancé à la demande, de sorte qu'un
+    élément pré-calculé n'est jamais servi par deux processus.
+    """
+    def __init__(self, low_watermark, high_watermark, batch_size=1, start=True):
+        if not 0 <= low_watermark <= high_watermark or high_watermark < 1:
+            raise ValueError("Les seuils doivent vérifier 0 <= low_watermark <= high_watermark et high_watermark >= 1")
+        self.low_watermark = low_watermark
+        self.high_watermark = high_watermark
+        self.batch_size = batch_size
+        self._init_state()
+        _live_pools.add(self)
+        if start:
+            self.start()
+
+    def _init_state(self):
+        self.items = deque()
+        self.condition = threading.Condition()
+        self.thread = None
+        self.stopped = False
+        self.filling = True
+        self.pid = os.getpid()
+        self.restart = False
+        self.error = None
+
+        self.generated = 0
+        self.taken = 0
+        self.empty_takes = 0
+        self.refill_time = 0.0
+
+    @abstractmethod
+    def _generate(self, count):
+        """
+        Génère `count` éléments, appelée depuis le thread de remplissage.
+        """
+
+    def start(self):
+        """
+        Démarre le thread de remplissage (sans effet s'il tourne déjà).
+        """
+        with self.condition:
+            if self.thread is not None and self.thread.is_alive():
+                return
+            self.stopped = False
+            self.thread = threading.Thread(target=self._refill, name=f"kyber-{type(self).__name__}", daemon=True)
+            self.thread.start()
+
+    def stop(self, wait=True):
+        """
+        Arrête le thread de remplissage ; les éléments déjà prêts restent disponibles.
+        """
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+            thread = self.thread
+        if wait and thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def take(self, block=True, timeout=None):
+        """
+        Retire et renvoie un élément prêt.
+
+        Si la file est vide : avec `block=True`, attend qu'un élément soit
+        généré (au plus `timeout` secondes) ; sinon lève `queue.Empty`.
+        """
+        self._check_fork()
+        if self.restart:
+            self.restart = False
+            self.start()
+        with self.condition:
+            if not self.items:
+                self.empty_takes += 1
+                if not block:
+                    raise queue.Empty
+                if self.error is not None:
+                    raise RuntimeError("Le remplissage du pool a échoué") from self.error
+                if self.thread is None or not self.thread.is_alive():
+                    raise RuntimeError("Le pool est vide et son thread de remplissage n'est pas démarré")
+                if not self.condition.wait_for(lambda: self.items or self.stopped, timeout):
+                    raise queue.Empty
+                if not self.items:
+                    if self.error is not None:
+                        raise RuntimeError("Le remplissage du pool a échoué") from self.error
+                    raise queue.Empty
+            item = self.items.popleft()
+            self.taken += 1
+            if len(self.items) <= self.low_watermark:
+                self.filling = True
+                self.condition.notify_all()
+            return item
+
+    def metrics(self):
+        with self.condition:
+            refill_rate = self.generated / self.refill_time if self.refill_time else 0.0
+            return PoolMetrics(len(self.items), self.low_watermark, self.high_watermark,
+                               self.generated, self.taken, self.empty_takes, refill_rate)
+
+    def __len__(self):
+        return len(self.items)
+
+    def _refill(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.stopped or self.filling)
+                if self.stopped:
+                    return
+                count = min(self.batch_size, self.high_watermark - len(self.items))
+                pid = self.pid
+
+            t0 = perf_counter()
+            try:
+                items = self._generate(count) if count > 0 else []
+            except Exception as e:
+                with self.condition:
+                    self.error = e
+                    self.stopped = True
+                    self.condition.notify_all()
+                return
+            elapsed = perf_counter() - t0
+
+            with self.condition:
+                # Un fork pendant la génération : ces éléments appartiennent au parent
+                if pid != os.getpid():
+                    return
+                self.items.extend(items)
+                self.generated += len(items)
+                self.refill_time += elapsed
+                if len(self.items) >= self.high_watermark:
+                    self.filling = False
+                self.condition.notify_all()
+
+    def _check_fork(self):
+        if self.pid != os.getpid():
+            self._reset_after_fork()
+
+    def _reset_after_fork(self):
+        """
+        Dans le processus enfant : oublie les éléments hérités du parent
+        (avec un verrou neuf, celui du parent a pu être copié verrouillé).
+        Le remplissage reprend au prochain `take` si le pool était actif.
+        """
+        if self.pid == os.getpid():
+            return
+        was_running = self.thread is not None and not self.stopped
+        self._init_state()
+        self.restart = was_running
+
+
+class KeypairPool(_RefillingPool):
+    """
+    Réserve de paires de clés (pk, sk) éphémères prêtes à l'emploi pour un
+    jeu de paramètres, régénérées en arrière-plan avec `Kyber.keygen_batch`.
+
+    Exemple :
+        pool = KeypairPool(Kyber768, low_watermark=8, high_watermark=32)
+        pk, sk = pool.take()
+
+    Remarque : les paires sont tirées par le thread de remplissage avec
+    une instance `Kyber` propre au pool et sa propre source d'aléa
+    (os.urandom) : un `set_drbg_seed` sur `kyber` ne s'applique pas au pool.
+    """
+    def __init__(self, kyber, low_watermark=8, high_watermark=32, batch_size=4, start=True):
+        self.kyber = _background_kyber(kyber)
+        super().__init__(low_watermark, high_watermark, batch_size=batch_size, start=start)
+
+    def _generate(self, count):
+        return self.kyber.keygen_batch(count)
+
+
+class _PeerEncapsulationQueue(_RefillingPool):
+    """
+    File d'encapsulations (c, K) pré-calculées vers une clé publique.
+    """
+    def __init__(self, kyber, ek, low_watermark, high_watermark, batch_size, key_length, start=True):
+        self.session = _background_kyber(kyber).encapsulation_session(ek)
+        self.key_length = key_length
+        super().__init__(low_watermark, high_watermark, batch_size=batch_size, start=start)
+
+    def _generate(self, count):
+        return self.session.encapsulate(count, key_length=self.key_length)
+
+
+class EncapsulationPool:
+    """
+    Encapsulations pré-calculées vers quelques pairs « chauds ».
+
+    Le message aléatoire m ne dépend pas de l'usage qui sera fait de
+    l'encapsulation : pour chaque clé publique enregistrée avec `add_peer`,
+    des couples (c, K) sont calculés à l'avance en arrière-plan (comme par
+    `Kyber.enc`, via une `EncapsulationSession`), et l'encapsulation au
+    moment de la connexion se réduit à `take(pk)`. Comme pour
+    `KeypairPool`, le pré-calcul utilise une instance `Kyber` propre à
+    chaque pair et la source d'aléa os.urandom.
+
+    Chaque couple est à usage unique : il est retiré de la file sous verrou
+    et n'est jamais servi deux fois, ni après `remove_peer` / `rotate_peer`,
+    ni dans un processus enfant après un fork.
+    """
+    def __init__(self, kyber, low_watermark=4, high_watermark=16, batch_size=4, max_peers=16, key_length=32):
+        self.kyber = kyber
+        self.key_length = key_length
+        self.low_watermark = low_watermark
+        self.high_watermark = high_watermark
+        self.batch_size = batch_size
+        self.max_peers = max_peers
+        self.lock = threading.Lock()
+        self.peers = {}
+
+    def add_peer(self, pk):
+        """
+        Enregistre `pk` et démarre le pré-calcul de ses encapsulations.
+        """
+        ek = self.kyber.encapsulation_key(pk)
+        with self.lock:
+            if ek.pk in self.peers:
+                return
+            if len(self.peers) >= self.max_peers:
+                raise ValueError(f"Le pool contient déjà {self.max_peers} pairs, retirez-en un avec `remove_peer`")
+            self.peers[ek.pk] = _PeerEncapsulationQueue(self.kyber, ek, self.low_watermark,
+                                                        self.high_watermark, self.batch_size, self.key_length)
+
+    def remove_peer(self, pk):
+        """
+        Retire `pk` : le remplissage s'arrête et les encapsulations encore
+        en file sont détruites sans être servies.
+        """
+        with self.lock:
+            queue_ = self.peers.pop(bytes(as_memoryview(pk)), None)
+        if queue_ is not None:
+            queue_.stop()
+            with queue_.condition:
+                queue_.items.clear()
+
+    def rotate_peer(self, old_pk, new_pk):
+        """
+        Remplace la clé d'un pair après une rotation de clé.
+        """
+        self.remove_peer(old_pk)
+        self.add_peer(new_pk)
+
+    def take(self, pk, block=True, timeout=None):
+        """
+        Retire et renvoie un couple (c, K) pré-calculé vers `pk`, voir
+        `KeypairPool.take`. Lève KeyError si `pk` n'est pas enregistré.
+        """
+        with self.lock:
+            queue_ = self.peers[bytes(as_memoryview(pk))]
+        return queue_.take(block=block, timeout=timeout)
+
+    def encapsulate(self, pk):
+        """
+        Renvoie une encapsulation pré-calculée vers `pk` si une est prête,
+        sinon calcule `Kyber.enc(pk)` directement.
+        """
+        try:
+            return self.take(pk, block=False)
+        except (KeyError, queue.Empty):
+            return self.kyber.enc(pk, key_length=self.key_length)
+
+    def metrics(self):
+        """
+        Métriques du pool de chaque pair, indexées par clé publique.
+        """
+        with self.lock:
+            peers = list(self.peers.items())
+        return {pk: queue_.metrics() for pk, queue_ in peers}
+
+    def close(self):
+        with self.lock:
+            pks = list(self.peers)
+        for pk in pks:
+            self.remove_peer(pk)
@@ -0,0 +1,203 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from kyber import Kyber, DecapsulationKey
+from utils import as_memoryview
+
+# Instance de Kyber du worker, créée une seule fois par `_init_worker`
+_worker_kyber = None
+
+def _init_worker(parameter_set, pk_cache_size, cpus, counter):
+    """
+    Initialise un worker : construit Kyber, l'échauffe avec un cycle
+    keygen / enc / dec et, si demandé, épingle le processus sur un CPU.
+    """
+    global _worker_kyber
+    if cpus:
+        with counter.get_lock():
+            index = counter.value
+            counter.value += 1
+        os.sched_setaffinity(0, {cpus[index % len(cpus)]})
+
+    _worker_kyber = Kyber(parameter_set)
+    if pk_cache_size:
+        _worker_kyber.enable_pk_cache(pk_cache_size)
+    pk, sk = _worker_kyber.keygen()
+    c, _ = _worker_kyber.enc(pk)
+    _worker_kyber.dec(c, sk)
+
+def _records(input_bytes, length):
+    view = as_memoryview(input_bytes)
+    return [view[i:i+length] for i in range(0, len(view), length)]
+
+def _keygen_chunk(seeds):
+    """
+    `seeds` : graines d || z concaténées. Renvoie les enregistrements pk || sk.
+    """
+    kyber = _worker_kyber
+    seeds = [kyber._split_seed(seed) for seed in _records(seeds, kyber.seed_length)]
+    output = bytearray(len(seeds) * (kyber.pk_length + kyber.sk_length))
+    records = kyber._output_views(output, len(seeds), kyber.pk_length + kyber.sk_length)
+    kyber._keygen_batch(seeds, [r[:kyber.pk_length] for r in records], [r[kyber.pk_length:] for r in records])
+    return bytes(output)
+
+def _enc_chunk(pks, coins, key_length):
+    """
+    `pks` : clés publiques concaténées, `coins` : 32 octets aléatoires par
+    encapsulation. Renvoie les enregistrements c || K.
+    """
+    kyber = _worker_kyber
+    eks = kyber._expand_keys(_records(pks, kyber.pk_length), kyber.encapsulation_key)
+    output = bytearray(len(eks) * (kyber.ct_length + key_length))
+    records = kyber._output_views(output, len(eks), kyber.ct_length + key_length)
+    kyber._enc_batch(eks, [r[:kyber.ct_length] for r in records], [r[kyber.ct_length:] for r in records],
+                     key_length, coins=_records(coins, 32))
+    return bytes(output)
+
+def _dec_chunk(cs, sks, key_length):
+    """
+    `cs` : textes chiffrés concaténés, `sks` : clés secrètes concaténées.
+    Renvoie les clés partagées concaténées.
+    """
+    kyber = _worker_kyber
+    cs = _records(cs, kyber.ct_length)
+    dks = kyber._expand_keys(_records(sks, kyber.sk_length), kyber.decapsulation_key)
+    output = bytearray(len(cs) * key_length)
+    kyber._dec_batch(cs, dks, kyber._output_views(output, len(cs), key_length), key_length)
+    return bytes(output)
+
+
+class KyberProcessEngine:
+    """
+    Exécute des lots de keygen / enc / dec sur un pool de processus.
+
+    Les workers importent kyber.py et construisent leur instance une seule
+    fois, puis l'échauffent (et activent le cache des clés publiques
+    expansées) avant de recevoir du travail. Les lots sont découpés en
+    morceaux envoyés sous forme d'octets bruts concaténés (enregistrements
+    de taille fixe), et les résultats sont renvoyés dans l'ordre.
+
+    Comme pour `KyberExecutor`, les octets aléatoires sont tirés dans le
+    processus parent par `self.kyber` : après `engine.kyber.set_drbg_seed`,
+    les résultats sont identiques à ceux de `Kyber.keygen_batch` /
+    `Kyber.enc_batch`.
+
+    Avec `pin_cpus=True`, chaque worker est épinglé sur un CPU distinct
+    (`os.sched_setaffinity`, ignoré sur les plateformes qui ne le
+    proposent pas). Les workers sont lancés avec la méthode "spawn" par
+    défaut, sûre même si le parent utilise des threads.
+    """
+    def __init__(self, parameter_set, workers=None, chunk_size=None, pin_cpus=False, pk_cache_size=64, mp_context=None):
+        self.kyber = Kyber(parameter_set)
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        if mp_context is None:
+            mp_context = multiprocessing.get_context("spawn")
+
+        cpus = None
+        if pin_cpus and hasattr(os, "sched_setaffinity"):
+            cpus = sorted(os.sched_getaffinity(0))
+        counter = mp_context.Value("i", 0)
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=mp_context, initializer=_init_worker,
+                                            initargs=(parameter_set, pk_cache_size, cpus, counter))
+
+    def _chunks(self, count):
+        chunk_size = self.chunk_size or max(1, -(-count // self.workers))
+        return [(i, min(i + chunk_size, count)) for i in range(0, count, chunk_size)]
+
+    def _run(self, fn, count, *records):
+        """
+        Soumet `fn` sur chaque morceau des enregistrements `records`
+        (couples (octets concaténés, longueur d'un enregistrement), ou
+        autre argument passé tel quel) et renvoie les résultats concaténés.
+        """
+        futures = []
+        for start, stop in self._chunks(count):
+            args = [bytes(data[start*length:stop*length]) if length else data for data, length in records]
+            futures.append(self.executor.submit(fn, *args))
+        return b"".join(future.result() for future in futures)
+
+    def warm_up(self):
+        """
+        Attend que tous les workers soient démarrés et initialisés.
+        """
+        self.keygen_raw(self.workers)
+
+    def keygen_raw(self, count, seeds=None):
+        """
+        Génère `count` paires de clés et renvoie les enregistrements
+        pk || sk concaténés. Les graines d || z sont tirées par `self.kyber`,
+        ou lues dans `seeds` (graines concaténées) pour une génération
+        reproductible.
+        """
+        if seeds is None:
+            seeds = b"".join(self.kyber.generate_seed() for _ in range(count))
+        elif len(seeds) != count * self.kyber.seed_length:
+            raise ValueError(f"{count} graines de {self.kyber.seed_length} octets sont attendues. L'entrée a une longueur de {len(seeds)}")
+        return self._run(_keygen_chunk, count, (seeds, self.kyber.seed_length))
+
+    def enc_raw(self, pks, key_length=32):
+        """
+        Encapsule vers les clés publiques concaténées de `pks` et renvoie
+        les enregistrements c || K concaténés.
+        """
+        pks = as_memoryview(pks)
+        count = len(pks) // self.kyber.pk_length
+        if len(pks) != count * self.kyber.pk_length:
+            raise ValueError(f"La longueur de l'entrée doit être un multiple de {self.kyber.pk_length} octets")
+        coins = b"".join(self.kyber.random_bytes(32) for _ in range(count))
+        return self._run(_enc_chunk, count, (pks, self.kyber.pk_length), (coins, 32), (key_length, None))
+
+    def dec_raw(self, cs, sks, key_length=32):
+        """
+        Décapsule les textes chiffrés concaténés de `cs` avec les clés
+        secrètes concaténées de `sks` et renvoie les clés partagées
+        concaténées.
+        """
+        cs, sks = as_memoryview(cs), as_memoryview(sks)
+        count = len(cs) // self.kyber.ct_length
+        if len(cs) != count * self.kyber.ct_length or len(sks) != count * self.kyber.sk_length:
+            raise ValueError(f"{count} textes chiffrés de {self.kyber.ct_length} octets et autant de clés secrètes de {self.kyber.sk_length} octets sont attendus")
+        return self._run(_dec_chunk, count, (cs, self.kyber.ct_length), (sks, self.kyber.sk_length), (key_length, None))
+
+    def keygen_batch(self, count):
+        """
+        Comme `Kyber.keygen_batch`.
+        """
+        pk_length = self.kyber.pk_length
+        return [(bytes(r[:pk_length]), bytes(r[pk_length:]))
+                for r in _records(self.keygen_raw(count), pk_length + self.kyber.sk_length)]
+
+    def enc_batch(self, pks, key_length=32):
+        """
+        Comme `Kyber.enc_batch` (clés publiques en octets).
+        """
+        ct_length = self.kyber.ct_length
+        output = self.enc_raw(b"".join(as_memoryview(pk) for pk in pks), key_length)
+        return [(bytes(r[:ct_length]), bytes(r[ct_length:])) for r in _records(output, ct_length + key_length)]
+
+    def dec_batch(self, pairs, key_length=32):
+        """
+        Comme `Kyber.dec_batch`. Les `DecapsulationKey` sont transmises aux
+        workers sous forme d'octets et réexpansées une fois par morceau.
+        """
+        pairs = list(pairs)
+        raw_keys = {}
+        def raw(sk):
+            if not isinstance(sk, DecapsulationKey):
+                return as_memoryview(sk)
+            if id(sk) not in raw_keys:
+                raw_keys[id(sk)] = sk.to_bytes()
+            return raw_keys[id(sk)]
+        cs = b"".join(as_memoryview(c) for c, _ in pairs)
+        sks = b"".join(raw(sk) for _, sk in pairs)
+        return [bytes(K) for K in _records(self.dec_raw(cs, sks, key_length), key_length)]
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
@@ -0,0 +1,207 @@
+"""
+Magasin de clés de décapsulation expansées en mémoire partagée.
+
+Un segment `multiprocessing.shared_memory` contient, une seule fois pour
+tous les processus d'un pool, les clés expansées au format de `key_format` :
+
+    magic "KYBS" | version u16 | réservé (2) | nombre de clés u32
+    | longueur de l'index u32 | index JSON des identifiants (complété à 8)
+    | enregistrements de clés expansées, à pas fixe
+
+Les workers s'attachent au segment par son nom, en lecture seule, et
+décapsulent contre des vues sur le segment : les clés ne sont ni
+décodées depuis sk ni ré-expansées depuis rho dans chaque processus.
+"""
+import json
+import struct
+import sys
+import threading
+from multiprocessing import resource_tracker, shared_memory
+from kyber import DecapsulationKey
+from key_format import dump_expanded_key, load_expanded_key, expanded_key_length
+from key_format import _HEADER as _KEY_HEADER
+from utils import as_memoryview
+
+MAGIC = b"KYBS"
+VERSION = 1
+
+_HEADER = struct.Struct("<4sH2xII")
+# Position de H(pk) dans un enregistrement, voir `key_format`
+_HPK_OFFSET = _KEY_HEADER.size
+
+_untracked_lock = threading.Lock()
+
+def _attach_untracked(name):
+    """
+    Équivalent de `SharedMemory(name, track=False)` avant Python 3.13 : le
+    segment n'est pas enregistré auprès du resource tracker du processus.
+
+    Désenregistrer le segment après coup ne convient pas : un worker lancé
+    par "spawn" ou "fork" partage le resource tracker du propriétaire, et
+    l'enregistrement de celui-ci serait perdu.
+    """
+    with _untracked_lock:
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+def _expand(kyber, key):
+    if isinstance(key, DecapsulationKey):
+        return kyber._check_key(key)
+    if len(as_memoryview(key)) == kyber.seed_length:
+        return kyber.decapsulation_key_from_seed(key)
+    return kyber.decapsulation_key(key)
+
+
+class SharedKeyStore:
+    """
+    Clés de décapsulation expansées partagées entre processus.
+
+    Le processus propriétaire crée le segment avec `SharedKeyStore.create`
+    (et le détruit avec `unlink`) ; les workers s'y attachent avec
+    `SharedKeyStore.attach(kyber, store.name)`. Une clé est retrouvée par
+    son identifiant (`get`) ou par H(pk) (`get_by_hpk`).
+
+    Les enregistrements sont vérifiés à la création ; la lecture dans les
+    workers se fait sans vérification par défaut. Pour garder en plus les
+    clés les plus utilisées sous forme d'objets dans un worker, `get` peut
+    servir de `loader` à un `DecapsulationKeyCache`.
+    """
+    def __init__(self, kyber, shm, owner):
+        self.kyber = kyber
+        self.shm = shm
+        self.owner = owner
+        self.view = shm.buf.toreadonly()
+
+        magic, version, count, index_length = _HEADER.unpack_from(self.view)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError("Le segment n'est pas un magasin de clés expansées (magic invalide)")
+        if version != VERSION:
+            self.close()
+            raise ValueError(f"Version de magasin de clés non prise en charge : {version}")
+
+        key_ids = json.loads(bytes(self.view[_HEADER.size:_HEADER.size + index_length]))
+        self.record_length = expanded_key_length(kyber, secret=True)
+        start = _HEADER.size + index_length
+        start += -start % 8
+        self.offsets = {}
+        self.hpk_offsets = {}
+        for i, key_id in enumerate(key_ids):
+            offset = start + i * self.record_length
+            self.offsets[key_id] = offset
+            self.hpk_offsets[bytes(self.view[offset + _HPK_OFFSET:offset + _HPK_OFFSET + 32])] = offset
+
+    @classmethod
+    def create(cls, kyber, keys, name=None):
+        """
+        Crée un segment contenant les clés de `keys`, un dictionnaire
+        identifiant -> clé secrète (octets sk, graine compacte de
+        `Kyber.seed_length` octets ou `DecapsulationKey`). Les identifiants
+        doivent être des chaînes ou des entiers (ils sont indexés en JSON).
+        """
+        key_ids = list(keys)
+        index = json.dumps(key_ids).encode()
+        start = _HEADER.size + len(index)
+        start += -start % 8
+        record_length = expanded_key_length(kyber, secret=True)
+
+        shm = shared_memory.SharedMemory(name=name, create=True, size=max(start + len(key_ids) * record_length, 1))
+        try:
+            _HEADER.pack_into(shm.buf, 0, MAGIC, VERSION, len(key_ids), len(index))
+            shm.buf[_HEADER.size:_HEADER.size + len(index)] = index
+            for i, key_id in enumerate(key_ids):
+                offset = start + i * record_length
+                shm.buf[offset:offset + record_length] = dump_expanded_key(kyber, _expand(kyber, keys[key_id]))
+            return cls(kyber, shm, owner=True)
+        except BaseException:
+            shm.close()
+            shm.unlink()
+            raise
+
+    @classmethod
+    def attach(cls, kyber, name):
+        """
+        S'attache en lecture seule au segment `name` créé par `create`.
+        """
+        # Un processus qui s'attache ne doit pas enregistrer le segment
+        # auprès de son resource tracker : s'il n'a pas été lancé par le
+        # propriétaire, son tracker détruirait le segment à sa sortie, et
+        # le `unlink` du propriétaire lèverait FileNotFoundError
+        if sys.version_info >= (3, 13):
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            shm = _attach_untracked(name)
+        return cls(kyber, shm, owner=False)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def record(self, key_id):
+        """
+        Vue en lecture seule sur l'enregistrement de `key_id`. Lève
+        KeyError si l'identifiant est inconnu.
+        """
+        offset = self.offsets[key_id]
+        return self.view[offset:offset + self.record_length]
+
+    def get(self, key_id, verify=False):
+        """
+        Renvoie la `DecapsulationKey` de `key_id`, lue depuis le segment.
+        """
+        return load_expanded_key(self.kyber, self.record(key_id), verify=verify)
+
+    def get_by_hpk(self, hpk, verify=False):
+        """
+        Renvoie la `DecapsulationKey` dont la clé publique a pour empreinte
+        `hpk` = H(pk). Lève KeyError si elle n'est pas dans le magasin.
+        """
+        offset = self.hpk_offsets[bytes(as_memoryview(hpk))]
+        return load_expanded_key(self.kyber, self.view[offset:offset + self.record_length], verify=verify)
+
+    def dec(self, key_id, c, key_length=32):
+        """
+        Décapsule `c` avec la clé `key_id`, voir `Kyber.dec`.
+        """
+        return self.kyber.dec(c, self.get(key_id), key_length=key_length)
+
+    def key_ids(self):
+        return list(self.offsets)
+
+    def __contains__(self, key_id):
+        return key_id in self.offsets
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def close(self):
+        """
+        Détache ce processus du segment. Les vues renvoyées par `record`
+        doivent avoir été libérées.
+        """
+        if self.view is not None:
+            self.view.release()
+            self.view = None
+            self.shm.close()
+
+    def unlink(self):
+        """
+        Détruit le segment (processus propriétaire seulement).
+        """
+        if not self.owner:
+            raise ValueError("Seul le processus qui a créé le magasin peut le détruire")
+        self.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.owner:
+            self.unlink()
+        else:
+            self.close()
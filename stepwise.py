@@ -0,0 +1,84 @@
+"""
+Versions pas à pas (générateurs) de keygen, enc et dec.
+
+`Kyber` implémente keygen, enc et dec sous forme de générateurs qui rendent
+la main (`yield`) entre deux étapes courtes : échantillonnage d'un polynôme
+de Â, d'un polynôme de bruit, une NTT, une ligne d'un produit matriciel...
+`Kyber.keygen` / `enc` / `dec` les exécutent d'une traite ; les générateurs
+de ce module exécutent les mêmes étapes et renvoient le même résultat comme
+valeur de retour.
+
+`run_steps` exécute un générateur jusqu'au bout ; `run_cooperatively` le
+fait depuis une boucle asyncio en rendant la main à la boucle dès que la
+tranche de temps est écoulée, pour borner la latence des autres tâches
+sans exécuteur (voir `CooperativeKyber`).
+"""
+import asyncio
+from time import perf_counter
+from kyber import run_steps
+
+async def run_cooperatively(steps, time_slice=0.002):
+    """
+    Exécute le générateur `steps` depuis une boucle asyncio, en rendant la
+    main à la boucle toutes les `time_slice` secondes (au plus une étape
+    de plus), et renvoie son résultat.
+    """
+    deadline = perf_counter() + time_slice
+    try:
+        while True:
+            next(steps)
+            if perf_counter() >= deadline:
+                await asyncio.sleep(0)
+                deadline = perf_counter() + time_slice
+    except StopIteration as stop:
+        return stop.value
+    finally:
+        steps.close()
+
+def keygen_steps(kyber):
+    """
+    Comme `Kyber.keygen`. Renvoie (pk, sk).
+    """
+    pk = bytearray(kyber.pk_length)
+    sk = bytearray(kyber.sk_length)
+    d = kyber.random_bytes(32)
+    z = kyber.random_bytes(32)
+    yield from kyber._keygen_steps(d, z, memoryview(pk), memoryview(sk))
+    return bytes(pk), bytes(sk)
+
+def enc_steps(kyber, pk, key_length=32):
+    """
+    Comme `Kyber.enc`. Renvoie (c, K).
+    """
+    c = bytearray(kyber.ct_length)
+    K = bytearray(key_length)
+    yield from kyber._enc_steps(pk, c, K, key_length)
+    return bytes(c), bytes(K)
+
+def dec_steps(kyber, c, sk, key_length=32):
+    """
+    Comme `Kyber.dec`. Renvoie K.
+    """
+    K = bytearray(key_length)
+    yield from kyber._dec_steps(c, sk, K, key_length)
+    return bytes(K)
+
+
+class CooperativeKyber:
+    """
+    Façade asyncio sans exécuteur : `await keygen()`, `await enc(pk)` et
+    `await dec(c, sk)` s'exécutent dans le thread de la boucle, par
+    tranches d'au plus `time_slice` secondes (voir `run_cooperatively`).
+    """
+    def __init__(self, kyber, time_slice=0.002):
+        self.kyber = kyber
+        self.time_slice = time_slice
+
+    async def keygen(self):
+        return await run_cooperatively(keygen_steps(self.kyber), self.time_slice)
+
+    async def enc(self, pk, key_length=32):
+        return await run_cooperatively(enc_steps(self.kyber, pk, key_length), self.time_slice)
+
+    async def dec(self, c, sk, key_length=32):
+        return await run_cooperatively(dec_steps(self.kyber, c, sk, key_length), self.time_slice)
@@ -0,0 +1,263 @@
+"""
+Décapsulation en flux d'archives de textes chiffrés.
+
+Fichier d'entrée : enregistrements de taille fixe
+
+    identifiant de clé (`key_id_length` octets, UTF-8 complété par des
+    octets nuls) | c (`ct_length` octets)
+
+Fichier de sortie, dans le même ordre : statut u8 (0 : succès) | K
+(`key_length` octets, nuls en cas d'échec), comme les réponses de
+`bulk_dec`.
+
+L'entrée est projetée en mémoire (mmap) et traitée par morceaux de
+`chunk_size` enregistrements : la mémoire utilisée est bornée par un
+morceau en cours de calcul, un morceau en préparation et le cache de
+clés expansées, quelle que soit la taille de l'archive. Un point de
+reprise (fichier JSON à côté de la sortie) est écrit régulièrement après
+synchronisation de la sortie ; une exécution interrompue reprend au
+dernier point de reprise.
+"""
+import argparse
+import json
+import mmap
+import os
+import sys
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from kyber import Kyber, DEFAULT_PARAMETERS
+from key_cache import DecapsulationKeyCache
+from process_engine import KyberProcessEngine
+from framing import STATUS_OK, STATUS_ERROR
+
+StreamStats = namedtuple("StreamStats", ["records", "processed", "failures", "elapsed"])
+
+def write_archive(path, kyber, jobs, key_id_length=16):
+    """
+    Écrit les travaux (identifiant de clé, c) de `jobs` dans une archive.
+    """
+    with open(path, "wb") as f:
+        for key_id, c in jobs:
+            key_id = str(key_id).encode()
+            if len(key_id) > key_id_length:
+                raise ValueError(f"L'identifiant de clé dépasse {key_id_length} octets : {key_id!r}")
+            if len(c) != kyber.ct_length:
+                raise ValueError(f"Le texte chiffré doit avoir une longueur de {kyber.ct_length} octets. L'entrée a une longueur de {len(c)}")
+            f.write(key_id.ljust(key_id_length, b"\0"))
+            f.write(c)
+
+def read_shared_keys(path, key_length=32):
+    """
+    Lit un fichier de sortie et renvoie la liste des K (None en cas d'échec).
+    """
+    record_length = 1 + key_length
+    with open(path, "rb") as f:
+        data = f.read()
+    return [data[i+1:i+record_length] if data[i] == STATUS_OK else None
+            for i in range(0, len(data), record_length)]
+
+
+class StreamingDecapsulator:
+    """
+    Décapsule des archives de textes chiffrés (voir le format plus haut).
+
+    `loader(key_id)` renvoie la clé secrète (octets sk, graine compacte ou
+    `DecapsulationKey`) ; les clés expansées sont gardées dans un
+    `DecapsulationKeyCache` limité à `max_key_bytes`. Les morceaux sont
+    décapsulés par `engine` : par défaut une instance `Kyber` (lots dans le
+    thread courant), ou un `KyberExecutor` / `KyberProcessEngine` pour le
+    parallélisme. Le calcul d'un morceau se fait dans un thread dédié,
+    pendant la préparation du suivant et l'écriture du précédent.
+
+    Avec un `KyberProcessEngine`, le cache n'évite que les appels à
+    `loader` : les clés sont transmises aux workers en octets et
+    réexpansées une fois par morceau (Â^T restant dans le cache des clés
+    publiques expansées des workers).
+
+    Un enregistrement dont la clé est inconnue ou invalide est marqué en
+    échec dans la sortie sans interrompre le traitement.
+
+    Exemple :
+        decapsulator = StreamingDecapsulator("kyber_768", keys.__getitem__)
+        decapsulator.run("archive.bin", "keys.bin", progress=print)
+    """
+    def __init__(self, parameter_name, loader, engine=None, key_id_length=16, key_length=32, chunk_size=256,
+                 max_key_bytes=64 << 20):
+        self.parameter_name = parameter_name
+        if engine is None:
+            engine = Kyber(DEFAULT_PARAMETERS[parameter_name])
+        # Les clés sont expansées sur l'instance qui les utilise
+        self.kyber = engine if isinstance(engine, Kyber) else engine.kyber
+        if self.kyber.parameter_set != DEFAULT_PARAMETERS[parameter_name]:
+            raise ValueError(f"Le moteur n'utilise pas le jeu de paramètres {parameter_name}")
+        self.engine = engine
+        self.cache = DecapsulationKeyCache(self.kyber, loader, max_key_bytes)
+        self.key_id_length = key_id_length
+        self.key_length = key_length
+        self.chunk_size = chunk_size
+        self.input_length = key_id_length + self.kyber.ct_length
+        self.output_length = 1 + key_length
+
+    def _checkpoint_state(self, input_size):
+        return {"parameter": self.parameter_name, "key_id_length": self.key_id_length,
+                "key_length": self.key_length, "input_size": input_size}
+
+    def _load_checkpoint(self, checkpoint_path, input_size):
+        """
+        Renvoie le nombre d'enregistrements déjà traités d'après le point de
+        reprise (0 s'il n'existe pas).
+        """
+        try:
+            with open(checkpoint_path) as f:
+                checkpoint = json.load(f)
+        except FileNotFoundError:
+            return 0
+        records_done = checkpoint.pop("records_done")
+        if checkpoint != self._checkpoint_state(input_size):
+            raise ValueError(f"Le point de reprise {checkpoint_path} ne correspond pas à cette archive ou à ces paramètres")
+        return records_done
+
+    def _save_checkpoint(self, checkpoint_path, input_size, records_done):
+        checkpoint = dict(self._checkpoint_state(input_size), records_done=records_done)
+        temporary_path = checkpoint_path + ".tmp"
+        with open(temporary_path, "w") as f:
+            json.dump(checkpoint, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary_path, checkpoint_path)
+
+    def _prepare(self, data):
+        """
+        Décode un morceau : renvoie les indices des enregistrements dont la
+        clé a pu être chargée, et les couples (c, clé) correspondants.
+        """
+        view = memoryview(data)
+        indices, pairs = [], []
+        for i in range(len(data) // self.input_length):
+            record = view[i*self.input_length:(i+1)*self.input_length]
+            try:
+                key_id = bytes(record[:self.key_id_length]).rstrip(b"\0").decode()
+                dk = self.cache.get(key_id)
+            except (KeyError, ValueError):
+                continue
+            indices.append(i)
+            pairs.append((record[self.key_id_length:], dk))
+        return indices, pairs
+
+    def _decapsulate(self, count, indices, pairs):
+        """
+        Décapsule un morceau et renvoie les enregistrements de sortie.
+        """
+        output = bytearray(count * self.output_length)
+        if pairs:
+            Ks = self.engine.dec_batch(pairs, key_length=self.key_length)
+            for i, K in zip(indices, Ks):
+                offset = i * self.output_length
+                output[offset+1:offset+self.output_length] = K
+        failed = set(range(count)).difference(indices)
+        for i in failed:
+            output[i * self.output_length] = STATUS_ERROR
+        return output, len(failed)
+
+    def run(self, input_path, output_path, resume=True, progress=None, checkpoint_interval=16):
+        """
+        Décapsule l'archive `input_path` vers `output_path` et renvoie un
+        `StreamStats` (`processed` : enregistrements traités par cet appel).
+
+        Avec `resume`, reprend au point de reprise `output_path + ".checkpoint"`
+        s'il existe ; sinon la sortie est réécrite depuis le début. Le point
+        de reprise est mis à jour tous les `checkpoint_interval` morceaux et
+        supprimé à la fin. `progress(records_done, records)` est appelé
+        après chaque morceau.
+        """
+        t0 = perf_counter()
+        checkpoint_path = output_path + ".checkpoint"
+        input_size = os.path.getsize(input_path)
+        if input_size % self.input_length:
+            raise ValueError(f"La taille de l'archive doit être un multiple de {self.input_length} octets. Elle est de {input_size} octets")
+        records = input_size // self.input_length
+
+        start = self._load_checkpoint(checkpoint_path, input_size) if resume else 0
+        if not resume and os.path.exists(checkpoint_path):
+            os.unlink(checkpoint_path)
+        failures = 0
+
+        mode = "r+b" if start and os.path.exists(output_path) else "wb"
+        if mode == "wb":
+            start = 0
+        with open(input_path, "rb") as f_in, open(output_path, mode) as f_out:
+            # Les écritures au-delà du point de reprise sont recommencées
+            f_out.truncate(start * self.output_length)
+            f_out.seek(start * self.output_length)
+            if records == 0:
+                return StreamStats(0, 0, 0, perf_counter() - t0)
+
+            with mmap.mmap(f_in.fileno(), 0, access=mmap.ACCESS_READ) as mm, \
+                 ThreadPoolExecutor(max_workers=1, thread_name_prefix="kyber-stream") as executor:
+                in_flight = deque()
+                chunks = 0
+
+                def complete():
+                    nonlocal failures, chunks
+                    stop, future = in_flight.popleft()
+                    output, failed = future.result()
+                    f_out.write(output)
+                    failures += failed
+                    chunks += 1
+                    if chunks % checkpoint_interval == 0 and stop < records:
+                        f_out.flush()
+                        os.fsync(f_out.fileno())
+                        self._save_checkpoint(checkpoint_path, input_size, stop)
+                    if progress is not None:
+                        progress(stop, records)
+
+                for chunk_start in range(start, records, self.chunk_size):
+                    chunk_stop = min(chunk_start + self.chunk_size, records)
+                    data = mm[chunk_start*self.input_length:chunk_stop*self.input_length]
+                    indices, pairs = self._prepare(data)
+                    in_flight.append((chunk_stop, executor.submit(self._decapsulate, chunk_stop - chunk_start, indices, pairs)))
+                    # Au plus un morceau en calcul pendant la préparation du suivant
+                    if len(in_flight) > 1:
+                        complete()
+                while in_flight:
+                    complete()
+
+            f_out.flush()
+            os.fsync(f_out.fileno())
+        if os.path.exists(checkpoint_path):
+            os.unlink(checkpoint_path)
+        return StreamStats(records, records - start, failures, perf_counter() - t0)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Décapsulation en flux d'une archive de textes chiffrés")
+    parser.add_argument("keys", help="fichier JSON identifiant de clé -> sk (hexadécimal)")
+    parser.add_argument("input", help="archive d'enregistrements identifiant de clé | c")
+    parser.add_argument("output", help="fichier de sortie statut | K")
+    parser.add_argument("--parameter", default="kyber_768", choices=tuple(DEFAULT_PARAMETERS))
+    parser.add_argument("--key-id-length", type=int, default=16)
+    parser.add_argument("--key-length", type=int, default=32)
+    parser.add_argument("--chunk-size", type=int, default=256)
+    parser.add_argument("--workers", type=int, default=0, help="processus workers (0 : dans ce processus)")
+    parser.add_argument("--restart", action="store_true", help="ignorer le point de reprise")
+    args = parser.parse_args()
+
+    with open(args.keys) as f:
+        keys = {key_id: bytes.fromhex(sk) for key_id, sk in json.load(f).items()}
+    engine = KyberProcessEngine(DEFAULT_PARAMETERS[args.parameter], workers=args.workers) if args.workers else None
+
+    t0 = perf_counter()
+    def progress(done, total):
+        rate = done / (perf_counter() - t0)
+        print(f"\r{done}/{total} enregistrements ({100 * done / total:.1f} %), {rate:.1f}/s", end="", file=sys.stderr)
+
+    try:
+        decapsulator = StreamingDecapsulator(args.parameter, keys.__getitem__, engine, args.key_id_length,
+                                             args.key_length, args.chunk_size)
+        stats = decapsulator.run(args.input, args.output, resume=not args.restart, progress=progress)
+    finally:
+        if engine is not None:
+            engine.shutdown()
+    print(file=sys.stderr)
+    print(f"{stats.processed} enregistrements traités sur {stats.records}, {stats.failures} échecs, {stats.elapsed:.2f} s")
@@ -1,6 +1,35 @@
 import unittest
 import os
-from kyber import Kyber512, Kyber768, Kyber1024
+import mmap
+import multiprocessing
+import socket
+import subprocess
+import sys
+import tempfile
+import asyncio
+import threading
+import queue
+import pickle
+import time
+from hashlib import sha3_256
+from kyber import Kyber, Kyber512, Kyber768, Kyber1024, DEFAULT_PARAMETERS
+from kyber import EncapsulationKey, DecapsulationKey
+from key_cache import DecapsulationKeyCache, expanded_key_footprint
+from pools import KeypairPool, EncapsulationPool, _RefillingPool
+from key_format import dump_expanded_key, load_expanded_key, expanded_key_length
+from shared_key_store import SharedKeyStore
+from executors import KyberExecutor
+from process_engine import KyberProcessEngine
+from async_kyber import AsyncKyber
+from kem_service import KEMService
+from bulk_dec import BulkDecapsulationCoordinator, DecapsulationWorker, serve_worker
+from kem_client import KEMClient, AsyncKEMClient, LoopbackServer
+from kem_client import _Overloaded, OVERLOAD_BACKOFF, MAX_OVERLOAD_BACKOFF
+from loadgen import LatencyHistogram, run_load, parse_mix
+from stream_dec import StreamingDecapsulator, write_archive, read_shared_keys
+from bulk_keygen import BulkKeyGenerator, generate_shard, shard_seed, read_index, read_keypair
+from framing import *
+from stepwise import keygen_steps, enc_steps, dec_steps, run_steps, CooperativeKyber
 from aes256_ctr_drbg import AES256_CTR_DRBG
 
 def parse_kat_data(data):
@@ -92,6 +121,981 @@ class TestKyberDeterministic(unittest.TestCase):
         self.generic_test_kyber_deterministic(Kyber1024, 5)
         
 
+class TestBufferInputs(unittest.TestCase):
+    """
+    `enc` et `dec` acceptent tout objet supportant le protocole tampon.
+    """
+    def test_buffer_protocol_inputs(self):
+        pk, sk = Kyber512.keygen()
+        c, key = Kyber512.enc(bytearray(pk))
+        self.assertEqual(key, Kyber512.dec(memoryview(c), bytearray(sk)))
+        
+        buf = mmap.mmap(-1, len(c) + len(sk))
+        buf[:len(c)] = c
+        buf[len(c):] = sk
+        view = memoryview(buf)
+        self.assertEqual(key, Kyber512.dec(view[:len(c)], view[len(c):]))
+        view.release()
+        buf.close()
+        
+    def test_module_decode_memoryview(self):
+        pk, _ = Kyber768.keygen()
+        t = Kyber768.M.decode(pk, 1, 3, l=12, is_ntt=True)
+        _t = Kyber768.M.decode(memoryview(pk), 1, 3, l=12, is_ntt=True)
+        self.assertEqual(t, _t)
+
+class TestOutputBuffers(unittest.TestCase):
+    """
+    Les variantes `*_into` écrivent exactement les mêmes octets que
+    `keygen`, `enc` et `dec` dans les tampons fournis.
+    """
+    def test_into_matches_scalar_api(self):
+        seed = os.urandom(48)
+        Kyber768.set_drbg_seed(seed)
+        pk, sk = Kyber768.keygen()
+        c, key = Kyber768.enc(pk)
+        
+        Kyber768.set_drbg_seed(seed)
+        frame = bytearray(7 + Kyber768.pk_length + Kyber768.sk_length)
+        Kyber768.keygen_into(frame, frame, pk_offset=7, sk_offset=7 + Kyber768.pk_length)
+        self.assertEqual(frame[7:7 + Kyber768.pk_length], pk)
+        self.assertEqual(frame[7 + Kyber768.pk_length:], sk)
+        
+        frame = bytearray(3 + Kyber768.ct_length + 32)
+        Kyber768.enc_into(pk, frame, frame, c_offset=3, key_offset=3 + Kyber768.ct_length)
+        self.assertEqual(frame[3:3 + Kyber768.ct_length], c)
+        self.assertEqual(frame[3 + Kyber768.ct_length:], key)
+        
+        out = bytearray(40)
+        Kyber768.dec_into(c, sk, out, key_offset=8)
+        self.assertEqual(out[8:], key)
+        
+    def test_invalid_output_buffers(self):
+        pk, _ = Kyber512.keygen()
+        with self.assertRaises(TypeError):
+            Kyber512.enc_into(pk, bytes(Kyber512.ct_length), bytearray(32))
+        with self.assertRaises(ValueError):
+            Kyber512.enc_into(pk, bytearray(Kyber512.ct_length - 1), bytearray(32))
+
+class TestValidation(unittest.TestCase):
+    """
+    Validation des longueurs et contrôle de module des clés publiques.
+    """
+    def test_validate_pks(self):
+        pk, _ = Kyber512.keygen()
+        # Le premier coefficient de t vaut q : 3329 = 0xd01
+        bad_pk = bytes([0x01, 0x0d]) + pk[2:]
+        self.assertEqual(Kyber512.validate_pks([pk, bad_pk, pk[:-1], pk]), [True, False, False, True])
+        with self.assertRaises(ValueError):
+            Kyber512.enc(bad_pk)
+            
+    def test_validate_pks_matches_decode(self):
+        # Compare la validation avec un décodage / ré-encodage explicite de t
+        pks = [os.urandom(Kyber512.pk_length) for _ in range(20)]
+        for pk, valid in zip(pks, Kyber512.validate_pks(pks)):
+            t = Kyber512.M.decode(pk[:-32], 1, Kyber512.k, l=12)
+            expected = all(c < Kyber512.q for row in t for poly in row for c in poly.coeffs)
+            self.assertEqual(valid, expected)
+            
+    def test_validate_ciphertexts(self):
+        pk, sk = Kyber512.keygen()
+        c, _ = Kyber512.enc(pk)
+        self.assertEqual(Kyber512.validate_ciphertexts([c, c + b"\x00"]), [True, False])
+        with self.assertRaises(ValueError):
+            Kyber512.dec(c[:-1], sk)
+            
+    def test_bad_ciphertext_rejected_before_expansion(self):
+        kyber = Kyber(DEFAULT_PARAMETERS["kyber_512"])
+        pk, sk = kyber.keygen()
+        c, _ = kyber.enc(pk)
+        expansions = []
+        matrix_steps = kyber._matrix_steps
+        def spy(*args, **kwargs):
+            expansions.append(args)
+            return matrix_steps(*args, **kwargs)
+        kyber._matrix_steps = spy
+        with self.assertRaises(ValueError):
+            kyber.dec(c[:-1], sk)
+        with self.assertRaises(ValueError):
+            kyber.dec_batch([(c, sk), (c[:-1], sk)])
+        with KyberExecutor(kyber, max_workers=2) as executor, self.assertRaises(ValueError):
+            executor.dec_batch([(c, sk), (c + b"\x00", sk)])
+        self.assertEqual(expansions, [])
+
+class TestFusedKernels(unittest.TestCase):
+    """
+    Les noyaux fusionnés de enc/dec donnent les mêmes résultats que le
+    chemin étape par étape.
+    """
+    def test_fused_kernels_match_step_by_step(self):
+        R, d = Kyber1024.R, Kyber1024.du
+        for _ in range(5):
+            f = R.random_element(is_ntt=True)
+            e = R.cbd(os.urandom(128), 2)
+            out = bytearray(d * R.n // 8)
+            expected = (R(f.coeffs.copy(), is_ntt=True).from_ntt() + e).compress(d).encode(l=d)
+            Kyber1024._intt_add_compress_encode_into(f, (e,), d, out, 0)
+            self.assertEqual(out, expected)
+            
+            expected = R.decode(out, l=d).decompress(d).to_ntt()
+            self.assertEqual(Kyber1024._decode_decompress_ntt(out, d), expected)
+
+class TestPKCache(unittest.TestCase):
+    """
+    Le cache des clés publiques expansées ne change pas les résultats,
+    et compte succès, échecs et évictions.
+    """
+    def test_pk_cache(self):
+        Kyber_cached = Kyber(DEFAULT_PARAMETERS["kyber_512"])
+        Kyber_cached.enable_pk_cache(maxsize=2)
+        keys = [Kyber512.keygen() for _ in range(3)]
+        
+        seed = os.urandom(48)
+        for pk, sk in keys + keys[:1]:
+            Kyber512.set_drbg_seed(seed)
+            Kyber_cached.set_drbg_seed(seed)
+            c, key = Kyber_cached.enc(pk)
+            self.assertEqual((c, key), Kyber512.enc(pk))
+            self.assertEqual(Kyber_cached.dec(c, sk), key)
+            
+        hits, misses, evictions, maxsize, currsize = Kyber_cached.pk_cache_info()
+        self.assertEqual((hits, misses, evictions, maxsize, currsize), (4, 4, 2, 2, 2))
+
+class TestExpandedKeys(unittest.TestCase):
+    """
+    Les clés expansées donnent les mêmes résultats que les octets
+    pk / sk et se resérialisent à l'identique.
+    """
+    def test_expanded_keys(self):
+        pk, sk = Kyber768.keygen()
+        ek = Kyber768.encapsulation_key(pk)
+        dk = Kyber768.decapsulation_key(sk)
+        self.assertEqual(ek.to_bytes(), pk)
+        self.assertEqual(dk.to_bytes(), sk)
+        
+        seed = os.urandom(48)
+        Kyber768.set_drbg_seed(seed)
+        c, key = Kyber768.enc(pk)
+        Kyber768.set_drbg_seed(seed)
+        self.assertEqual(Kyber768.enc(ek), (c, key))
+        self.assertEqual(Kyber768.dec(c, dk), key)
+        
+        with self.assertRaises(ValueError):
+            Kyber512.dec(c, dk)
+            
+    def test_keys_from_other_instance(self):
+        kyber = Kyber(DEFAULT_PARAMETERS["kyber_768"])
+        pk, sk = Kyber768.keygen()
+        ek = Kyber768.encapsulation_key(pk)
+        dk = Kyber768.decapsulation_key(sk)
+        c, key = kyber.enc(ek)
+        self.assertEqual(kyber.dec(c, dk), key)
+        self.assertEqual(Kyber768.dec(c, sk), key)
+        self.assertEqual(kyber.dec_batch([(c, dk)] * 2), [key, key])
+        [(c, key)] = kyber.enc_batch([ek])
+        self.assertEqual(kyber.dec(c, sk), key)
+        self.assertEqual(kyber.encapsulation_session(ek).ek.At.parent, kyber.M)
+        
+    def test_corrupted_secret_key(self):
+        _, sk = Kyber512.keygen()
+        corrupted = bytearray(sk)
+        corrupted[-40] ^= 1
+        with self.assertRaises(ValueError):
+            Kyber512.decapsulation_key(corrupted)
+
+class TestDecapsulationKeyCache(unittest.TestCase):
+    """
+    Cache de clés de décapsulation limité par un budget en octets.
+    """
+    def setUp(self):
+        self.keys = {key_id: Kyber512.keygen() for key_id in "abc"}
+        self.footprint = expanded_key_footprint(Kyber512.decapsulation_key(self.keys["a"][1]))
+        
+    def generic_test_key_cache(self, policy, expected):
+        loads = []
+        def loader(key_id):
+            loads.append(key_id)
+            return self.keys[key_id][1]
+        cache = DecapsulationKeyCache(Kyber512, loader, max_bytes=int(2.5*self.footprint), policy=policy)
+        for key_id in "aaabc":
+            cache.get(key_id)
+        self.assertEqual(sorted(cache.entries), expected)
+        
+        hits, misses, evictions, hit_ratio, entries, bytes_used, _ = cache.metrics()
+        self.assertEqual((hits, misses, evictions, entries), (2, 3, 1, 2))
+        self.assertEqual(bytes_used, 2*cache.key_footprint)
+        self.assertEqual(loads, ["a", "b", "c"])
+        
+        pk, _ = self.keys["c"]
+        c, key = Kyber512.enc(pk)
+        self.assertEqual(cache.dec("c", c), key)
+        
+    def test_lru(self):
+        self.generic_test_key_cache("lru", ["b", "c"])
+        
+    def test_lfu(self):
+        self.generic_test_key_cache("lfu", ["a", "c"])
+
+class TestBatch(unittest.TestCase):
+    """
+    Les API par lot donnent exactement les résultats de l'API scalaire.
+    """
+    def generic_test_batch(self, Kyber, count):
+        seed = os.urandom(48)
+        Kyber.set_drbg_seed(seed)
+        keys = [Kyber.keygen() for _ in range(count)]
+        pks = [pk for pk, _ in keys] + [keys[0][0]]
+        encs = [Kyber.enc(pk) for pk in pks]
+        
+        Kyber.set_drbg_seed(seed)
+        self.assertEqual(Kyber.keygen_batch(count), keys)
+        self.assertEqual(Kyber.enc_batch(pks), encs)
+        
+        pairs = [(c, sk) for (c, _), (_, sk) in zip(encs, keys + keys[:1])]
+        # Un texte chiffré modifié donne la valeur de rejet implicite
+        pairs.append((bytes(len(encs[0][0])), keys[0][1]))
+        expected = [key for _, key in encs] + [Kyber.dec(*pairs[-1])]
+        self.assertEqual(Kyber.dec_batch(pairs), expected)
+        
+    def test_encapsulation_session(self):
+        pk, sk = Kyber768.keygen()
+        seed = os.urandom(48)
+        Kyber768.set_drbg_seed(seed)
+        encs = [Kyber768.enc(pk) for _ in range(4)]
+        Kyber768.set_drbg_seed(seed)
+        self.assertEqual(Kyber768.encapsulation_session(pk).encapsulate(4), encs)
+        for c, key in encs:
+            self.assertEqual(Kyber768.dec(c, sk), key)
+        
+    def test_kyber512_batch(self):
+        self.generic_test_batch(Kyber512, 3)
+        
+    def test_kyber1024_batch(self):
+        self.generic_test_batch(Kyber1024, 3)
+
+class TestSeedKeys(unittest.TestCase):
+    """
+    Stockage compact des clés secrètes sous forme de graine d || z.
+    """
+    def test_keygen_from_seed(self):
+        seed = os.urandom(48)
+        Kyber1024.set_drbg_seed(seed)
+        pk, sk = Kyber1024.keygen()
+        Kyber1024.set_drbg_seed(seed)
+        compact = Kyber1024.generate_seed()
+        self.assertEqual(len(compact), 64)
+        self.assertEqual(Kyber1024.keygen_from_seed(compact), (pk, sk))
+        dk = Kyber1024.decapsulation_key_from_seed(compact)
+        self.assertEqual(dk.to_bytes(), sk)
+        self.assertEqual(dk.ek.At, Kyber1024.encapsulation_key(pk).At)
+        c, key = Kyber1024.enc(dk.ek)
+        self.assertEqual(Kyber1024.dec(c, dk), key)
+        with self.assertRaises(ValueError):
+            Kyber1024.keygen_from_seed(compact[:32])
+            
+    def test_key_cache_from_seed(self):
+        seeds = {key_id: Kyber512.generate_seed() for key_id in range(3)}
+        cache = DecapsulationKeyCache(Kyber512, seeds.__getitem__, max_bytes=10**6)
+        pk, _ = Kyber512.keygen_from_seed(seeds[1])
+        c, key = Kyber512.enc(pk)
+        self.assertEqual(cache.dec(1, c), key)
+        self.assertEqual(cache.dec(1, c), key)
+        self.assertEqual(cache.metrics().hits, 1)
+
+class TestExpandedKeyFormat(unittest.TestCase):
+    """
+    Format binaire des clés expansées.
+    """
+    def test_dump_load(self):
+        keys = Kyber768.keygen_batch(2)
+        dks = [Kyber768.decapsulation_key(sk) for _, sk in keys]
+        records = b"".join(dump_expanded_key(Kyber768, dk) for dk in dks)
+        length = expanded_key_length(Kyber768, secret=True)
+        self.assertEqual(len(records), 2 * length)
+        
+        # Lecture depuis un fichier de clés concaténées à pas fixe
+        buf = mmap.mmap(-1, len(records))
+        buf[:] = records
+        for i, (pk, sk) in enumerate(keys):
+            dk = load_expanded_key(Kyber768, memoryview(buf)[i*length:], canonical=sk)
+            self.assertEqual(dk.ek.At, dks[i].ek.At)
+            c, key = Kyber768.enc(pk)
+            self.assertEqual(Kyber768.dec(c, dk), key)
+        buf.close()
+        
+        ek = load_expanded_key(Kyber768, dump_expanded_key(Kyber768, dks[0].ek))
+        self.assertEqual(ek.to_bytes(), keys[0][0])
+        
+    def test_corrupted_record(self):
+        _, sk = Kyber512.keygen()
+        record = bytearray(dump_expanded_key(Kyber512, Kyber512.decapsulation_key(sk)))
+        record[200] ^= 1
+        with self.assertRaises(ValueError):
+            load_expanded_key(Kyber512, record)
+        with self.assertRaises(ValueError):
+            load_expanded_key(Kyber768, record)
+            
+    def test_substituted_matrix(self):
+        # Â^T remplacé et empreinte recalculée : seule la clé canonique le détecte
+        (pk, sk), (other_pk, _) = Kyber512.keygen_batch(2)
+        record = dump_expanded_key(Kyber512, Kyber512.decapsulation_key(sk))
+        other = dump_expanded_key(Kyber512, Kyber512.encapsulation_key(other_pk))
+        start = 24 + 64 + Kyber512.pk_length
+        end = start + 2 * Kyber512.k * Kyber512.k * Kyber512.n
+        forged = record[:start] + other[start:end] + record[end:-32]
+        forged += sha3_256(forged).digest()
+        load_expanded_key(Kyber512, forged)
+        with self.assertRaises(ValueError):
+            load_expanded_key(Kyber512, forged, canonical=sk)
+
+class TestSharedKeyStore(unittest.TestCase):
+    """
+    Magasin de clés expansées en mémoire partagée.
+    """
+    def test_create_attach(self):
+        seed = Kyber512.generate_seed()
+        pk_seed, _ = Kyber512.keygen_from_seed(seed)
+        pk_sk, sk = Kyber512.keygen()
+        with SharedKeyStore.create(Kyber512, {"seed": seed, "sk": sk}) as store:
+            worker = SharedKeyStore.attach(Kyber512, store.name)
+            self.assertEqual(worker.key_ids(), ["seed", "sk"])
+            for key_id, pk in (("seed", pk_seed), ("sk", pk_sk)):
+                c, key = Kyber512.enc(pk)
+                self.assertEqual(worker.dec(key_id, c), key)
+                self.assertEqual(worker.get_by_hpk(Kyber512._h(pk)).ek.pk, pk)
+            self.assertEqual(worker.get("sk", verify=True).to_bytes(), sk)
+            
+            record = worker.record("sk")
+            with self.assertRaises(TypeError):
+                record[0] = 0
+            record.release()
+            with self.assertRaises(KeyError):
+                worker.get("absent")
+            with self.assertRaises(ValueError):
+                worker.unlink()
+            worker.close()
+            
+    def test_independent_attach(self):
+        # Un processus indépendant (son propre resource tracker) s'attache
+        # puis se termine : le segment survit jusqu'au `unlink` du propriétaire
+        _, sk = Kyber512.keygen()
+        store = SharedKeyStore.create(Kyber512, {"sk": sk})
+        try:
+            code = ("from kyber import Kyber512; from shared_key_store import SharedKeyStore; "
+                    f"SharedKeyStore.attach(Kyber512, {store.name!r}).close()")
+            result = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                    capture_output=True, text=True, timeout=60)
+            self.assertEqual(result.returncode, 0, result.stderr)
+            self.assertNotIn("leaked", result.stderr)
+            worker = SharedKeyStore.attach(Kyber512, store.name)
+            self.assertEqual(worker.get("sk").to_bytes(), sk)
+            worker.close()
+        finally:
+            store.unlink()
+
+class TestThreadSafety(unittest.TestCase):
+    """
+    Source d'aléa par thread et exécution des lots sur un pool de threads.
+    """
+    def test_per_thread_drbg(self):
+        kyber = Kyber(DEFAULT_PARAMETERS["kyber_512"])
+        seed = bytes(range(48))
+        kyber.set_drbg_seed(seed)
+        expected = kyber.keygen_batch(4)
+        
+        # La graine de l'instance vaut dans les autres threads
+        kyber.set_drbg_seed(seed)
+        other = []
+        thread = threading.Thread(target=lambda: other.append(kyber.keygen()))
+        thread.start()
+        thread.join()
+        self.assertEqual(other, expected[:1])
+        
+        # Graine propre à chaque thread
+        kyber = Kyber(DEFAULT_PARAMETERS["kyber_512"])
+        results = {}
+        def worker(i):
+            drbg = kyber.drbg
+            kyber.set_drbg_seed(seed, per_thread=True)
+            results[i] = (drbg, [kyber.keygen() for _ in range(4)])
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertIsNone(kyber.drbg)
+        for i in range(4):
+            self.assertEqual(results[i], (None, expected))
+            
+    def test_pickle(self):
+        kyber = Kyber(DEFAULT_PARAMETERS["kyber_512"], xof_workers=2)
+        kyber.enable_pk_cache(8)
+        kyber.set_drbg_seed(bytes(range(48)))
+        pk, sk = kyber.keygen()
+        kyber.enc(pk)
+        kyber.set_drbg_seed(bytes(48), per_thread=True)
+        copy = pickle.loads(pickle.dumps(kyber))
+        
+        # Le DRBG de l'instance est copié avec son état, pas celui du thread
+        other = []
+        thread = threading.Thread(target=lambda: other.append(kyber.keygen()))
+        thread.start()
+        thread.join()
+        self.assertEqual([copy.keygen()], other)
+        self.assertEqual(copy.xof_workers, 2)
+        self.assertIsNotNone(copy._xof_executor)
+        self.assertEqual(copy.pk_cache_info().maxsize, 8)
+        self.assertEqual(copy.pk_cache_info().currsize, 0)
+        c, key = copy.enc(pk)
+        self.assertEqual(copy.dec(c, sk), key)
+        self.assertEqual(kyber.dec(c, sk), key)
+        copy.set_xof_workers(None)
+        kyber.set_xof_workers(None)
+        self.assertIsInstance(pickle.loads(pickle.dumps(Kyber768)), Kyber)
+            
+    def test_executor(self):
+        kyber = Kyber(DEFAULT_PARAMETERS["kyber_512"])
+        seed = bytes(range(48))
+        with KyberExecutor(kyber, max_workers=3, chunk_size=2) as executor:
+            kyber.set_drbg_seed(seed)
+            keys = executor.keygen_batch(5)
+            pks = [pk for pk, _ in keys] + [keys[0][0]]
+            encs = executor.enc_batch(pks)
+            kyber.set_drbg_seed(seed)
+            self.assertEqual(kyber.keygen_batch(5), keys)
+            self.assertEqual(kyber.enc_batch(pks), encs)
+            
+            sks = [sk for _, sk in keys] + [keys[0][1]]
+            self.assertEqual(executor.dec_batch([(c, sk) for (c, _), sk in zip(encs, sks)]),
+                             [K for _, K in encs])
+
+class TestProcessEngine(unittest.TestCase):
+    """
+    Lots exécutés sur un pool de processus.
+    """
+    def test_process_engine(self):
+        seed = bytes(range(48))
+        with KyberProcessEngine(DEFAULT_PARAMETERS["kyber_512"], workers=2, chunk_size=2) as engine:
+            engine.kyber.set_drbg_seed(seed)
+            keys = engine.keygen_batch(5)
+            pks = [pk for pk, _ in keys]
+            encs = engine.enc_batch(pks)
+            Kyber512.set_drbg_seed(seed)
+            self.assertEqual(Kyber512.keygen_batch(5), keys)
+            self.assertEqual(Kyber512.enc_batch(pks), encs)
+            
+            Ks = engine.dec_batch([(c, sk) for (c, _), (_, sk) in zip(encs, keys)])
+            self.assertEqual(Ks, [K for _, K in encs])
+            dks = [Kyber512.decapsulation_key(sk) for _, sk in keys]
+            self.assertEqual(engine.dec_batch([(c, dk) for (c, _), dk in zip(encs, dks)]), Ks)
+            with self.assertRaises(ValueError):
+                engine.dec_raw(encs[0][0], b"")
+            
+            # Graines fournies par l'appelant
+            seeds = b"".join(Kyber512.generate_seed() for _ in range(3))
+            expected = b"".join(pk + sk for pk, sk in (Kyber512.keygen_from_seed(seeds[64*i:64*(i+1)]) for i in range(3)))
+            self.assertEqual(engine.keygen_raw(3, seeds=seeds), expected)
+
+class TestAsyncKyber(unittest.TestCase):
+    """
+    Façade asyncio, avec et sans fenêtre de regroupement.
+    """
+    def test_async_kyber(self):
+        async def run(batch_window):
+            async with AsyncKyber(Kyber512, max_concurrency=2, batch_window=batch_window) as kyber:
+                keys = await asyncio.gather(*(kyber.keygen() for _ in range(3)))
+                encs = await asyncio.gather(*(kyber.enc(pk) for pk, _ in keys))
+                Ks = await asyncio.gather(*(kyber.dec(c, sk) for (c, _), (_, sk) in zip(encs, keys)))
+                self.assertEqual(Ks, [K for _, K in encs])
+        asyncio.run(run(None))
+        asyncio.run(run(0.01))
+        
+    def test_cancel_batched_call(self):
+        calls = []
+        class Backend:
+            def enc_batch(self, pks, key_length):
+                calls.append(len(pks))
+                return Kyber512.enc_batch(pks, key_length)
+                
+        async def run():
+            pk, sk = Kyber512.keygen()
+            async with AsyncKyber(Backend(), batch_window=0.05) as kyber:
+                tasks = [asyncio.ensure_future(kyber.enc(pk)) for _ in range(3)]
+                await asyncio.sleep(0)
+                tasks[1].cancel()
+                results = await asyncio.gather(*tasks, return_exceptions=True)
+            self.assertIsInstance(results[1], asyncio.CancelledError)
+            for c, K in (results[0], results[2]):
+                self.assertEqual(Kyber512.dec(c, sk), K)
+            self.assertEqual(calls, [2])
+        asyncio.run(run())
+
+class TestStepwise(unittest.TestCase):
+    """
+    Calcul pas à pas, identique aux appels directs.
+    """
+    def test_steps_match(self):
+        seed = bytes(range(48))
+        for Kyber in [Kyber512, Kyber1024]:
+            Kyber.set_drbg_seed(seed)
+            pk, sk = run_steps(keygen_steps(Kyber))
+            c, key = run_steps(enc_steps(Kyber, pk))
+            Kyber.set_drbg_seed(seed)
+            self.assertEqual(Kyber.keygen(), (pk, sk))
+            self.assertEqual(Kyber.enc(pk), (c, key))
+            self.assertEqual(run_steps(dec_steps(Kyber, c, sk)), key)
+            # Rejet implicite
+            bad_c = bytes(len(c))
+            self.assertEqual(run_steps(dec_steps(Kyber, bad_c, sk)), Kyber.dec(bad_c, sk))
+            
+    def test_cooperative(self):
+        async def run():
+            kyber = CooperativeKyber(Kyber768, time_slice=0.001)
+            ticks = 0
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0)
+                    ticks += 1
+            task = asyncio.ensure_future(ticker())
+            pk, sk = await kyber.keygen()
+            c, key = await kyber.enc(pk)
+            self.assertEqual(await kyber.dec(c, sk), key)
+            task.cancel()
+            self.assertGreater(ticks, 3)
+        asyncio.run(run())
+
+class TestKEMService(unittest.TestCase):
+    """
+    Service KEM sur socket Unix, avec regroupement des requêtes.
+    """
+    def test_service(self):
+        async def run(path):
+            async with KEMService(path, parameter_sets=("kyber_512",), max_queue=4, batch_deadline=0.01) as service:
+                reader, writer = await asyncio.open_unix_connection(path)
+                async def request(request_id, op, payload=b"", deadline_ms=0):
+                    writer.write(encode_frame(request_id, op, payload, deadline_ms=deadline_ms))
+                    await writer.drain()
+                
+                pk, sk = Kyber512.keygen()
+                c, key = Kyber512.enc(pk)
+                # Requêtes concurrentes sur la même connexion, regroupées en lots
+                await request(1, ENC, pk)
+                await request(2, DEC, c + sk)
+                await request(3, KEYGEN)
+                await request(4, ENC, pk[:-1])
+                await request(5, DEC, bytes(Kyber512.ct_length) + sk, deadline_ms=1)
+                for _ in range(4):
+                    await request(6, DEC, c + sk)
+                responses = {}
+                for _ in range(9):
+                    frame = await read_frame(reader)
+                    responses.setdefault(frame.request_id, []).append(frame)
+                
+                self.assertEqual(responses[1][0].status, STATUS_OK)
+                self.assertEqual(Kyber512.dec(responses[1][0].payload[:Kyber512.ct_length], sk),
+                                 responses[1][0].payload[Kyber512.ct_length:])
+                self.assertEqual(responses[2][0].payload, key)
+                self.assertEqual(len(responses[3][0].payload), Kyber512.pk_length + Kyber512.sk_length)
+                self.assertEqual(responses[4][0].status, STATUS_ERROR)
+                self.assertEqual(responses[5][0].status, STATUS_DEADLINE_EXCEEDED)
+                # File bornée à 4 requêtes : les requêtes en trop sont refusées
+                statuses = [f.status for f in responses[6]]
+                self.assertIn(STATUS_OVERLOADED, statuses)
+                self.assertEqual(set(statuses), {STATUS_OK, STATUS_OVERLOADED})
+                self.assertEqual(service.metrics().overloaded, statuses.count(STATUS_OVERLOADED))
+                writer.close()
+                await writer.wait_closed()
+        with tempfile.TemporaryDirectory() as directory:
+            asyncio.run(run(os.path.join(directory, "kem.sock")))
+
+class TestBulkDecapsulation(unittest.TestCase):
+    """
+    Coordinateur et nœuds de décapsulation sur localhost.
+    """
+    def test_bulk_dec(self):
+        keys = Kyber512.keygen_batch(3)
+        sks = {f"key-{i}": sk for i, (_, sk) in enumerate(keys)}
+        jobs, expected = [], []
+        for i in range(20):
+            pk, _ = keys[i % 3]
+            c, K = Kyber512.enc(pk)
+            jobs.append((f"key-{i % 3}", c))
+            expected.append(K)
+        jobs.append(("absent", jobs[0][1]))
+        expected.append(None)
+        
+        # Un nœud injoignable, en plus de deux processus workers
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            dead_address = s.getsockname()
+        context = multiprocessing.get_context("spawn")
+        ready = context.Queue()
+        processes = [context.Process(target=serve_worker, args=("kyber_512", sks, "127.0.0.1", 0, ready), daemon=True)
+                     for _ in range(2)]
+        for process in processes:
+            process.start()
+        try:
+            addresses = [ready.get(timeout=30) for _ in processes] + [dead_address]
+            coordinator = BulkDecapsulationCoordinator("kyber_512", addresses, shard_size=4, max_retries=2, timeout=10)
+            self.assertEqual(coordinator.run(jobs), expected)
+            
+            stats = {s.address: s for s in coordinator.stats()}
+            self.assertFalse(stats[dead_address].alive)
+            self.assertEqual(sum(s.jobs for s in stats.values()), len(jobs))
+            
+            # Panne d'un nœud : ses lots sont repris par l'autre
+            processes[0].terminate()
+            processes[0].join()
+            keyed = coordinator.run_keyed({"a": jobs[1], "b": jobs[2], "c": jobs[-1]})
+            self.assertEqual(keyed, {"a": expected[1], "b": expected[2], "c": None})
+        finally:
+            for process in processes:
+                process.terminate()
+                process.join()
+
+    def test_all_workers_down(self):
+        pk, sk = Kyber512.keygen()
+        c, _ = Kyber512.enc(pk)
+        context = multiprocessing.get_context("spawn")
+        ready = context.Queue()
+        process = context.Process(target=serve_worker, args=("kyber_512", {"key": sk}, "127.0.0.1", 0, ready), daemon=True)
+        process.start()
+        try:
+            address = ready.get(timeout=30)
+            coordinator = BulkDecapsulationCoordinator("kyber_512", [address], shard_size=4, max_retries=1, timeout=10)
+            consumed = 0
+            def jobs():
+                nonlocal consumed
+                for i in range(100000):
+                    if i == 40:
+                        # Panne de l'unique nœud en cours de flux
+                        process.terminate()
+                        process.join()
+                    consumed += 1
+                    yield "key", c
+            with self.assertRaises(RuntimeError):
+                coordinator.run(jobs())
+            self.assertLess(consumed, 100)
+        finally:
+            process.terminate()
+            process.join()
+
+    def test_invalid_inputs(self):
+        _, sk = Kyber512.keygen()
+        self.assertRaises(TypeError, serve_worker, "kyber_512", {0: sk})
+        coordinator = BulkDecapsulationCoordinator("kyber_512", [("127.0.0.1", 1)])
+        self.assertRaises(TypeError, coordinator.run, [(0, bytes(Kyber512.ct_length))])
+        
+        # Un lot mal formé reçoit une erreur, la connexion reste utilisable
+        worker = DecapsulationWorker("kyber_512", {"key": sk}.__getitem__)
+        threading.Thread(target=worker.serve_forever, daemon=True).start()
+        try:
+            with socket.create_connection(worker.server_address, timeout=10) as sock:
+                for payload in (b"\x01", b"\x01\x00\x00\x00\x02\x00\xff\xfe", b"\x02\x00\x00\x00"):
+                    sock.sendall(encode_frame(1, BULK_DEC, payload))
+                    self.assertEqual(recv_frame(sock).status, STATUS_ERROR)
+                sock.sendall(encode_frame(2, BULK_DEC, b"\x00\x00\x00\x00"))
+                self.assertEqual(recv_frame(sock).status, STATUS_OK)
+        finally:
+            worker.shutdown()
+            worker.server_close()
+
+class TestKEMClient(unittest.TestCase):
+    """
+    Clients synchrone et asyncio contre un service local en TCP.
+    """
+    @classmethod
+    def setUpClass(cls):
+        cls.server = LoopbackServer(parameter_sets=("kyber_512",), batch_deadline=0.005)
+        cls.server.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.close()
+
+    def test_client(self):
+        with KEMClient(self.server.address, "kyber_512", pool_size=2) as client:
+            pk, sk = client.keygen()
+            c, key = client.enc(pk)
+            self.assertEqual(client.dec(c, sk), key)
+            self.assertEqual(Kyber512.dec(c, sk), key)
+
+            # Requêtes en pipeline, réparties sur les deux connexions
+            results = client.enc_many([pk] * 10)
+            keys = client.dec_many([(c, sk) for c, _ in results])
+            self.assertEqual(keys, [K for _, K in results])
+
+            # Erreurs : validées localement, ou renvoyées par le service
+            self.assertRaises(ValueError, client.enc, pk[:-1])
+            self.assertRaises(ValueError, client.enc, bytes([0xFF]) * Kyber512.pk_length)
+
+    def test_threads(self):
+        pk, sk = Kyber512.keygen()
+        with KEMClient(self.server.address, "kyber_512", pool_size=2, max_in_flight=4) as client:
+            results = [None] * 4
+            def worker(i):
+                results[i] = [client.dec(c, sk) == K for c, K in client.enc_many([pk] * 3)]
+            threads = [threading.Thread(target=worker, args=(i,)) for i in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(results, [[True] * 3] * 4)
+
+    def test_reconnect(self):
+        pk, sk = Kyber512.keygen()
+        with KEMClient(self.server.address, "kyber_512", pool_size=1) as client:
+            client.enc(pk)
+            # Connexion coupée : la requête suivante est renvoyée sur une nouvelle connexion
+            client.connections[0].sock.shutdown(socket.SHUT_RDWR)
+            c, key = client.enc(pk)
+            self.assertEqual(Kyber512.dec(c, sk), key)
+
+    def test_overloaded_backoff(self):
+        # Service factice qui répond toujours « surchargé »
+        listener = socket.create_server(("127.0.0.1", 0))
+        arrivals = []
+        def serve():
+            with listener:
+                conn, _ = listener.accept()
+                with conn:
+                    while (frame := recv_frame(conn)) is not None:
+                        arrivals.append(time.perf_counter())
+                        conn.sendall(encode_frame(frame.request_id, frame.op, status=STATUS_OVERLOADED))
+        thread = threading.Thread(target=serve, daemon=True)
+        thread.start()
+        pk, _ = Kyber512.keygen()
+        with KEMClient(listener.getsockname(), "kyber_512", pool_size=1, retries=3) as client:
+            with self.assertRaises(RuntimeError):
+                client.enc(pk)
+        thread.join(timeout=10)
+        self.assertEqual(len(arrivals), 4)
+        # Délais d'au moins la moitié de OVERLOAD_BACKOFF * 2^i, bornés
+        for i, (t0, t1) in enumerate(zip(arrivals, arrivals[1:])):
+            self.assertGreaterEqual(t1 - t0, 0.5 * min(MAX_OVERLOAD_BACKOFF, OVERLOAD_BACKOFF * 2**i))
+        self.assertEqual(KEMClient._backoff(ConnectionError(), 3), 0)
+        self.assertLessEqual(KEMClient._backoff(_Overloaded(), 20), MAX_OVERLOAD_BACKOFF)
+
+    def test_async_client(self):
+        async def run():
+            async with AsyncKEMClient(self.server.address, "kyber_512", pool_size=2) as client:
+                pk, sk = await client.keygen()
+                results = await client.enc_many([pk] * 8)
+                keys = await client.dec_many([(c, sk) for c, _ in results])
+                self.assertEqual(keys, [K for _, K in results])
+                with self.assertRaises(ValueError):
+                    await client.dec(bytes(Kyber512.ct_length), sk[:-1])
+        asyncio.run(run())
+
+class TestLoadGenerator(unittest.TestCase):
+    """
+    Histogrammes de latence et générateur de charge.
+    """
+    def test_histogram(self):
+        histogram = LatencyHistogram()
+        for us in range(1, 100001):
+            histogram.record(us / 1e6)
+        for p in (50, 99, 99.9):
+            expected = p / 100 * 0.1
+            self.assertLess(abs(histogram.percentile(p) - expected) / expected, 0.016)
+        self.assertEqual(histogram.percentile(100), 0.1)
+        
+        other = LatencyHistogram()
+        other.record(1.0)
+        histogram.merge(other)
+        self.assertEqual(histogram.count, 100001)
+        self.assertEqual(histogram.percentile(100), 1.0)
+
+    def test_parse_mix(self):
+        self.assertEqual(parse_mix("kyber_512=1,kyber_768=3"), {"kyber_512": 1.0, "kyber_768": 3.0})
+        self.assertRaises(ValueError, parse_mix, "kyber_256")
+
+    def test_closed_loop(self):
+        report = run_load("inprocess", duration=0.3, concurrency=2, mix="kyber_512=1,kyber_768=1", seed=1)
+        self.assertGreater(report.handshakes, 0)
+        self.assertEqual(report.errors, 0)
+        self.assertEqual(report.latencies["handshake"].count, report.handshakes)
+        self.assertEqual(sum(h.count for h in report.parameters.values()), report.handshakes)
+
+    def test_open_loop_socket(self):
+        report = run_load("socket", duration=0.3, rate=20, mix="kyber_512", seed=1)
+        self.assertGreater(report.handshakes, 0)
+        self.assertEqual(report.errors, 0)
+        self.assertEqual(report.latencies["dec"].count, report.handshakes)
+
+class TestStreamingDecapsulation(unittest.TestCase):
+    """
+    Décapsulation en flux d'une archive, avec interruption et reprise.
+    """
+    def test_stream_dec(self):
+        keys = Kyber512.keygen_batch(3)
+        sks = {f"key-{i}": sk for i, (_, sk) in enumerate(keys)}
+        jobs, expected = [], []
+        for i in range(40):
+            pk, _ = keys[i % 3]
+            c, K = Kyber512.enc(pk)
+            jobs.append((f"key-{i % 3}", c))
+            expected.append(K)
+        jobs[7] = ("absent", jobs[7][1])
+        expected[7] = None
+        
+        with tempfile.TemporaryDirectory() as directory:
+            input_path = os.path.join(directory, "archive.bin")
+            output_path = os.path.join(directory, "keys.bin")
+            write_archive(input_path, Kyber512, jobs)
+            decapsulator = StreamingDecapsulator("kyber_512", sks.__getitem__, chunk_size=8)
+            
+            # Interruption après le troisième morceau : un point de reprise a été écrit
+            def progress(done, total):
+                if done >= 24:
+                    raise KeyboardInterrupt
+            with self.assertRaises(KeyboardInterrupt):
+                decapsulator.run(input_path, output_path, progress=progress, checkpoint_interval=1)
+            self.assertTrue(os.path.exists(output_path + ".checkpoint"))
+            
+            stats = decapsulator.run(input_path, output_path)
+            self.assertEqual(stats.records, 40)
+            self.assertLess(stats.processed, 40)
+            self.assertEqual(read_shared_keys(output_path), expected)
+            self.assertFalse(os.path.exists(output_path + ".checkpoint"))
+            
+            # Sans reprise, tout est recalculé
+            stats = decapsulator.run(input_path, output_path, resume=False)
+            self.assertEqual((stats.processed, stats.failures), (40, 1))
+            self.assertEqual(read_shared_keys(output_path), expected)
+            
+            # Moteur construit sur une autre instance : les clés du cache lui appartiennent
+            engine = KyberExecutor(Kyber(DEFAULT_PARAMETERS["kyber_512"]), max_workers=2, chunk_size=4)
+            decapsulator = StreamingDecapsulator("kyber_512", sks.__getitem__, engine=engine, chunk_size=8)
+            stats = decapsulator.run(input_path, output_path, resume=False)
+            self.assertEqual((stats.processed, stats.failures), (40, 1))
+            self.assertEqual(read_shared_keys(output_path), expected)
+            self.assertIs(decapsulator.cache.kyber, engine.kyber)
+            self.assertRaises(ValueError, StreamingDecapsulator, "kyber_768", sks.__getitem__, engine=engine)
+            
+            with open(input_path, "ab") as f:
+                f.write(b"\0")
+            self.assertRaises(ValueError, decapsulator.run, input_path, output_path)
+
+class TestBulkKeygen(unittest.TestCase):
+    """
+    Génération en masse reproductible par lot, avec interruption et reprise.
+    """
+    def test_bulk_keygen(self):
+        master_seed = bytes(range(48))
+        # Un lot est celui de `keygen` avec le DRBG semé par la graine du lot
+        Kyber512.set_drbg_seed(shard_seed(master_seed, 1))
+        self.assertEqual(generate_shard(Kyber512, master_seed, 1, 2), [Kyber512.keygen() for _ in range(2)])
+        self.assertNotEqual(shard_seed(master_seed, 0), shard_seed(master_seed, 1))
+        
+        with tempfile.TemporaryDirectory() as directory:
+            output_path = os.path.join(directory, "fleet.keys")
+            generator = BulkKeyGenerator("kyber_512", master_seed, shard_size=3)
+            def progress(done, total, rate):
+                if done >= 6:
+                    raise KeyboardInterrupt
+            with self.assertRaises(KeyboardInterrupt):
+                generator.run(10, output_path, progress=progress)
+            stats = generator.run(10, output_path)
+            self.assertEqual((stats.count, stats.generated), (10, 4))
+            self.assertFalse(os.path.exists(output_path + ".checkpoint"))
+            
+            index = read_index(output_path + ".index")
+            self.assertEqual((index.parameter_name, index.count, len(index.shard_digests)), ("kyber_512", 10, 4))
+            expected = [pair for shard, n in enumerate((3, 3, 3, 1)) for pair in generate_shard(Kyber512, master_seed, shard, n)]
+            for i, (pk, sk) in enumerate(expected):
+                self.assertEqual(read_keypair(output_path, Kyber512, i), (pk, sk))
+                self.assertEqual(index.hpks[i], Kyber512._h(pk))
+            self.assertTrue(all(generator.verify_shard(output_path, shard) for shard in range(4)))
+            
+            # Une autre graine maître ne correspond pas à l'index
+            other = BulkKeyGenerator("kyber_512", bytes(48), shard_size=3)
+            self.assertRaises(ValueError, other.verify_shard, output_path, 0)
+
+class TestKeypairPool(unittest.TestCase):
+    """
+    Réserve de paires de clés remplie en arrière-plan.
+    """
+    def test_keypair_pool(self):
+        pool = KeypairPool(Kyber512, low_watermark=1, high_watermark=3, batch_size=2)
+        keys = [pool.take(timeout=10) for _ in range(5)]
+        pool.stop()
+        self.assertEqual(len(set(keys)), 5)
+        for pk, sk in keys:
+            c, key = Kyber512.enc(pk)
+            self.assertEqual(Kyber512.dec(c, sk), key)
+        depth, _, _, generated, taken, _, refill_rate = pool.metrics()
+        self.assertEqual(taken, 5)
+        self.assertEqual(depth, generated - taken)
+        self.assertGreater(refill_rate, 0)
+        
+        while len(pool):
+            pool.take()
+        with self.assertRaises(queue.Empty):
+            pool.take(block=False)
+            
+    def test_keypair_pool_drbg(self):
+        # Le remplissage ne consomme pas le DRBG semé de l'instance
+        kyber = Kyber(DEFAULT_PARAMETERS["kyber_512"])
+        seed = bytes(range(48))
+        kyber.set_drbg_seed(seed)
+        expected = kyber.keygen()
+        kyber.set_drbg_seed(seed)
+        pool = KeypairPool(kyber, low_watermark=1, high_watermark=2, batch_size=2)
+        pool.take(timeout=10)
+        pool.stop()
+        self.assertEqual(kyber.keygen(), expected)
+        self.assertRaises(TypeError, _RefillingPool, 1, 2)
+            
+    @unittest.skipUnless(hasattr(os, "fork"), "nécessite os.fork")
+    def test_keypair_pool_fork(self):
+        pool = KeypairPool(Kyber512, low_watermark=0, high_watermark=2, batch_size=2)
+        pool.take(timeout=10)
+        pool.stop()
+        pid = os.fork()
+        if pid == 0:
+            # L'enfant n'hérite d'aucune paire pré-calculée du parent
+            os._exit(0 if len(pool) == 0 else 1)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+        self.assertEqual(len(pool), 1)
+
+class TestEncapsulationPool(unittest.TestCase):
+    """
+    Encapsulations pré-calculées, à usage unique, vers des pairs enregistrés.
+    """
+    def test_encapsulation_pool(self):
+        (pk, sk), (new_pk, new_sk) = Kyber512.keygen_batch(2)
+        pool = EncapsulationPool(Kyber512, low_watermark=1, high_watermark=3, batch_size=2)
+        pool.add_peer(pk)
+        encs = [pool.take(pk, timeout=10) for _ in range(4)]
+        self.assertEqual(len(set(encs)), 4)
+        for c, key in encs:
+            self.assertEqual(Kyber512.dec(c, sk), key)
+            
+        pool.rotate_peer(pk, new_pk)
+        with self.assertRaises(KeyError):
+            pool.take(pk)
+        c, key = pool.encapsulate(new_pk)
+        self.assertEqual(Kyber512.dec(c, new_sk), key)
+        self.assertEqual(list(pool.metrics()), [new_pk])
+        pool.close()
+
+class TestMatrixExpansion(unittest.TestCase):
+    """
+    L'expansion de A sur un pool de threads doit donner
+    exactement la même matrice que l'expansion en série.
+    """
+    def test_threaded_matrix_matches_serial(self):
+        rho = os.urandom(32)
+        Kyber_threaded = Kyber(DEFAULT_PARAMETERS["kyber_768"], xof_workers=4)
+        for transpose in (False, True):
+            A = Kyber768._generate_matrix_from_seed(rho, transpose=transpose, is_ntt=True)
+            _A = Kyber_threaded._generate_matrix_from_seed(rho, transpose=transpose, is_ntt=True)
+            self.assertEqual(A, _A)
+        Kyber_threaded.set_xof_workers(None)
+
 class TestKnownTestValuesDRBG(unittest.TestCase):
     """
     Nous savons comment les graines du KAT sont générées, donc
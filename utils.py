@@ -13,6 +13,66 @@ def bitstring_to_bytes(s):
     """
     return bytes([int(s[i:i+8][::-1], 2) for i in range(0, len(s), 8)])
     
+def pack_into(buffer, offset, values, l):
+    """
+    Pack the l-bit integers `values` into `buffer` from byte `offset`,
+    little endian following the paper (same layout as `Polynomial.encode`).
+    Returns the offset just after the last byte written
+    """
+    acc, n_bits = 0, 0
+    for x in values:
+        acc |= x << n_bits
+        n_bits += l
+        while n_bits >= 8:
+            buffer[offset] = acc & 255
+            acc >>= 8
+            n_bits -= 8
+            offset += 1
+    if n_bits > 0:
+        buffer[offset] = acc & 255
+        offset += 1
+    return offset
+
+def iter_packed_12bit_at_least(input_bytes, bound):
+    """
+    Yield (in increasing order) the indices of the 3-byte groups of
+    `input_bytes` which pack, as in `Polynomial.encode(l=12)`, a 12-bit
+    integer >= bound.
+    
+    Only the high nibble / byte of each value can push it over `bound`,
+    so candidate groups are found for all groups at once with
+    `bytes.translate` and only those are decoded.
+    """
+    view = as_memoryview(input_bytes)
+    low, mid, high = view[0::3], bytes(view[1::3]), bytes(view[2::3])
+    # d1 = low + 256*(mid & 15) and d2 = (mid >> 4) + 16*high
+    min_nibble = -(-(bound - 255) // 256)
+    min_high = -(-(bound - 15) // 16)
+    mid_flags = mid.translate(bytes((y & 15) >= min_nibble for y in range(256)))
+    high_flags = high.translate(bytes(z >= min_high for z in range(256)))
+    
+    candidates = set()
+    for flags in (mid_flags, high_flags):
+        i = flags.find(1)
+        while i != -1:
+            candidates.add(i)
+            i = flags.find(1, i + 1)
+    for i in sorted(candidates):
+        d1 = low[i] + 256*(mid[i] & 15)
+        d2 = (mid[i] >> 4) + 16*high[i]
+        if d1 >= bound or d2 >= bound:
+            yield i
+
+def as_memoryview(input_bytes):
+    """
+    Return a flat unsigned-byte memoryview over any buffer-protocol
+    object (bytes, bytearray, memoryview, mmap, ...) without copying it
+    """
+    view = memoryview(input_bytes)
+    if view.format != 'B' or view.ndim != 1:
+        view = view.cast('B')
+    return view
+    
 def round_up(x):
     """
     Round x.5 up always